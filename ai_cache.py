@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from logger_config import logger
+
+def cache_key(model, system_prompt, user_prompt, response_format):
+    """Content address of a chat completion request."""
+    payload = json.dumps(
+        [model, system_prompt, user_prompt, response_format],
+        sort_keys=True,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class AICache:
+    """Interface for AI response cache backends, with shared hit/miss accounting."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.metrics = {'hits': 0, 'misses': 0, 'bypassed': 0, 'stores': 0, 'evictions': 0}
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def record_bypass(self):
+        with self._lock:
+            self.metrics['bypassed'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.metrics['hits'] + self.metrics['misses']
+            return {
+                **self.metrics,
+                'backend': type(self).__name__,
+                'hit_rate': round(self.metrics['hits'] / lookups, 4) if lookups else 0.0
+            }
+
+    def close(self):
+        pass
+
+class InMemoryAICache(AICache):
+    def __init__(self, max_entries=1000, ttl=86400):
+        super().__init__(max_entries, ttl)
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] >= self.ttl:
+                del self._entries[key]
+                self.metrics['evictions'] += 1
+                entry = None
+            if entry is None:
+                self.metrics['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.metrics['hits'] += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            self.metrics['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics['evictions'] += 1
+
+class SQLiteAICache(AICache):
+    def __init__(self, path, max_entries=100000, ttl=86400):
+        super().__init__(max_entries, ttl)
+        self.path = path
+        self._conn = None
+        self._connect()
+
+    def _connect(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS ai_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ai_cache_accessed_at ON ai_cache (accessed_at)")
+            self._conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to open AI cache at {self.path}: {str(e)}")
+            raise
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM ai_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] >= self.ttl:
+                self._conn.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.metrics['evictions'] += 1
+                row = None
+            if row is None:
+                self.metrics['misses'] += 1
+                return None
+            self._conn.execute("UPDATE ai_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.metrics['hits'] += 1
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            # Least recently used entries go first once the cache is over size
+            evicted = self._conn.execute(
+                "DELETE FROM ai_cache WHERE key IN ("
+                "SELECT key FROM ai_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            self._conn.commit()
+            self.metrics['stores'] += 1
+            self.metrics['evictions'] += max(evicted, 0)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+def create_ai_cache(backend=None):
+    backend = backend or os.getenv('AI_CACHE_BACKEND', 'memory')
+    ttl = float(os.getenv('AI_CACHE_TTL', '86400'))
+    if backend == 'none':
+        return None
+    if backend == 'memory':
+        return InMemoryAICache(int(os.getenv('AI_CACHE_MAX_ENTRIES', '1000')), ttl)
+    if backend == 'sqlite':
+        return SQLiteAICache(
+            os.getenv('AI_CACHE_PATH', 'cache/ai_cache.db'),
+            int(os.getenv('AI_CACHE_MAX_ENTRIES', '100000')),
+            ttl
+        )
+    raise ValueError(f"Unknown AI cache backend: {backend}")
@@ -1,57 +1,370 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
+from types import SimpleNamespace
+import asyncio
 import json
 from logger_config import logger
+from context_selector import ContextSelector, compact_json, estimate_tokens
+from ai_cache import cache_key
+from rate_limiter import OpenAIScheduler
+from json_stream import JSONFieldStream
+from telemetry import OPENAI_REQUESTS, record_token_usage, span, traced
 import os
 
+ANALYSIS_SYSTEM_PROMPT = "You are a product data analyst expert. Analyze the provided information and generate accurate answers to the questions based on historical data and scraped content."
+VALIDATION_SYSTEM_PROMPT = "You are a data validation expert. Verify the accuracy and consistency of the provided answers."
+COMBINED_SYSTEM_PROMPT = "You are a product data analyst expert. Answer each field from the historical data and scraped content, then check every answer yourself and rate how confident you are in it."
+
+# two_pass: analysis call, then a validation call over all answers.
+# combined: one structured-output call returns answers with confidence and
+# self-check; only low-confidence or self-rejected fields get a validation call.
+TWO_PASS_MODE = 'two_pass'
+COMBINED_MODE = 'combined'
+VALIDATION_MODES = (TWO_PASS_MODE, COMBINED_MODE)
+
 class AIProcessor:
-    def __init__(self):
-        self.openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, cache=None, scheduler=None):
+        # Retries and backoff are the scheduler's job, the client must not retry on its own
+        self.openai = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        self.scheduler = scheduler or OpenAIScheduler()
         # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
         self.model = "gpt-4o"
+        self.context_selector = ContextSelector()
+        self.cache = cache
+        self.validation_mode = os.getenv('AI_VALIDATION_MODE', TWO_PASS_MODE)
+        self.confidence_threshold = float(os.getenv('AI_CONFIDENCE_THRESHOLD', '0.8'))
+        # calls_avoided: validation calls skipped because local checks already rejected the row
+        self.usage = {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'calls_avoided': 0}
 
-    def analyze_product_data(self, existing_data, scraped_content, questions):
+    @traced('ai.analysis')
+    async def analyze_product_data(self, existing_data, scraped_content, questions, bypass_cache=False):
         try:
             prompt = self._construct_analysis_prompt(existing_data, scraped_content, questions)
-            
-            response = self.openai.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a product data analyst expert. Analyze the provided information and generate accurate answers to the questions based on historical data and scraped content."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"}
-            )
-            
-            return json.loads(response.choices[0].message.content)
+            return await self._complete(ANALYSIS_SYSTEM_PROMPT, prompt, bypass_cache)
         except Exception as e:
             logger.error(f"Error in AI analysis: {str(e)}")
             raise
 
-    def validate_ai_responses(self, responses, questions):
+    @traced('ai.validation')
+    async def validate_ai_responses(self, responses, questions, bypass_cache=False):
         try:
             validation_prompt = self._construct_validation_prompt(responses, questions)
-            
-            response = self.openai.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a data validation expert. Verify the accuracy and consistency of the provided answers."},
-                    {"role": "user", "content": validation_prompt}
-                ],
-                response_format={"type": "json_object"}
-            )
-            
-            validation_result = json.loads(response.choices[0].message.content)
-            return validation_result
+            return await self._complete(VALIDATION_SYSTEM_PROMPT, validation_prompt, bypass_cache)
         except Exception as e:
             logger.error(f"Error in AI validation: {str(e)}")
             raise
 
+    async def generate_validated(self, existing_data, scraped_content, questions, mode=None, bypass_cache=False,
+                                 precheck=None, on_validate=None):
+        """Answers and a validation result in the given mode (default AI_VALIDATION_MODE).
+
+        precheck(responses) returns {column: [issues]} from local checks; when it
+        finds any, the row is rejected without the validation call. on_validate()
+        is awaited just before the two-pass validation call.
+        """
+        mode = mode or self.validation_mode
+        if mode not in VALIDATION_MODES:
+            raise ValueError(f"Unknown validation mode: {mode} (expected one of {', '.join(VALIDATION_MODES)})")
+        if mode == COMBINED_MODE:
+            return await self.generate_and_validate(existing_data, scraped_content, questions, bypass_cache, precheck)
+        responses = await self.analyze_product_data(existing_data, scraped_content, questions, bypass_cache)
+        validation = self.reject_locally(responses, precheck, TWO_PASS_MODE)
+        if validation is None:
+            if on_validate is not None:
+                await on_validate()
+            validation = await self.validate_ai_responses(responses, questions, bypass_cache)
+        return responses, validation
+
+    def reject_locally(self, responses, precheck, mode, calls_avoided=1):
+        """A failed validation result from precheck's issues, or None when the answers pass or there is no precheck."""
+        if precheck is None:
+            return None
+        issues = precheck(responses)
+        if not issues:
+            return None
+        self.usage['calls_avoided'] += calls_avoided
+        if calls_avoided:
+            OPENAI_REQUESTS.inc(calls_avoided, outcome='avoided')
+        logger.info(f"Rejected answers locally, skipping {calls_avoided} validation call(s): {issues}")
+        return {
+            'is_valid': False,
+            'validation_details': {column: {'valid': False, 'issues': found} for column, found in issues.items()},
+            'mode': mode,
+            'rejected_locally': True
+        }
+
+    @traced('ai.combined')
+    async def generate_and_validate(self, existing_data, scraped_content, questions, bypass_cache=False, precheck=None):
+        """One structured-output call for answers, confidence and self-check.
+
+        Fields below confidence_threshold, or that failed the model's own check,
+        are re-checked with validate_ai_responses, unless precheck already
+        rejects the answers. Returns the answers and a validation result shaped
+        like validate_ai_responses'.
+        """
+        try:
+            prompt = self._construct_combined_prompt(existing_data, scraped_content, questions)
+            result = await self._complete(
+                COMBINED_SYSTEM_PROMPT, prompt, bypass_cache, self._combined_response_format(questions)
+            )
+            return await self._combine_fields(result.get('fields', {}), questions, bypass_cache, precheck)
+        except Exception as e:
+            logger.error(f"Error in combined AI generation: {str(e)}")
+            raise
+
+    async def _combine_fields(self, fields, questions, bypass_cache=False, precheck=None):
+        responses = {question: fields[question]['answer'] for question in questions if question in fields}
+        details = {
+            question: {
+                'valid': not field.get('issues'),
+                'issues': field.get('issues') or [],
+                'confidence': field.get('confidence')
+            }
+            for question, field in fields.items()
+        }
+
+        uncertain = [
+            question for question, detail in details.items()
+            if not detail['valid'] or (detail['confidence'] or 0) < self.confidence_threshold
+        ]
+        # A row that fails local checks is rejected whatever the re-check says
+        rejected = self.reject_locally(responses, precheck, COMBINED_MODE, 1 if uncertain else 0)
+        if rejected is not None:
+            for question, detail in rejected['validation_details'].items():
+                details.setdefault(question, {'confidence': None}).update(detail)
+            return responses, {**rejected, 'validation_details': details, 'revalidated': []}
+        if uncertain:
+            checked = await self.validate_ai_responses(
+                {question: responses.get(question) for question in uncertain}, uncertain, bypass_cache
+            )
+            for question in uncertain:
+                detail = checked.get('validation_details', {}).get(question)
+                if detail is not None:
+                    details[question].update(valid=bool(detail.get('valid')), issues=detail.get('issues') or [])
+                elif not checked.get('is_valid', False):
+                    details[question]['valid'] = False
+
+        return responses, {
+            'is_valid': all(detail['valid'] for detail in details.values()),
+            'validation_details': details,
+            'mode': COMBINED_MODE,
+            'revalidated': uncertain
+        }
+
+    @traced('ai.stream')
+    async def stream_validated(self, existing_data, scraped_content, questions, on_field, mode=None,
+                               bypass_cache=False, precheck=None, on_validate=None):
+        """generate_validated with a streamed generation call.
+
+        on_field(question, field) is awaited as each answer completes, where field
+        has the answer and, in combined mode, the model's confidence and issues.
+        The validation pass still sees the complete answers, so the result is the
+        same as generate_validated's; on_validate is awaited as it is there.
+        """
+        mode = mode or self.validation_mode
+        if mode not in VALIDATION_MODES:
+            raise ValueError(f"Unknown validation mode: {mode} (expected one of {', '.join(VALIDATION_MODES)})")
+        try:
+            if mode == COMBINED_MODE:
+                prompt = self._construct_combined_prompt(existing_data, scraped_content, questions)
+                fields = {}
+                async for question, field in self._stream_complete(
+                    COMBINED_SYSTEM_PROMPT, prompt, bypass_cache, self._combined_response_format(questions),
+                    path=('fields',)
+                ):
+                    fields[question] = field
+                    await on_field(question, field)
+                return await self._combine_fields(fields, questions, bypass_cache, precheck)
+
+            prompt = self._construct_analysis_prompt(existing_data, scraped_content, questions)
+            responses = {}
+            async for question, answer in self._stream_complete(ANALYSIS_SYSTEM_PROMPT, prompt, bypass_cache):
+                responses[question] = answer
+                await on_field(question, {'answer': answer})
+            validation = self.reject_locally(responses, precheck, TWO_PASS_MODE)
+            if validation is None:
+                if on_validate is not None:
+                    await on_validate()
+                validation = await self.validate_ai_responses(responses, questions, bypass_cache)
+            return responses, validation
+        except Exception as e:
+            logger.error(f"Error in streamed AI analysis: {str(e)}")
+            raise
+
+    def _combined_response_format(self, questions):
+        field = {
+            "type": "object",
+            "properties": {
+                "answer": {"type": ["string", "number", "boolean", "null"]},
+                "confidence": {"type": "number", "description": "0 to 1"},
+                "issues": {"type": "array", "items": {"type": "string"}}
+            },
+            "required": ["answer", "confidence", "issues"],
+            "additionalProperties": False
+        }
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "product_entry",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "fields": {
+                            "type": "object",
+                            "properties": {question: field for question in questions},
+                            "required": list(questions),
+                            "additionalProperties": False
+                        }
+                    },
+                    "required": ["fields"],
+                    "additionalProperties": False
+                }
+            }
+        }
+
+    async def _cached(self, key, bypass_cache):
+        if self.cache is None:
+            return None
+        if bypass_cache:
+            self.cache.record_bypass()
+            return None
+        return await asyncio.to_thread(self.cache.get, key)
+
+    def _record_usage(self, usage):
+        record_token_usage(usage)
+        if usage is not None:
+            self.usage['requests'] += 1
+            self.usage['prompt_tokens'] += usage.prompt_tokens
+            self.usage['completion_tokens'] += usage.completion_tokens
+
+    def _estimate_tokens(self, system_prompt, prompt, response_format):
+        estimated_tokens = estimate_tokens(system_prompt) + estimate_tokens(prompt)
+        if response_format['type'] == 'json_schema':
+            estimated_tokens += estimate_tokens(json.dumps(response_format))
+        return estimated_tokens
+
+    async def _complete(self, system_prompt, prompt, bypass_cache=False, response_format=None):
+        response_format = response_format or {"type": "json_object"}
+        key = cache_key(self.model, system_prompt, prompt, response_format)
+        cached = await self._cached(key, bypass_cache)
+        if cached is not None:
+            return cached
+
+        async def call():
+            # Time on the wire only; the stage spans above also include queueing
+            with span('openai.request'):
+                response = await self.openai.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    response_format=response_format
+                )
+            # Counted here so callers sharing a coalesced call count it once
+            self._record_usage(response.usage)
+            return response
+
+        estimated_tokens = self._estimate_tokens(system_prompt, prompt, response_format)
+        response = await self.scheduler.submit(call, estimated_tokens, key=key)
+        result = json.loads(response.choices[0].message.content)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, key, result)
+        return result
+
+    async def _stream_complete(self, system_prompt, prompt, bypass_cache=False, response_format=None, path=()):
+        """Like _complete, but yields (key, value) for each member of the object at path as it completes.
+
+        The stream holds its scheduler slot until it ends. Streams are not
+        coalesced, and are only retried if they fail before the first member.
+        """
+        response_format = response_format or {"type": "json_object"}
+        key = cache_key(self.model, system_prompt, prompt, response_format)
+        cached = await self._cached(key, bypass_cache)
+        if cached is not None:
+            members = cached
+            for name in path:
+                members = members.get(name, {})
+            for item in members.items():
+                yield item
+            return
+
+        members = asyncio.Queue()
+        done = object()
+
+        async def call():
+            parser = JSONFieldStream(path)
+            content = []
+            usage = None
+            emitted = False
+            with span('openai.stream'):
+                stream = await self.openai.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    response_format=response_format,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                try:
+                    async for chunk in stream:
+                        if chunk.usage is not None:
+                            usage = chunk.usage
+                        if not chunk.choices or not chunk.choices[0].delta.content:
+                            continue
+                        content.append(chunk.choices[0].delta.content)
+                        for item in parser.feed(chunk.choices[0].delta.content):
+                            emitted = True
+                            members.put_nowait(item)
+                except Exception as e:
+                    # Retrying would repeat members the caller already has
+                    if emitted:
+                        raise RuntimeError(f"OpenAI stream failed after partial output: {str(e)}") from e
+                    raise
+            self._record_usage(usage)
+            return SimpleNamespace(usage=usage, content=''.join(content))
+
+        async def run():
+            try:
+                return await self.scheduler.submit(call, self._estimate_tokens(system_prompt, prompt, response_format))
+            finally:
+                members.put_nowait(done)
+
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                item = await members.get()
+                if item is done:
+                    break
+                yield item
+            response = await task
+        finally:
+            if not task.done():
+                task.cancel()
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, key, json.loads(response.content))
+
+    def select_context(self, existing_data, supplier_name, product_name, index=None):
+        history, stats = self.context_selector.select(existing_data, supplier_name, product_name, index=index)
+        logger.info(
+            f"Prompt context for {supplier_name} / {product_name}: "
+            f"{stats['rows_sent']}/{stats['rows_available']} rows, ~{stats['tokens_sent']} tokens"
+        )
+        return history, stats
+
+    def serialize_history(self, existing_data):
+        return compact_json(existing_data)
+
     def _construct_analysis_prompt(self, existing_data, scraped_content, questions):
+        # Callers that already selected context pass the history pre-serialized
+        history = existing_data if isinstance(existing_data, str) else self.serialize_history(existing_data)
         return f"""
         Analyze the following information and generate answers for {len(questions)} questions:
 
         Historical Data:
-        {json.dumps(existing_data, indent=2)}
+        {history}
 
         Scraped Content:
         {scraped_content}
@@ -69,6 +382,24 @@ class AIProcessor:
         3. Tagged with "AI generated" where appropriate
         """
 
+    def _construct_combined_prompt(self, existing_data, scraped_content, questions):
+        history = existing_data if isinstance(existing_data, str) else self.serialize_history(existing_data)
+        return f"""
+        Answer these {len(questions)} fields for a new product row: {compact_json(list(questions))}
+
+        Historical Data:
+        {history}
+
+        Scraped Content:
+        {scraped_content}
+
+        For every field give:
+        - answer: the value, consistent with historical data patterns and supported by the scraped content when available
+        - confidence: 0 to 1, how sure you are the answer is correct
+        - issues: problems your own check finds in the answer (logical consistency, format,
+          business rules); empty when it passes
+        """
+
     def _construct_validation_prompt(self, responses, questions):
         return f"""
         Validate the following AI-generated responses:
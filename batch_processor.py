@@ -0,0 +1,235 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+import time
+import uuid
+from logger_config import logger
+from data_validator import InvalidEntryError
+from uniqueness_index import normalize_key
+from bulk_writer import BufferedWriter, DUPLICATE, FAILED, INSERTED
+from rate_limiter import current_caller
+
+INVALID = 'invalid'
+
+def parse_batch_input(content, fmt=None):
+    """Parse (supplier_name, product_name) pairs from CSV or JSONL text."""
+    if fmt is None:
+        fmt = 'jsonl' if content.lstrip().startswith('{') else 'csv'
+
+    pairs = []
+    if fmt == 'jsonl':
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            pairs.append((record['supplier_name'], record['product_name']))
+    elif fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(content))
+        missing = {'supplier_name', 'product_name'} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+        for record in reader:
+            pairs.append((record['supplier_name'], record['product_name']))
+    else:
+        raise ValueError(f"Unsupported batch format: {fmt}")
+
+    for supplier_name, product_name in pairs:
+        if not supplier_name or not product_name:
+            raise ValueError("Every row needs a supplier_name and a product_name")
+    return pairs
+
+class BatchProcessor:
+    def __init__(self, db, web_scraper, ai_processor, data_validator, concurrency=None, chunk_size=None,
+                 similarity_indexes=None, uniqueness_index=None, writer=None, snapshots=None):
+        self.db = db
+        self.web_scraper = web_scraper
+        self.ai_processor = ai_processor
+        self.data_validator = data_validator
+        self.similarity_indexes = similarity_indexes
+        self.uniqueness_index = uniqueness_index
+        # A shared BufferedWriter flushes at its own max_rows, so chunk_size only sizes
+        # the writer a batch makes for itself
+        if writer is not None and chunk_size is not None:
+            raise ValueError("chunk_size cannot be combined with a shared writer; set its max_rows instead")
+        self.writer = writer
+        self.snapshots = snapshots
+        self.concurrency = concurrency or int(os.getenv('BATCH_CONCURRENCY', '16'))
+        self.chunk_size = chunk_size or int(os.getenv('BATCH_CHUNK_SIZE', '200'))
+
+    async def run(self, pairs, table_name, bypass_cache=False, validation_mode=None):
+        started = time.perf_counter()
+        # The whole batch is one caller for the OpenAI scheduler, so single
+        # requests keep getting turns while it runs
+        current_caller.set(f"batch:{uuid.uuid4().hex[:8]}")
+        outcomes = [None] * len(pairs)
+
+        # Load the reference table once for the whole batch
+        schema = await self.db.get_table_schema_async(table_name)
+        if self.snapshots is not None:
+            existing_data = await asyncio.to_thread(self.snapshots.get_table_data, table_name)
+        else:
+            existing_data = await self.db.get_table_data_async(table_name)
+        similarity_index = None
+        if self.similarity_indexes is not None:
+            similarity_index = await asyncio.to_thread(self.similarity_indexes.get, table_name, existing_data)
+
+        # Dedupe against the table and within the batch in one pass
+        if self.uniqueness_index is not None:
+            key_index = await asyncio.to_thread(self.uniqueness_index.table, table_name)
+            exists = key_index.contains
+        else:
+            existing_keys = {
+                normalize_key(supplier_name, product_name)
+                for supplier_name, product_name in zip(existing_data['supplier_name'], existing_data['product_name'])
+            }
+            exists = lambda supplier_name, product_name: normalize_key(supplier_name, product_name) in existing_keys
+        seen = set()
+        pending = []
+        for position, (supplier_name, product_name) in enumerate(pairs):
+            key = normalize_key(supplier_name, product_name)
+            if key in seen or exists(supplier_name, product_name):
+                outcomes[position] = self._outcome(supplier_name, product_name, DUPLICATE)
+            else:
+                seen.add(key)
+                pending.append(position)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        writer = self.writer or BufferedWriter(self.db, max_rows=self.chunk_size)
+
+        async def generate(index):
+            supplier_name, product_name = pairs[index]
+            try:
+                async with semaphore:
+                    row = await self._generate_row(
+                        supplier_name, product_name, existing_data, schema, similarity_index, bypass_cache,
+                        validation_mode
+                    )
+            except Exception as e:
+                status = INVALID if isinstance(e, InvalidEntryError) else FAILED
+                outcomes[index] = self._outcome(supplier_name, product_name, status, str(e))
+                return
+            # Rows are written in chunks by the writer; wait for ours outside the
+            # semaphore so a pending flush does not hold a generation slot
+            result = await writer.write(table_name, row)
+            outcomes[index] = self._outcome(supplier_name, product_name, result['status'], result.get('error'))
+
+        await asyncio.gather(*(generate(index) for index in pending))
+
+        elapsed = time.perf_counter() - started
+        counts = {status: 0 for status in (INSERTED, DUPLICATE, INVALID, FAILED)}
+        for outcome in outcomes:
+            counts[outcome['status']] = counts.get(outcome['status'], 0) + 1
+        stats = {
+            'rows': len(pairs),
+            **counts,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(len(pairs) / elapsed, 2) if elapsed else 0.0
+        }
+        logger.info(f"Batch into {table_name} finished: {stats}")
+        return {'status': 'success', 'stats': stats, 'results': outcomes}
+
+    async def _generate_row(self, supplier_name, product_name, existing_data, schema, similarity_index=None,
+                            bypass_cache=False, validation_mode=None):
+        questions = schema.question_columns()
+        scraped_info = await self.web_scraper.search_product_info(supplier_name, product_name)
+        history, _ = await asyncio.to_thread(
+            self.ai_processor.select_context,
+            existing_data,
+            supplier_name,
+            product_name,
+            similarity_index
+        )
+        ai_responses, validation_result = await self.ai_processor.generate_validated(
+            history,
+            scraped_info['content'],
+            questions,
+            mode=validation_mode,
+            bypass_cache=bypass_cache,
+            precheck=lambda responses: self.data_validator.precheck(
+                {**responses, 'supplier_name': supplier_name, 'product_name': product_name}, schema
+            )
+        )
+        if not validation_result['is_valid']:
+            raise InvalidEntryError(f"Generated data failed validation: {json.dumps(validation_result)}")
+
+        # The requested key wins over whatever the model answered for it
+        new_data = {
+            **ai_responses,
+            'supplier_name': supplier_name,
+            'product_name': product_name
+        }
+        return self.data_validator.validate_data_format(new_data, schema)
+
+    def _outcome(self, supplier_name, product_name, status, error=None):
+        outcome = {'supplier_name': supplier_name, 'product_name': product_name, 'status': status}
+        if error:
+            outcome['error'] = error
+        return outcome
+
+async def _run_cli(args):
+    from storage import create_storage_backend
+    from web_scraper import WebScraper
+    from ai_processor import AIProcessor
+    from data_validator import DataValidator
+    from similarity_index import SimilarityIndexStore
+    from uniqueness_index import UniquenessIndex
+    from scrape_cache import ScrapeCache
+    from ai_cache import create_ai_cache
+
+    with open(args.input, encoding='utf-8') as f:
+        content = f.read()
+    fmt = args.format or ('jsonl' if args.input.endswith(('.jsonl', '.ndjson')) else None)
+    pairs = parse_batch_input(content, fmt)
+
+    db = create_storage_backend()
+    scrape_cache = ScrapeCache()
+    web_scraper = WebScraper(cache=scrape_cache)
+    similarity_indexes = SimilarityIndexStore()
+    uniqueness_index = UniquenessIndex(db)
+    ai_cache = create_ai_cache()
+    db.add_insert_listener(similarity_indexes.on_insert)
+    db.add_insert_listener(uniqueness_index.on_insert)
+    try:
+        processor = BatchProcessor(
+            db, web_scraper, AIProcessor(cache=ai_cache), DataValidator(),
+            concurrency=args.concurrency, chunk_size=args.chunk_size,
+            similarity_indexes=similarity_indexes,
+            uniqueness_index=uniqueness_index
+        )
+        return await processor.run(
+            pairs, args.table, bypass_cache=args.bypass_cache, validation_mode=args.validation_mode
+        )
+    finally:
+        await web_scraper.close()
+        scrape_cache.close()
+        if ai_cache is not None:
+            ai_cache.close()
+        db.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate entries for a CSV/JSONL file of supplier/product pairs")
+    parser.add_argument('input', help="CSV with supplier_name,product_name columns or JSONL records")
+    parser.add_argument('--table', default='supplier_products')
+    parser.add_argument('--format', choices=['csv', 'jsonl'])
+    parser.add_argument('--concurrency', type=int)
+    parser.add_argument('--chunk-size', type=int, help="Rows per bulk insert (default BATCH_CHUNK_SIZE or 200)")
+    parser.add_argument('--bypass-cache', action='store_true', help="Always call the model, ignoring cached AI results")
+    parser.add_argument('--validation-mode', choices=['two_pass', 'combined'],
+                        help="two_pass: analysis + validation call; combined: one call, re-check low-confidence fields")
+    parser.add_argument('--output', help="Write per-row results as JSONL to this path")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(_run_cli(args))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for outcome in result['results']:
+                f.write(json.dumps(outcome) + '\n')
+    print(json.dumps(result['stats'], indent=2))
+    return 0 if result['stats']['failed'] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
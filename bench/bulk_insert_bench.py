@@ -0,0 +1,161 @@
+"""Bulk insert benchmark: per-row INSERT + commit vs bulk_insert_rows vs BufferedWriter.
+
+Runs against a local SQLite stand-in with a simulated round trip per statement,
+which is what makes per-row commits expensive on a remote Postgres.
+
+    python -m bench.bulk_insert_bench --rows 5000 --latency 0.002
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from bench.similarity_index_bench import synthetic_names
+from bench.stubs import add_db_latency
+
+TABLE = 'bulk_bench'
+
+
+def make_rows(count, offset=0):
+    rows = []
+    for supplier_name, product_name in synthetic_names(count + offset):
+        rows.append({
+            'supplier_name': supplier_name,
+            'product_name': product_name,
+            'category': 'Hardware (AI generated)',
+            'unit_price': 9.99
+        })
+    return rows[offset:]
+
+
+def fresh_db(latency):
+    from sqlite_connector import SQLiteConnector
+    from sqlalchemy import text
+
+    path = os.path.join(tempfile.mkdtemp(prefix='bulk_'), 'bench.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+    db = SQLiteConnector()
+    with db.engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE {TABLE} (
+                id INTEGER PRIMARY KEY,
+                supplier_name VARCHAR(255) NOT NULL,
+                product_name VARCHAR(255) NOT NULL,
+                category VARCHAR(255),
+                unit_price FLOAT,
+                UNIQUE(supplier_name, product_name)
+            )
+        """))
+    add_db_latency(db.engine, latency)
+    return db
+
+
+def per_row(db, rows):
+    from uniqueness_index import DuplicateEntryError
+
+    statuses = []
+    for row in rows:
+        try:
+            db.insert_ai_generated_row(TABLE, row)
+            statuses.append('inserted')
+        except DuplicateEntryError:
+            statuses.append('duplicate')
+    return statuses
+
+
+def bulk(db, rows, chunk):
+    statuses = []
+    for start in range(0, len(rows), chunk):
+        statuses.extend(result['status'] for result in db.bulk_insert_rows(TABLE, rows[start:start + chunk]))
+    return statuses
+
+
+def per_row_concurrent(db, rows, writers):
+    from uniqueness_index import DuplicateEntryError
+
+    async def go():
+        queue = asyncio.Queue()
+        for row in rows:
+            queue.put_nowait(row)
+        statuses = []
+
+        async def producer():
+            while not queue.empty():
+                try:
+                    await db.insert_ai_generated_row_async(TABLE, queue.get_nowait())
+                    statuses.append('inserted')
+                except DuplicateEntryError:
+                    statuses.append('duplicate')
+
+        await asyncio.gather(*(producer() for _ in range(writers)))
+        return statuses
+
+    return asyncio.run(go())
+
+
+def buffered(db, rows, chunk, writers):
+    from bulk_writer import BufferedWriter
+
+    async def go():
+        writer = BufferedWriter(db, max_rows=chunk)
+        queue = asyncio.Queue()
+        for row in rows:
+            queue.put_nowait(row)
+        statuses = []
+
+        # Independent producers, like concurrent API requests each inserting one row
+        async def producer():
+            while not queue.empty():
+                statuses.append((await writer.write(TABLE, queue.get_nowait()))['status'])
+
+        await asyncio.gather(*(producer() for _ in range(writers)))
+        await writer.close()
+        return statuses, writer.stats()['flushes']
+
+    return asyncio.run(go())
+
+
+def report(name, seconds, statuses, extra=''):
+    inserted = statuses.count('inserted')
+    duplicates = statuses.count('duplicate')
+    print(f"{name:>28}: {seconds:7.2f} s, {len(statuses) / seconds:>9,.0f} rows/s "
+          f"(inserted {inserted}, duplicate {duplicates}){extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.002, help="Seconds added to every statement")
+    parser.add_argument('--chunk', type=int, default=500)
+    parser.add_argument('--writers', type=int, default=64)
+    parser.add_argument('--duplicates', type=float, default=0.1, help="Share of rows already in the table")
+    args = parser.parse_args()
+
+    import logger_config  # noqa: F401 - configure handlers before quietening them
+    # Per-row inserts log every expected duplicate as an error
+    logging.disable(logging.ERROR)
+
+    # The first share of rows is preloaded so every method meets the same conflicts
+    preload = int(args.rows * args.duplicates)
+    rows = make_rows(args.rows)
+
+    for name, run in [
+        ('per-row insert + commit', lambda db: (per_row(db, rows), '')),
+        (f'per-row, {args.writers} writers', lambda db: (per_row_concurrent(db, rows, args.writers), '')),
+        (f'bulk_insert_rows x{args.chunk}', lambda db: (bulk(db, rows, args.chunk), '')),
+        (f'BufferedWriter, {args.writers} writers', lambda db: (
+            lambda result: (result[0], f", {result[1]} flushes")
+        )(buffered(db, rows, args.chunk, args.writers))),
+    ]:
+        db = fresh_db(args.latency)
+        if preload:
+            db.bulk_insert_rows(TABLE, rows[:preload])
+        started = time.perf_counter()
+        statuses, extra = run(db)
+        report(name, time.perf_counter() - started, statuses, extra)
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Synthetic supplier_products table for offline runs, on SQLite or Postgres.
+
+Rows are seeded, so the same --rows and --seed always give the same table.
+
+    python -m bench.fixtures --rows 100000 --database-url sqlite:///bench.db
+"""
+import argparse
+import random
+import time
+from sqlalchemy import (
+    Column, DateTime, Float, Integer, MetaData, String, Table, Text, UniqueConstraint, create_engine, insert
+)
+from bench.similarity_index_bench import PRODUCT_ATTRIBUTES, PRODUCT_WORDS, synthetic_names
+
+TABLE_NAME = 'supplier_products'
+CATEGORIES = ['Hardware', 'Electrical', 'Packaging', 'Fasteners', 'Hydraulics', 'Pneumatics', 'Tooling']
+
+metadata = MetaData()
+supplier_products = Table(
+    TABLE_NAME, metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('supplier_name', String(255), nullable=False),
+    Column('product_name', String(255), nullable=False),
+    Column('category', String(64)),
+    Column('description', Text),
+    Column('unit_price', Float),
+    Column('min_order_qty', Integer),
+    Column('lead_time_days', Integer),
+    Column('creation_date', DateTime),
+    UniqueConstraint('supplier_name', 'product_name'),
+)
+
+# How the OpenAI stub should answer each column so generated rows pass validation
+FIELD_KINDS = {
+    'unit_price': 'number',
+    'min_order_qty': 'integer',
+    'lead_time_days': 'integer',
+    'creation_date': 'date',
+}
+
+
+def synthetic_rows(count, seed=42):
+    rng = random.Random(seed + 1)
+    for i, (supplier_name, product_name) in enumerate(synthetic_names(count, seed)):
+        yield {
+            'supplier_name': supplier_name,
+            'product_name': product_name,
+            'category': CATEGORIES[i % len(CATEGORIES)],
+            'description': f"{rng.choice(PRODUCT_ATTRIBUTES)} {rng.choice(PRODUCT_WORDS).lower()} "
+                           f"for {CATEGORIES[(i * 7) % len(CATEGORIES)].lower()} applications",
+            'unit_price': round(rng.uniform(0.5, 2500), 2),
+            'min_order_qty': rng.choice([1, 5, 10, 25, 50, 100, 500]),
+            'lead_time_days': rng.randint(1, 90),
+            'creation_date': None,
+        }
+
+
+def build_table(database_url, rows, seed=42, chunk=50_000):
+    """(Re)create supplier_products at database_url with rows synthetic rows; returns their keys."""
+    engine = create_engine(database_url)
+    keys = set()
+    try:
+        metadata.drop_all(engine, tables=[supplier_products])
+        metadata.create_all(engine, tables=[supplier_products])
+        batch = []
+        with engine.begin() as conn:
+            for row in synthetic_rows(rows, seed):
+                # synthetic_names can repeat a pair; the unique key keeps the first
+                key = (row['supplier_name'], row['product_name'])
+                if key in keys:
+                    continue
+                keys.add(key)
+                batch.append(row)
+                if len(batch) >= chunk:
+                    conn.execute(insert(supplier_products), batch)
+                    batch = []
+            if batch:
+                conn.execute(insert(supplier_products), batch)
+    finally:
+        engine.dispose()
+    return keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', required=True)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    keys = build_table(args.database_url, args.rows, args.seed)
+    print(f"{len(keys)} rows in {TABLE_NAME} ({time.perf_counter() - started:.1f} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Batch validation: validate_data_format per row vs validate_frame over a DataFrame.
+
+Builds a generated batch with a share of bad values, validates it both ways
+and checks they agree on which rows pass.
+
+    python -m bench.frame_validation_bench --rows 100000 --bad 0.05
+"""
+import argparse
+import logging
+import random
+import re
+import time
+import pandas as pd
+from sqlalchemy import types
+
+
+def build_schema():
+    from schema_cache import TableSchema
+
+    return TableSchema('supplier_products', [
+        {'name': 'id', 'type': types.Integer(), 'nullable': False, 'autoincrement': True, 'primary_key': True},
+        {'name': 'supplier_name', 'type': types.String(255), 'nullable': False},
+        {'name': 'product_name', 'type': types.String(255), 'nullable': False},
+        {'name': 'creation_date', 'type': types.DateTime(), 'nullable': True},
+        {'name': 'category', 'type': types.String(64), 'nullable': True},
+        {'name': 'description', 'type': types.Text(), 'nullable': True},
+        {'name': 'unit_price', 'type': types.Numeric(10, 2), 'nullable': True},
+        {'name': 'min_order_qty', 'type': types.Integer(), 'nullable': True},
+        {'name': 'lead_time_days', 'type': types.Integer(), 'nullable': True},
+        {'name': 'certified', 'type': types.Boolean(), 'nullable': True},
+        {'name': 'sku', 'type': types.String(32), 'nullable': True},
+    ])
+
+
+def build_rows(count, bad, seed=7):
+    rng = random.Random(seed)
+    broken = {
+        'creation_date': 'last tuesday',
+        'category': 'x' * 80,
+        'unit_price': 'about ten',
+        'min_order_qty': '12.5',
+        'lead_time_days': 'two weeks',
+        'certified': 'maybe',
+        'sku': 'not a sku!',
+    }
+    rows = []
+    for i in range(count):
+        row = {
+            'supplier_name': f"Supplier {i % 500}",
+            'product_name': f"Product {i}",
+            'creation_date': f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d} 12:00:00",
+            'category': rng.choice(['Hardware', 'Electrical', 'Packaging', 'Fasteners']),
+            'description': f"Reference product {i} with a documented bill of materials",
+            'unit_price': f"{rng.uniform(1, 500):.2f}",
+            'min_order_qty': str(rng.choice([1, 10, 50, 100])),
+            'lead_time_days': rng.randint(1, 60),
+            'certified': rng.choice(['yes', 'no', True, False]),
+            'sku': f"SKU-{i:08d}",
+        }
+        if rng.random() < bad:
+            column = rng.choice(list(broken))
+            row[column] = broken[column]
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--bad', type=float, default=0.05, help="Share of rows with one invalid value")
+    args = parser.parse_args()
+
+    import logger_config  # noqa: F401 - configure handlers before quietening them
+    logging.getLogger().setLevel(logging.WARNING)
+    from data_validator import DataValidator
+
+    validator = DataValidator()
+    patterns = {'sku': r'SKU-\d{8}'}
+    schema = build_schema()
+    rows = build_rows(args.rows, args.bad)
+    frame = pd.DataFrame(rows)
+
+    started = time.perf_counter()
+    row_valid = []
+    for row in rows:
+        try:
+            validator.validate_data_format(row, schema)
+            row_valid.append(re.fullmatch(patterns['sku'], row['sku']) is not None)
+        except ValueError:
+            row_valid.append(False)
+    per_row = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = validator.validate_frame(frame, schema, patterns=patterns)
+    vectorized = time.perf_counter() - started
+
+    disagree = int((result.valid != pd.Series(row_valid).to_numpy()).sum())
+    print(f"{args.rows} rows, {int((~result.valid).sum())} invalid")
+    print(f"  per row:    {per_row * 1000:8.1f} ms  ({args.rows / per_row:10.0f} rows/s)")
+    print(f"  vectorized: {vectorized * 1000:8.1f} ms  ({args.rows / vectorized:10.0f} rows/s)  "
+          f"{per_row / vectorized:.1f}x faster")
+    print(f"  rows where the two disagree: {disagree}")
+    print(f"  failures: {result.summary()}")
+
+
+if __name__ == '__main__':
+    main()
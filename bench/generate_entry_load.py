@@ -0,0 +1,155 @@
+"""Load benchmark for /api/generate-entry against local OpenAI, web and DB stubs.
+
+Runs the same workload twice: once through a replica of the original blocking
+handler (sync OpenAI client, requests, trafilatura and direct DB calls inside the
+event loop) and once through the async app in main.py.
+
+    python -m bench.generate_entry_load --requests 40 --concurrency 20
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+import httpx
+from bench.stubs import (
+    ServerThread, add_db_latency, build_openai_stub, build_web_stub, percentile
+)
+
+
+def build_blocking_app():
+    import trafilatura
+    from bs4 import BeautifulSoup
+    from fastapi import FastAPI, HTTPException
+    from openai import OpenAI
+    from sqlite_connector import SQLiteConnector
+    from data_validator import DataValidator
+    from main import ProductRequest
+
+    app = FastAPI()
+    app.state.db = None
+    client = OpenAI()
+    validator = DataValidator()
+    search_url = os.environ['SEARCH_URL']
+
+    def chat(system, prompt):
+        response = client.chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "system", "content": system}, {"role": "user", "content": prompt}],
+            response_format={"type": "json_object"}
+        )
+        return json.loads(response.choices[0].message.content)
+
+    @app.on_event("startup")
+    async def startup():
+        app.state.db = SQLiteConnector()
+
+    @app.post("/api/generate-entry")
+    async def generate_entry(request: ProductRequest):
+        try:
+            db = app.state.db
+            existing_data = db.get_table_data(request.table_name)
+            html = httpx.get(
+                search_url, params={'q': f"{request.supplier_name} {request.product_name} specifications"}
+            ).text
+            links = [a.get('href') for a in BeautifulSoup(html, 'html.parser').find_all('a')]
+            url = links[0].split('/url?q=')[1].split('&')[0]
+            content = trafilatura.extract(httpx.get(url).text)
+            ai_responses = chat("product data analyst", f"{existing_data.to_dict('records')} {content}")
+            chat("data validation expert", str(ai_responses))
+            new_data = {
+                'supplier_name': request.supplier_name,
+                'product_name': request.product_name,
+                **ai_responses
+            }
+            new_data = validator.validate_data_format(new_data)
+            validator.validate_unique_entry(new_data, existing_data)
+            db.insert_ai_generated_row(request.table_name, new_data)
+            return {"status": "success"}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    return app
+
+
+async def drive_load(base_url, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        async def one(i):
+            nonlocal failures
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/api/generate-entry", json={
+                    "supplier_name": "Bench Supplier",
+                    "product_name": f"Product {uuid.uuid4().hex[:12]}"
+                })
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    failures += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "failures": failures,
+        "rps": total / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def run_mode(name, app_factory, args, port):
+    app = app_factory()
+    with ServerThread(app, port) as server:
+        db = app.state.db if hasattr(app.state, 'db') else app.state.components.db
+        add_db_latency(db.engine, args.db_latency)
+        result = asyncio.run(drive_load(server.url, args.requests, args.concurrency))
+    print(f"{name:>9}: {result['rps']:7.2f} req/s  p50 {result['p50_ms']:8.1f} ms  "
+          f"p99 {result['p99_ms']:8.1f} ms  failures {result['failures']}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--openai-latency', type=float, default=0.2)
+    parser.add_argument('--web-latency', type=float, default=0.05)
+    parser.add_argument('--db-latency', type=float, default=0.005)
+    parser.add_argument('--port', type=int, default=18000)
+    args = parser.parse_args()
+
+    import logger_config  # noqa: F401 - configure handlers before quietening them
+    logging.getLogger().setLevel(logging.WARNING)
+
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{workdir}/bench.db"
+    os.environ['DB_RUN_MIGRATIONS'] = 'true'
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{args.port + 1}/v1"
+    os.environ['OPENAI_API_KEY'] = 'bench'
+    os.environ['SEARCH_URL'] = f"http://127.0.0.1:{args.port + 2}/search"
+    os.environ['SCRAPE_CACHE_PATH'] = f"{workdir}/scrape_cache.db"
+    # Every stub page lives on 127.0.0.1, so the per-host cap would throttle the whole run
+    os.environ['SCRAPER_PER_HOST_LIMIT'] = '64'
+    os.environ['SIMILARITY_INDEX_DIR'] = f"{workdir}/indexes"
+
+    with ServerThread(build_openai_stub(args.openai_latency), args.port + 1), \
+            ServerThread(build_web_stub(args.web_latency), args.port + 2):
+        before = run_mode('blocking', build_blocking_app, args, args.port)
+        after = run_mode('async', lambda: importlib.import_module('main').create_app(), args, args.port + 3)
+
+    print(f"speedup: {after['rps'] / before['rps']:.1f}x throughput, "
+          f"p99 {before['p99_ms'] / after['p99_ms']:.1f}x lower")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""The app under `manage.py serve` with several worker processes, against the stubs.
+
+Replays a seeded generate-entry workload (bench.replay) with many repeated
+keys against each worker count, and checks the guarantees that must survive
+going multi-process: every key is stored at most once, and the OpenAI stub,
+which answers 429 above --stub-rpm, is not pushed over its limit when the
+app is configured just below it. --no-shared runs the workers without
+SHARED_STATE_DIR to show what the shared budgets and key claims prevent.
+
+    python -m bench.multiworker --workers 1 4 --requests 300 --concurrency 32
+"""
+import argparse
+import asyncio
+import collections
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from sqlalchemy import create_engine, text
+from bench.replay import build_workload, drive
+from bench.stubs import ServerThread, build_openai_stub, build_web_stub
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(workers, port, env, log):
+    process = subprocess.Popen(
+        [sys.executable, 'manage.py', 'serve', '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers)],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}, see {log.name}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not become healthy")
+
+
+def stored_counts(database_url, workload):
+    """Rows in the table for each workload key."""
+    from bench.fixtures import TABLE_NAME
+    from uniqueness_index import normalize_key
+
+    wanted = {normalize_key(*key) for key in workload}
+    counts = collections.Counter()
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as conn:
+            for supplier_name, product_name in conn.execute(
+                text(f"SELECT supplier_name, product_name FROM {TABLE_NAME}")
+            ):
+                key = normalize_key(supplier_name, product_name)
+                if key in wanted:
+                    counts[key] += 1
+    finally:
+        engine.dispose()
+    return counts
+
+
+def run(workers, args, stub, shared):
+    from bench.fixtures import build_table
+
+    workdir = tempfile.mkdtemp(prefix='multiworker_')
+    database_url = f"sqlite:///{workdir}/bench.db"
+    build_table(database_url, args.rows, args.seed)
+    env = {
+        **os.environ,
+        'DATABASE_URL': database_url,
+        'OPENAI_BASE_URL': f"http://127.0.0.1:{args.port + 1}/v1",
+        'OPENAI_API_KEY': 'bench',
+        'OPENAI_RPM': str(args.rpm),
+        'SEARCH_URL': f"http://127.0.0.1:{args.port + 2}/search",
+        'SCRAPE_CACHE_PATH': f"{workdir}/scrape_cache.db",
+        'SCRAPER_PER_HOST_LIMIT': '64',
+        'SIMILARITY_INDEX_DIR': f"{workdir}/indexes",
+        'VALIDATION_RULES_DIR': f"{workdir}/rules",
+        'AI_CACHE_PATH': f"{workdir}/ai_cache.db",
+        'JOB_STORE_URL': 'memory',
+        'SHARED_STATE_DIR': f"{workdir}/shared" if shared else '',
+        'LOG_DIR': '',
+    }
+    workload = build_workload(args.rows, args.requests, args.duplicates, args.existing, args.seed)
+    stub.state.requests = 0
+    stub.state.rate_limited = 0
+
+    with open(f"{workdir}/server.log", 'w') as log:
+        server = start_server(workers, args.port, env, log)
+        try:
+            _, outcomes, elapsed = asyncio.run(drive(f"http://127.0.0.1:{args.port}", workload, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    statuses = collections.Counter(status for codes in outcomes.values() for status in codes)
+    successes = max(codes.count('200 success') for codes in outcomes.values())
+    rows = stored_counts(database_url, workload)
+    return {
+        'rps': len(workload) / elapsed,
+        'statuses': dict(sorted(statuses.items())),
+        'max_successes_per_key': successes,
+        'max_rows_per_key': max(rows.values(), default=0),
+        'openai_requests': stub.state.requests,
+        'openai_429s': stub.state.rate_limited,
+        'openai_rpm': stub.state.requests / elapsed * 60,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duplicates', type=float, default=0.3, help="Share of requests repeating an earlier one")
+    parser.add_argument('--existing', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--openai-latency', type=float, default=0.2)
+    parser.add_argument('--web-latency', type=float, default=0.05)
+    parser.add_argument('--stub-rpm', type=int, default=1200, help="The stub answers 429 above this rate")
+    parser.add_argument('--rpm', type=int, default=1080, help="OPENAI_RPM the app is configured with")
+    parser.add_argument('--no-shared', action='store_true', help="Run the workers without shared state")
+    parser.add_argument('--port', type=int, default=18200)
+    args = parser.parse_args()
+
+    import logger_config  # noqa: F401 - configure handlers before quietening them
+    logging.getLogger().setLevel(logging.WARNING)
+    from bench.fixtures import FIELD_KINDS, supplier_products
+
+    fields = [column.name for column in supplier_products.columns if column.name != 'id']
+    stub = build_openai_stub(args.openai_latency, fields=fields, field_kinds=FIELD_KINDS, rate_limit_rpm=args.stub_rpm)
+    failed = False
+    with ServerThread(stub, args.port + 1), ServerThread(build_web_stub(args.web_latency), args.port + 2):
+        for workers in args.workers:
+            result = run(workers, args, stub, not args.no_shared)
+            print(f"{workers} worker(s): {result['rps']:.2f} req/s  statuses {result['statuses']}")
+            print(f"  rows per key <= {result['max_rows_per_key']}, successes per key <= "
+                  f"{result['max_successes_per_key']} | OpenAI {result['openai_requests']} requests at "
+                  f"{result['openai_rpm']:.0f}/min (limit {args.stub_rpm}), {result['openai_429s']} answered 429")
+            failed = failed or result['max_rows_per_key'] > 1 or result['max_successes_per_key'] > 1
+    if failed:
+        print("A key was stored more than once")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
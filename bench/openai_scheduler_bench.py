@@ -0,0 +1,127 @@
+"""OpenAI scheduler against a rate-limited fake server: blind vs backoff vs budgeted.
+
+The stub answers 429 with Retry-After above --server-rpm. Also shows fair
+queueing (single requests behind a large batch) and coalescing of identical
+in-flight requests.
+
+    python -m bench.openai_scheduler_bench --requests 100 --server-rpm 600
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from bench.stubs import ServerThread, build_openai_stub, percentile
+
+
+async def complete_all(processor, prompts, caller='default'):
+    from ai_processor import ANALYSIS_SYSTEM_PROMPT
+    from rate_limiter import current_caller
+
+    current_caller.set(caller)
+    latencies = []
+
+    async def one(prompt):
+        started = time.perf_counter()
+        try:
+            await processor._complete(ANALYSIS_SYSTEM_PROMPT, prompt, bypass_cache=True)
+            latencies.append(time.perf_counter() - started)
+            return True
+        except Exception:
+            return False
+
+    results = await asyncio.gather(*(one(prompt) for prompt in prompts))
+    return sum(results), latencies
+
+
+def run(processor, coroutine):
+    async def go():
+        try:
+            return await coroutine
+        finally:
+            await processor.openai.close()
+    return asyncio.run(go())
+
+
+def scenario(stub, name, scheduler, prompts):
+    from ai_processor import AIProcessor
+
+    limited_before = stub.state.rate_limited
+    processor = AIProcessor(scheduler=scheduler)
+    started = time.perf_counter()
+    ok, latencies = run(processor, complete_all(processor, prompts))
+    elapsed = time.perf_counter() - started
+    stats = scheduler.stats()
+    print(f"{name:>22}: {ok:4d}/{len(prompts)} ok in {elapsed:6.2f} s, "
+          f"server 429s {stub.state.rate_limited - limited_before:4d}, retries {stats['retries']:4d}, "
+          f"queue wait avg {stats['wait_ms_avg']:7.1f} ms max {stats['wait_seconds_max'] * 1000:7.1f} ms")
+
+
+def fairness(stub, rpm, batch_size, singles):
+    from ai_processor import AIProcessor
+    from rate_limiter import OpenAIScheduler
+
+    processor = AIProcessor(scheduler=OpenAIScheduler(rpm=rpm, max_retries=8))
+
+    async def go():
+        batch = asyncio.ensure_future(
+            complete_all(processor, [f"fair batch {i}" for i in range(batch_size)], caller='batch')
+        )
+        await asyncio.sleep(0.2)
+        single = await asyncio.gather(*(
+            complete_all(processor, [f"fair single {i}"], caller=f"single-{i}") for i in range(singles)
+        ))
+        _, batch_latencies = await batch
+        return [latency for _, latencies in single for latency in latencies], batch_latencies
+
+    single_latencies, batch_latencies = run(processor, go())
+    print(f"{'fair queueing':>22}: {singles} single requests behind a {batch_size}-request batch: "
+          f"p50 {percentile(single_latencies, 50) * 1000:7.1f} ms (batch p50 "
+          f"{percentile(batch_latencies, 50) * 1000:7.1f} ms, last {max(batch_latencies):5.2f} s)")
+
+
+def coalescing(stub, copies):
+    from ai_processor import AIProcessor
+    from rate_limiter import OpenAIScheduler
+
+    scheduler = OpenAIScheduler()
+    before = stub.state.requests
+    processor = AIProcessor(scheduler=scheduler)
+    run(processor, complete_all(processor, ["same prompt"] * copies))
+    print(f"{'coalescing':>22}: {copies} identical concurrent requests -> "
+          f"{stub.state.requests - before} server call(s), {scheduler.stats()['coalesced']} coalesced")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--server-rpm', type=int, default=600)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--port', type=int, default=8941)
+    args = parser.parse_args()
+
+    import logger_config  # noqa: F401 - configure handlers before quietening them
+    logging.getLogger().setLevel(logging.ERROR)
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ['OPENAI_API_KEY'] = 'bench'
+    from rate_limiter import OpenAIScheduler
+
+    stub = build_openai_stub(args.latency, rate_limit_rpm=args.server_rpm)
+    with ServerThread(stub, args.port):
+        def prompts(tag):
+            return [f"{tag} entry {i}" for i in range(args.requests)]
+
+        for name, scheduler in [
+            ('blind, no retries', OpenAIScheduler(rpm=0, max_retries=0, max_concurrency=1000)),
+            ('backoff only', OpenAIScheduler(rpm=0, max_retries=8, max_concurrency=1000)),
+            ('budgeted + backoff', OpenAIScheduler(rpm=args.server_rpm, max_retries=8)),
+        ]:
+            time.sleep(1.5)  # let the server's burst allowance refill between scenarios
+            scenario(stub, name, scheduler, prompts(name))
+        time.sleep(1.5)
+        fairness(stub, args.server_rpm, args.requests, 5)
+        coalescing(stub, 20)
+
+
+if __name__ == '__main__':
+    main()
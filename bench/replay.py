@@ -0,0 +1,272 @@
+"""Deterministic replay of /api/generate-entry against a stored baseline.
+
+Builds a seeded synthetic supplier_products table (bench.fixtures), starts the
+OpenAI and web stubs and the app in main.py, and replays a seeded workload:
+new products, repeats of earlier requests and products already in the table.
+Reports throughput, request and per-stage latency percentiles, peak memory and
+OpenAI calls and tokens per entry.
+
+The result is compared with the scenario's entry in the baseline file. Any
+regression beyond the tolerance, or a different set of outcomes, exits with
+status 1. --update-baseline records the current run instead.
+
+    python -m bench.replay --rows 10000 --requests 200 --concurrency 8
+    python -m bench.replay --rows 1000000 --database-url postgresql://bench@localhost/bench
+"""
+import argparse
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from bench.stubs import ServerThread, add_db_latency, build_openai_stub, build_web_stub, percentile
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'replay.json')
+
+# name -> (higher is better, uses the timing tolerance); deterministic counts get the tight one
+CHECKS = {
+    'requests_per_second': (True, True),
+    'p50_ms': (False, True),
+    'p95_ms': (False, True),
+    'peak_rss_mb': (False, True),
+    'openai_calls_per_entry': (False, False),
+    'prompt_tokens_per_entry': (False, False),
+}
+
+
+def build_workload(rows, requests, duplicates, existing, seed):
+    """Seeded list of (supplier_name, product_name) requests."""
+    from bench.similarity_index_bench import synthetic_names
+
+    rng = random.Random(seed)
+    wanted = sorted(rng.sample(range(rows), min(rows, max(1, int(requests * existing)))))
+    existing_keys = []
+    for i, key in enumerate(synthetic_names(rows, seed)):
+        if len(existing_keys) == len(wanted):
+            break
+        if i == wanted[len(existing_keys)]:
+            existing_keys.append(key)
+
+    workload = []
+    for i in range(requests):
+        draw = rng.random()
+        if workload and draw < duplicates:
+            workload.append(rng.choice(workload))
+        elif draw < duplicates + existing:
+            workload.append(rng.choice(existing_keys))
+        else:
+            workload.append((f"Replay Supplier {i % 50}", f"Replay Product {seed}-{i}"))
+    return workload
+
+
+async def drive(base_url, workload, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    outcomes = collections.defaultdict(list)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        async def one(supplier_name, product_name):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/api/generate-entry", json={
+                    "supplier_name": supplier_name,
+                    "product_name": product_name
+                })
+                latencies.append(time.perf_counter() - started)
+                # Validation failures come back as 200 with status "error"
+                body = response.json() if response.status_code == 200 else {}
+                outcome = f"{response.status_code} {body['status']}" if 'status' in body else str(response.status_code)
+                outcomes[f"{supplier_name}\x1f{product_name}"].append(outcome)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(*key) for key in workload))
+        elapsed = time.perf_counter() - started
+    return latencies, outcomes, elapsed
+
+
+def collect(workload, latencies, outcomes, elapsed, usage):
+    from telemetry import STAGE_SECONDS
+
+    statuses = collections.Counter(status for codes in outcomes.values() for status in codes)
+    # Which request of a repeated key wins depends on timing, the statuses per key do not
+    digest = hashlib.sha256(json.dumps(
+        sorted((key, sorted(codes)) for key, codes in outcomes.items())
+    ).encode('utf-8')).hexdigest()[:16]
+    stages = {}
+    for labels in sorted(STAGE_SECONDS.label_values(), key=lambda labels: labels['stage']):
+        stages[labels['stage']] = {
+            'count': STAGE_SECONDS.count(**labels),
+            'mean_ms': round(STAGE_SECONDS.mean(**labels) * 1000, 2),
+            'p50_ms': round(STAGE_SECONDS.quantile(0.5, **labels) * 1000, 2),
+            'p95_ms': round(STAGE_SECONDS.quantile(0.95, **labels) * 1000, 2),
+        }
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        'requests': len(workload),
+        'requests_per_second': round(len(workload) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'peak_rss_mb': round(peak_rss_mb, 1),
+        'openai_calls_per_entry': round(usage['requests'] / len(workload), 3),
+        'prompt_tokens_per_entry': round(usage['prompt_tokens'] / len(workload), 1),
+        'completion_tokens_per_entry': round(usage['completion_tokens'] / len(workload), 1),
+        'statuses': dict(sorted(statuses.items())),
+        'outcome_digest': digest,
+        'stages': stages,
+    }
+
+
+def compare(result, baseline, tolerance, count_tolerance, min_stage_ms):
+    """Regression messages for result against baseline."""
+    regressions = []
+
+    def check(name, current, previous, higher_is_better, allowed):
+        if previous is None or current is None or not previous:
+            return
+        change = (current - previous) / previous
+        if (-change if higher_is_better else change) > allowed:
+            regressions.append(f"{name}: {previous} -> {current} ({change:+.0%}, allowed {allowed:.0%})")
+
+    for name, (higher_is_better, timing) in CHECKS.items():
+        check(name, result.get(name), baseline.get(name), higher_is_better,
+              tolerance if timing else count_tolerance)
+    for stage, previous in baseline.get('stages', {}).items():
+        current = result['stages'].get(stage)
+        if current is None:
+            regressions.append(f"stage {stage}: missing from this run")
+        elif previous['mean_ms'] >= min_stage_ms:
+            # Quantiles are bucket estimates, the mean is exact
+            check(f"stage {stage} mean_ms", current['mean_ms'], previous['mean_ms'], False, tolerance)
+    if result['outcome_digest'] != baseline.get('outcome_digest'):
+        regressions.append(
+            f"outcomes differ: statuses {baseline.get('statuses')} -> {result['statuses']} "
+            f"(digest {baseline.get('outcome_digest')} -> {result['outcome_digest']})"
+        )
+    return regressions
+
+
+def report(scenario, result):
+    print(f"{scenario}: {result['requests']} requests, {result['requests_per_second']:.2f} req/s, "
+          f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms")
+    print(f"  peak RSS {result['peak_rss_mb']:.0f} MB | OpenAI {result['openai_calls_per_entry']:.2f} calls, "
+          f"{result['prompt_tokens_per_entry']:.0f} prompt / {result['completion_tokens_per_entry']:.0f} completion "
+          f"tokens per entry | statuses {result['statuses']} digest {result['outcome_digest']}")
+    print(f"  {'stage':<28} {'count':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for stage, values in result['stages'].items():
+        print(f"  {stage:<28} {values['count']:>7} {values['mean_ms']:>9.2f} {values['p50_ms']:>9.2f} "
+              f"{values['p95_ms']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000, help="Synthetic rows in supplier_products")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duplicates', type=float, default=0.1, help="Share of requests repeating an earlier one")
+    parser.add_argument('--existing', type=float, default=0.05, help="Share of requests for rows already in the table")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--warmup', type=int, default=0,
+                        help="Unmeasured requests first, so snapshot and index builds are not in the numbers")
+    parser.add_argument('--openai-latency', type=float, default=0.2)
+    parser.add_argument('--web-latency', type=float, default=0.05)
+    parser.add_argument('--db-latency', type=float, default=0.0, help="Added per SQLite statement")
+    parser.add_argument('--database-url', help="Defaults to a temporary SQLite file; Postgres works too")
+    parser.add_argument('--port', type=int, default=18100)
+    parser.add_argument('--scenario', help="Baseline key (default: derived from the workload arguments)")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed relative regression for throughput, latency and memory")
+    parser.add_argument('--count-tolerance', type=float, default=0.02,
+                        help="Allowed relative increase in OpenAI calls and tokens per entry")
+    parser.add_argument('--min-stage-ms', type=float, default=10.0,
+                        help="Only compare stages whose baseline mean is at least this")
+    args = parser.parse_args()
+    scenario = args.scenario or (
+        f"rows{args.rows}-req{args.requests}-c{args.concurrency}-dup{args.duplicates}-existing{args.existing}"
+        f"-seed{args.seed}" + (f"-warmup{args.warmup}" if args.warmup else "")
+    )
+
+    workdir = tempfile.mkdtemp(prefix='replay_')
+    database_url = args.database_url or f"sqlite:///{workdir}/replay.db"
+    # The table is built in a child process so its memory does not count towards the app's peak
+    subprocess.run(
+        [sys.executable, '-m', 'bench.fixtures', '--rows', str(args.rows), '--seed', str(args.seed),
+         '--database-url', database_url],
+        check=True
+    )
+
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{args.port + 1}/v1"
+    os.environ['OPENAI_API_KEY'] = 'bench'
+    os.environ['SEARCH_URL'] = f"http://127.0.0.1:{args.port + 2}/search"
+    os.environ['SCRAPE_CACHE_PATH'] = f"{workdir}/scrape_cache.db"
+    os.environ['SCRAPER_PER_HOST_LIMIT'] = '64'
+    os.environ['SIMILARITY_INDEX_DIR'] = f"{workdir}/indexes"
+    os.environ['VALIDATION_RULES_DIR'] = f"{workdir}/rules"
+
+    import logger_config  # noqa: F401 - configure handlers before quietening them
+    # Repeated and existing products are rejected on purpose, keep those errors out of the report
+    logging.getLogger().setLevel(logging.CRITICAL)
+    from bench.fixtures import FIELD_KINDS, supplier_products
+    from telemetry import registry
+
+    fields = [column.name for column in supplier_products.columns if column.name != 'id']
+    workload = build_workload(args.rows, args.requests, args.duplicates, args.existing, args.seed)
+    with ServerThread(build_openai_stub(args.openai_latency, fields=fields, field_kinds=FIELD_KINDS), args.port + 1), \
+            ServerThread(build_web_stub(args.web_latency), args.port + 2):
+        from main import create_app
+        app = create_app()
+        components = app.state.components
+        with ServerThread(app, args.port) as server:
+            if args.db_latency and database_url.startswith('sqlite'):
+                add_db_latency(components.db.engine, args.db_latency)
+            if args.warmup:
+                warmup = [(f"Warmup Supplier {i}", f"Warmup Product {args.seed}-{i}") for i in range(args.warmup)]
+                asyncio.run(drive(server.url, warmup, args.concurrency))
+                usage = components.ai_processor.usage
+                usage.update(dict.fromkeys(usage, 0))
+            # Startup work (schema reads, warm-up) is not part of the replay
+            registry.reset()
+            latencies, outcomes, elapsed = asyncio.run(drive(server.url, workload, args.concurrency))
+            result = collect(workload, latencies, outcomes, elapsed, components.ai_processor.usage)
+
+    report(scenario, result)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baselines = json.load(f)
+    if args.update_baseline:
+        baselines[scenario] = result
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline for {scenario} written to {args.baseline}")
+        return
+    if scenario not in baselines:
+        print(f"No baseline for {scenario} in {args.baseline}; record one with --update-baseline")
+        return
+
+    regressions = compare(result, baselines[scenario], args.tolerance, args.count_tolerance, args.min_stage_ms)
+    if regressions:
+        print(f"REGRESSION against {args.baseline} [{scenario}]:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print(f"No regressions against {args.baseline} [{scenario}]")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Local validation rules: OpenAI calls per entry with and without the precheck.
+
+Runs AIProcessor against the local OpenAI stub, which answers a share of entries
+with a bad value. With the precheck, DataValidator's schema checks and a rule
+file reject those entries before the AI validation call. Both runs must accept
+the same entries. Also times the compiled rules on their own.
+
+    python -m bench.rule_engine_bench --entries 60 --bad 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from sqlalchemy import types
+from bench.stubs import ServerThread, build_openai_stub
+
+RULES = {
+    'required': ['supplier_name', 'product_name', 'creation_date'],
+    'columns': {
+        'creation_date': {'type': 'date', 'nullable': False},
+        'attribute_0': {'pattern': r'attribute_0 value [0-9a-f]{6}', 'max_length': 64},
+        'attribute_1': {'min_length': 3},
+    },
+    'checks': [
+        {'name': 'attribute_2_with_attribute_1', 'when': {'column': 'attribute_1', 'in': ['n/a']},
+         'require': ['attribute_2']},
+    ],
+}
+
+
+def build_schema(fields):
+    from schema_cache import TableSchema
+
+    columns = [{'name': 'id', 'type': types.Integer(), 'nullable': False, 'autoincrement': True, 'primary_key': True}]
+    for field in fields:
+        column_type = types.DateTime() if 'date' in field else types.String(255)
+        columns.append({'name': field, 'type': column_type, 'nullable': field != 'creation_date'})
+    return TableSchema('bench_products', columns)
+
+
+async def run(fields, entries, concurrency, validator, schema, use_precheck):
+    from ai_processor import AIProcessor
+
+    processor = AIProcessor()
+    history = '[{"supplier_name":"Acme","product_name":"Widget 1","category":"Hardware"}]'
+    content = "The Widget is a reference product. Operating voltage 12V DC, weight 1.2 kg. " * 20
+    semaphore = asyncio.Semaphore(concurrency)
+    accepted = set()
+
+    async def entry(i):
+        key = {'supplier_name': 'Acme', 'product_name': f"Widget {i}"}
+        precheck = None
+        if use_precheck:
+            precheck = lambda responses: validator.precheck({**responses, **key}, schema)
+        async with semaphore:
+            responses, validation = await processor.generate_validated(
+                f"{history} entry {i}", content, fields[2:], bypass_cache=True, precheck=precheck
+            )
+        if not validation['is_valid']:
+            return
+        try:
+            validator.validate_data_format({**responses, **key}, schema)
+            accepted.add(i)
+        except ValueError:
+            pass
+
+    started = time.perf_counter()
+    await asyncio.gather(*(entry(i) for i in range(entries)))
+    return {
+        'elapsed': time.perf_counter() - started,
+        'calls': processor.usage['requests'] / entries,
+        'avoided': processor.usage['calls_avoided'],
+        'accepted': accepted,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=60)
+    parser.add_argument('--fields', type=int, default=12)
+    parser.add_argument('--bad', type=float, default=0.2, help="Share of entries the stub answers with a bad value")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.3, help="Seconds per call before generation")
+    parser.add_argument('--rows', type=int, default=100000, help="Rows for the rule throughput check")
+    parser.add_argument('--port', type=int, default=8933)
+    args = parser.parse_args()
+
+    import logger_config  # noqa: F401 - configure handlers before quietening them
+    # Rejected entries are expected here, keep their validation errors out of the output
+    logging.getLogger().setLevel(logging.CRITICAL)
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ['OPENAI_API_KEY'] = 'bench'
+    from data_validator import DataValidator
+    from validation_rules import RuleEngine
+
+    fields = ['supplier_name', 'product_name', 'creation_date'] + [f"attribute_{i}" for i in range(args.fields - 3)]
+    schema = build_schema(fields)
+    with tempfile.TemporaryDirectory() as rules_dir:
+        with open(os.path.join(rules_dir, f"{schema.table_name}.json"), 'w') as f:
+            json.dump(RULES, f)
+        engine = RuleEngine(rules_dir)
+        validator = DataValidator(rules=engine)
+
+        stub = build_openai_stub(args.latency, fields=fields, bad_answers=args.bad)
+        with ServerThread(stub, args.port):
+            without = asyncio.run(run(fields, args.entries, args.concurrency, validator, schema, False))
+            with_rules = asyncio.run(run(fields, args.entries, args.concurrency, validator, schema, True))
+
+        for name, result in (('no precheck', without), ('precheck', with_rules)):
+            print(f"{name:>11}: {result['calls']:.2f} calls/entry  {len(result['accepted'])}/{args.entries} accepted  "
+                  f"{result['avoided']} validation calls avoided  {result['elapsed']:.2f} s")
+        print(f"  entries accepted differently: {len(without['accepted'] ^ with_rules['accepted'])}")
+
+        rule_set = engine.rules(schema.table_name, schema)
+        row = {field: f"{field} value 0a1b2c" for field in fields}
+        row['creation_date'] = "2024-01-01 00:00:00"
+        started = time.perf_counter()
+        for _ in range(args.rows):
+            rule_set.check(row)
+        elapsed = time.perf_counter() - started
+        print(f"  {len(rule_set)} compiled rules: {elapsed / args.rows * 1e6:.1f} us/row")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Scrape cache benchmark against the local search/product fixture server.
+
+Runs the same supplier/product lookups cold, warm from memory, warm from the
+SQLite file in a fresh process-like cache, and after the TTL expires (ETag
+revalidation), and prints latency, upstream requests and cache metrics.
+
+    python -m bench.scrape_cache_bench --products 50
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from bench.stubs import ServerThread, build_web_stub, percentile
+
+
+async def lookup_all(scraper, products):
+    latencies = []
+    for supplier_name, product_name in products:
+        started = time.perf_counter()
+        await scraper.search_product_info(supplier_name, product_name)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run_phase(name, cache, products, server_app, search_url):
+    from web_scraper import WebScraper
+
+    before = dict(server_app.state.hits)
+    scraper = WebScraper(search_url=search_url, cache=cache)
+
+    async def go():
+        try:
+            return await lookup_all(scraper, products)
+        finally:
+            await scraper.close()
+
+    latencies = asyncio.run(go())
+    upstream = {key: server_app.state.hits[key] - before[key] for key in before}
+    print(f"{name:>12}: p50 {percentile(latencies, 50) * 1000:7.2f} ms  p99 {percentile(latencies, 99) * 1000:7.2f} ms  "
+          f"upstream {upstream}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--port', type=int, default=18100)
+    args = parser.parse_args()
+
+    import logger_config  # noqa: F401 - configure handlers before quietening them
+    logging.getLogger().setLevel(logging.WARNING)
+    from scrape_cache import ScrapeCache
+
+    path = os.path.join(tempfile.mkdtemp(prefix='scrape_cache_'), 'cache.db')
+    products = [(f"Supplier {i % 5}", f"Product {i}") for i in range(args.products)]
+    app = build_web_stub(args.latency)
+
+    with ServerThread(app, args.port) as server:
+        search_url = f"{server.url}/search"
+        cache = ScrapeCache(path, ttl=3600)
+        run_phase('cold', cache, products, app, search_url)
+        run_phase('memory', cache, products, app, search_url)
+        cache.close()
+
+        disk_cache = ScrapeCache(path, ttl=3600)
+        run_phase('disk', disk_cache, products, app, search_url)
+        print(f"{'':>12}  {disk_cache.stats()}")
+        disk_cache.close()
+
+        # Everything stale: searches are re-run, pages revalidated with If-None-Match
+        stale_cache = ScrapeCache(path, ttl=0)
+        run_phase('revalidate', stale_cache, products, app, search_url)
+        print(f"{'':>12}  {stale_cache.stats()}")
+        stale_cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Build and query benchmark for SimilarityIndex on synthetic supplier/product names.
+
+    python -m bench.similarity_index_bench --rows 1000000 --queries 1000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import numpy as np
+from similarity_index import SimilarityIndex
+
+SUPPLIER_WORDS = ['Acme', 'Global', 'Nordic', 'Pacific', 'United', 'Apex', 'Delta', 'Summit', 'Prime', 'Vertex']
+SUPPLIER_SUFFIXES = ['Industries', 'Supply', 'Components', 'Electronics', 'Tools', 'Materials']
+PRODUCT_WORDS = ['Valve', 'Sensor', 'Bracket', 'Cable', 'Pump', 'Filter', 'Motor', 'Switch', 'Gasket', 'Relay']
+PRODUCT_ATTRIBUTES = ['Steel', 'Brass', 'Compact', 'Heavy Duty', 'Micro', 'Industrial', 'Waterproof', 'Smart']
+
+
+def synthetic_names(count, seed=42):
+    rng = random.Random(seed)
+    for i in range(count):
+        supplier = f"{rng.choice(SUPPLIER_WORDS)} {rng.choice(SUPPLIER_SUFFIXES)} {i % 5000}"
+        product = f"{rng.choice(PRODUCT_ATTRIBUTES)} {rng.choice(PRODUCT_WORDS)} {rng.randint(100, 99999)}"
+        yield supplier, product
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--chunk', type=int, default=50_000)
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='simindex_'), 'supplier_products')
+    index = SimilarityIndex(path)
+
+    started = time.perf_counter()
+    names = list(synthetic_names(args.rows))
+    for start in range(0, len(names), args.chunk):
+        chunk = names[start:start + args.chunk]
+        index.add(chunk, [f"{supplier} {product}" for supplier, product in chunk])
+    build_seconds = time.perf_counter() - started
+    print(f"build: {args.rows} rows in {build_seconds:.1f}s ({args.rows / build_seconds:,.0f} rows/s), "
+          f"vectors {os.path.getsize(path + '.vectors.npy') / 2**20:.0f} MiB on disk")
+
+    index.close()
+    started = time.perf_counter()
+    reloaded = SimilarityIndex(path)
+    print(f"reload: {time.perf_counter() - started:.2f}s for {len(reloaded)} rows")
+
+    rng = random.Random(1)
+    queries = [names[rng.randrange(len(names))] for _ in range(args.queries)]
+    for label, exact in (('lsh', False), ('exact', True)):
+        timings = []
+        hits = 0
+        for supplier, product in queries[:args.queries if not exact else min(args.queries, 50)]:
+            # Drop one character, the way a user retyping a name might
+            text = f"{supplier} {product}".lower()
+            cut = rng.randrange(len(text))
+            query = text[:cut] + text[cut + 1:]
+            began = time.perf_counter()
+            results = reloaded.search(query, k=args.k, exact=exact)
+            timings.append(time.perf_counter() - began)
+            hits += any(key == (supplier, product) for key, _ in results)
+        timings = np.array(timings) * 1000
+        print(f"{label:>5}: p50 {np.percentile(timings, 50):.3f} ms  p99 {np.percentile(timings, 99):.3f} ms  "
+              f"recall@{args.k} {hits / len(timings):.3f}")
+
+
+if __name__ == '__main__':
+    main()
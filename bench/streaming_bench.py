@@ -0,0 +1,82 @@
+"""Streamed vs buffered AI analysis: time to the first answer and to the full result.
+
+Runs AIProcessor against the local OpenAI stub, which streams one ~4 character
+token per --token-latency seconds, and checks both paths return the same answers.
+
+    python -m bench.streaming_bench --entries 20 --fields 12 --token-latency 0.02
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from bench.stubs import ServerThread, build_openai_stub, percentile
+
+MODES = ['two_pass', 'combined']
+
+
+async def run_mode(mode, entries, fields, concurrency):
+    from ai_processor import AIProcessor
+
+    processor = AIProcessor()
+    history = '[{"supplier_name":"Acme","product_name":"Widget 1","category":"Hardware"}]'
+    content = "The Widget is a reference product. Operating voltage 12V DC, weight 1.2 kg. " * 20
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {'buffered': [], 'first_field': [], 'generated': [], 'streamed': []}
+    mismatches = 0
+
+    async def entry(i):
+        nonlocal mismatches
+        async with semaphore:
+            started = time.perf_counter()
+            buffered, _ = await processor.generate_validated(
+                f"{history} entry {i}", content, fields, mode=mode, bypass_cache=True
+            )
+            results['buffered'].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            arrivals = []
+
+            async def on_field(question, field):
+                arrivals.append(time.perf_counter() - started)
+
+            streamed, _ = await processor.stream_validated(
+                f"{history} entry {i}", content, fields, on_field, mode=mode, bypass_cache=True
+            )
+            results['streamed'].append(time.perf_counter() - started)
+            results['first_field'].append(arrivals[0])
+            results['generated'].append(arrivals[-1])
+            mismatches += streamed != buffered
+
+    await asyncio.gather(*(entry(i) for i in range(entries)))
+    return {name: percentile(values, 50) * 1000 for name, values in results.items()}, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=20)
+    parser.add_argument('--fields', type=int, default=12)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.3, help="Seconds to the first token")
+    parser.add_argument('--token-latency', type=float, default=0.02, help="Seconds per completion token")
+    parser.add_argument('--port', type=int, default=8932)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    args = parser.parse_args()
+
+    import logger_config  # noqa: F401 - configure handlers before quietening them
+    logging.getLogger().setLevel(logging.WARNING)
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ['OPENAI_API_KEY'] = 'bench'
+
+    fields = ['supplier_name', 'product_name', 'creation_date'] + [f"attribute_{i}" for i in range(args.fields - 3)]
+    stub = build_openai_stub(args.latency, fields=fields, token_latency=args.token_latency)
+    with ServerThread(stub, args.port):
+        for mode in args.modes:
+            result, mismatches = asyncio.run(run_mode(mode, args.entries, fields, args.concurrency))
+            print(f"{mode:>9}: p50 buffered {result['buffered']:7.1f} ms | streamed: first field "
+                  f"{result['first_field']:7.1f} ms, all fields {result['generated']:7.1f} ms, "
+                  f"validated {result['streamed']:7.1f} ms | answers differ in {mismatches}/{args.entries}")
+
+
+if __name__ == '__main__':
+    main()
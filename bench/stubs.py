@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from sqlalchemy import event
+import uvicorn
+
+PRODUCT_PAGE = """
+<html><head><title>{title}</title></head>
+<body>
+<article>
+<h1>{title}</h1>
+<p>The {title} is a reference product used by the offline benchmark suite. It ships in
+standard packaging with a documented bill of materials and a two year warranty.</p>
+<p>Specifications: operating voltage 12V DC, weight 1.2 kg, dimensions 120 x 80 x 40 mm,
+ingress protection IP65, operating temperature -20 to 60 degrees Celsius.</p>
+<p>The supplier provides certificates of conformity, safety data sheets and a lead time of
+four to six weeks for volume orders. Minimum order quantity is fifty units.</p>
+</article>
+</body></html>
+"""
+
+
+KEY_FIELDS = ('supplier_name', 'product_name')
+
+
+def stub_answer(field, prompt='', kind=None):
+    # Answers depend on the prompt, like a real model's, so follow-up calls differ too
+    tag = hashlib.blake2b(prompt.encode('utf-8'), digest_size=3).hexdigest()
+    if kind == 'date' or (kind is None and 'date' in field):
+        return "2024-01-01 00:00:00"
+    if kind == 'integer':
+        return int(tag, 16) % 1000 + 1
+    if kind == 'number':
+        return round(int(tag, 16) % 100000 / 100, 2)
+    return f"{field} value {tag}"
+
+
+def build_openai_stub(latency=0.2, fields=None, low_confidence=0.0, token_latency=0.0, rate_limit_rpm=0,
+                      bad_answers=0.0, field_kinds=None):
+    """Minimal OpenAI-compatible chat completions server with fixed latency.
+
+    fields: answer these keys in analysis calls (default: creation_date only).
+    low_confidence: share of structured-output fields reported with low confidence.
+    token_latency: extra seconds per completion token, to model generation time.
+    rate_limit_rpm: answer 429 with Retry-After once this request rate is exceeded
+    (a one-second burst is allowed), like the real API's per-minute limits.
+    bad_answers: share of prompts whose first non-key field is answered "unknown".
+    field_kinds: {field: 'integer' | 'number' | 'date' | 'text'} for typed answers.
+    """
+    app = FastAPI()
+    app.state.latency = latency
+    app.state.requests = 0
+    app.state.rate_limited = 0
+    bucket = {'level': max(1.0, rate_limit_rpm / 60), 'updated': time.monotonic()}
+
+    def over_limit():
+        if not rate_limit_rpm:
+            return None
+        now = time.monotonic()
+        capacity = max(1.0, rate_limit_rpm / 60)
+        bucket['level'] = min(capacity, bucket['level'] + (now - bucket['updated']) * rate_limit_rpm / 60)
+        bucket['updated'] = now
+        if bucket['level'] >= 1:
+            bucket['level'] -= 1
+            return None
+        return (1 - bucket['level']) * 60 / rate_limit_rpm
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        retry_after = over_limit()
+        if retry_after is not None:
+            app.state.rate_limited += 1
+            return JSONResponse(
+                status_code=429,
+                headers={'retry-after-ms': str(int(retry_after * 1000)), 'retry-after': str(int(retry_after) + 1)},
+                content={"error": {
+                    "message": "Rate limit reached for requests", "type": "requests", "code": "rate_limit_exceeded"
+                }}
+            )
+
+        system_prompt = body['messages'][0]['content']
+        user_prompt = body['messages'][-1]['content']
+        digest = hashlib.blake2b(f"bad\x1f{user_prompt}".encode('utf-8'), digest_size=4).digest()
+        bad = int.from_bytes(digest, 'big') / 2**32 < bad_answers
+
+        def answer(field):
+            if bad and field == next((f for f in (fields or []) if f not in KEY_FIELDS), None):
+                return "unknown"
+            return stub_answer(field, user_prompt, (field_kinds or {}).get(field))
+        response_format = body.get('response_format') or {}
+        if response_format.get('type') == 'json_schema':
+            schema = response_format['json_schema']['schema']['properties']['fields']['properties']
+            content = {"fields": {}}
+            for field in schema:
+                digest = hashlib.blake2b(f"{field}\x1f{user_prompt}".encode('utf-8'), digest_size=4).digest()
+                low = int.from_bytes(digest, 'big') / 2**32 < low_confidence
+                content["fields"][field] = {
+                    "answer": answer(field),
+                    "confidence": 0.55 if low else 0.95,
+                    "issues": []
+                }
+        elif 'validation' in system_prompt:
+            checked = [field for field in (fields or []) if f'"{field}"' in user_prompt]
+            content = {
+                "is_valid": True,
+                "validation_details": {field: {"valid": True, "issues": []} for field in checked}
+            }
+        else:
+            content = {field: answer(field) for field in (fields or ['creation_date'])}
+
+        prompt_tokens = sum(len(m['content']) for m in body['messages']) // 4
+        completion_tokens = len(json.dumps(content)) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+        if body.get('stream'):
+            return StreamingResponse(stream_completion(body, json.dumps(content), usage), media_type="text/event-stream")
+        await asyncio.sleep(app.state.latency + completion_tokens * token_latency)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get('model', 'gpt-4o'),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(content)},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        }
+
+    async def stream_completion(body, text, usage):
+        # Time to first token, then one ~4 character token per token_latency
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        def chunk(delta, finish_reason=None, chunk_usage=None):
+            return "data: " + json.dumps({
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get('model', 'gpt-4o'),
+                "choices": [] if chunk_usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                "usage": chunk_usage
+            }) + "\n\n"
+
+        await asyncio.sleep(app.state.latency)
+        yield chunk({"role": "assistant", "content": ""})
+        for start in range(0, len(text), 4):
+            await asyncio.sleep(token_latency)
+            yield chunk({"content": text[start:start + 4]})
+        yield chunk({}, "stop")
+        if (body.get('stream_options') or {}).get('include_usage'):
+            yield chunk({}, chunk_usage=usage)
+        yield "data: [DONE]\n\n"
+
+    return app
+
+
+def build_web_stub(latency=0.05):
+    """Serves a Google-like results page and the product pages it links to."""
+    app = FastAPI()
+    app.state.latency = latency
+    app.state.hits = {'search': 0, 'product': 0, 'not_modified': 0}
+
+    @app.get("/search", response_class=HTMLResponse)
+    async def search(request: Request, q: str = ""):
+        app.state.hits['search'] += 1
+        await asyncio.sleep(app.state.latency)
+        slug = uuid.uuid5(uuid.NAMESPACE_URL, q).hex
+        base = str(request.base_url).rstrip('/')
+        links = ''.join(
+            f'<a href="/url?q={base}/product/{slug}-{i}&amp;sa=U">Result {i}</a>'
+            for i in range(5)
+        )
+        return f"<html><body>{links}</body></html>"
+
+    @app.get("/product/{slug}", response_class=HTMLResponse)
+    async def product(request: Request, slug: str):
+        await asyncio.sleep(app.state.latency)
+        etag = f'"{slug}"'
+        if request.headers.get('if-none-match') == etag:
+            app.state.hits['not_modified'] += 1
+            return Response(status_code=304, headers={'ETag': etag})
+        app.state.hits['product'] += 1
+        return HTMLResponse(PRODUCT_PAGE.format(title=f"Product {slug[:8]}"), headers={'ETag': etag})
+
+    return app
+
+
+def add_db_latency(engine, latency=0.005):
+    """Simulate network round trips to a remote database on a local SQLite engine."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _delay(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(latency)
+
+
+class ServerThread:
+    """Runs a uvicorn server for an ASGI app on a background thread."""
+
+    def __init__(self, app, port, host="127.0.0.1"):
+        self.url = f"http://{host}:{port}"
+        config = uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="on")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,116 @@
+"""Table export benchmark: full JSON vs NDJSON vs Arrow IPC vs Parquet.
+
+Generates a SQLite table, then exports it once per format in a fresh process
+so peak RSS is measured independently, and prints throughput and memory.
+
+    python -m bench.table_export_bench --rows 1000000
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+FORMATS = ['json', 'ndjson', 'arrow', 'parquet']
+TABLE = 'export_bench'
+
+
+def build_table(path, rows):
+    with sqlite3.connect(path) as conn:
+        conn.execute(f"""
+            CREATE TABLE {TABLE} (
+                id INTEGER PRIMARY KEY,
+                supplier_name VARCHAR(255) NOT NULL,
+                product_name VARCHAR(255) NOT NULL,
+                category VARCHAR(255),
+                unit_price FLOAT,
+                stock_level INTEGER,
+                creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.executemany(
+            f"INSERT INTO {TABLE} (supplier_name, product_name, category, unit_price, stock_level) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                (f"Supplier {i % 997}", f"Product {i}", f"Category {i % 31}", round(i * 0.37 % 500, 2), i % 1000)
+                for i in range(rows)
+            )
+        )
+
+
+def max_rss_mib():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def export(db, fmt, chunksize):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from table_export import stream_arrow_ipc, stream_ndjson, stream_parquet
+
+    if fmt == 'json':
+        # What /api/data used to do: whole table, to_dict('records'), one response body
+        data = db.get_table_data(TABLE)
+        yield JSONResponse(content=jsonable_encoder({"status": "success", "data": data.to_dict('records')})).body
+    elif fmt == 'ndjson':
+        for line in stream_ndjson(db.iter_table_chunks(TABLE, chunksize=chunksize)):
+            yield line.encode('utf-8')
+    else:
+        schema, batches = db.iter_arrow_batches(TABLE, chunksize=chunksize)
+        stream = stream_arrow_ipc if fmt == 'arrow' else stream_parquet
+        yield from stream(schema, batches)
+
+
+def worker(fmt, path, chunksize):
+    import logger_config  # noqa: F401 - configure handlers before quietening them
+    logging.getLogger().setLevel(logging.WARNING)
+    os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+    from sqlite_connector import SQLiteConnector
+
+    db = SQLiteConnector()
+    baseline = max_rss_mib()
+    started = time.perf_counter()
+    size = 0
+    for chunk in export(db, fmt, chunksize):
+        size += len(chunk)
+    elapsed = time.perf_counter() - started
+    db.close()
+    print(json.dumps({'seconds': elapsed, 'bytes': size, 'peak_rss_mib': max_rss_mib() - baseline}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=FORMATS)
+    parser.add_argument('--worker', choices=FORMATS, help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.database, args.chunksize)
+        return
+
+    path = os.path.join(tempfile.mkdtemp(prefix='export_'), 'bench.db')
+    started = time.perf_counter()
+    build_table(path, args.rows)
+    print(f"Generated {args.rows:,} rows in {time.perf_counter() - started:.1f} s")
+
+    for fmt in args.formats:
+        output = subprocess.run(
+            [sys.executable, '-m', 'bench.table_export_bench', '--worker', fmt,
+             '--database', path, '--chunksize', str(args.chunksize)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{fmt:>8}: {result['seconds']:6.2f} s, {args.rows / result['seconds']:>10,.0f} rows/s, "
+              f"{result['bytes'] / 2**20:7.1f} MiB out, peak RSS +{result['peak_rss_mib']:7.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Reference table reads: SELECT * per request vs the incremental TableSnapshot.
+
+Each simulated request inserts one row and then reads the table, which is what
+generate-entry does. Also reports the frame's memory with and without
+categorical columns.
+
+    python -m bench.table_snapshot_bench --rows 100000 --requests 50
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from bench.similarity_index_bench import synthetic_names
+
+
+def build_table(path, rows):
+    with sqlite3.connect(path) as conn:
+        conn.execute("""
+            CREATE TABLE supplier_products (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                supplier_name VARCHAR(255) NOT NULL,
+                product_name VARCHAR(255) NOT NULL,
+                category VARCHAR(255),
+                unit_price FLOAT,
+                creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(supplier_name, product_name)
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO supplier_products (supplier_name, product_name, category, unit_price) VALUES (?, ?, ?, ?)",
+            (
+                (supplier_name, product_name, f"Category {i % 31}", round(i * 0.37 % 500, 2))
+                for i, (supplier_name, product_name) in enumerate(synthetic_names(rows))
+            )
+        )
+
+
+def run(db, read, requests, offset):
+    started = time.perf_counter()
+    for i in range(requests):
+        db.bulk_insert_rows('supplier_products', [{
+            'supplier_name': f"Bench Supplier {offset}",
+            'product_name': f"Bench Product {i}",
+            'category': 'Category 0',
+            'unit_price': 1.0
+        }])
+        read()
+    return (time.perf_counter() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--refresh-interval', type=float, default=0.0,
+                        help="Snapshot refresh interval; 0 runs an incremental query on every read")
+    args = parser.parse_args()
+
+    import logger_config  # noqa: F401 - configure handlers before quietening them
+    logging.getLogger().setLevel(logging.WARNING)
+
+    path = os.path.join(tempfile.mkdtemp(prefix='snapshot_'), 'bench.db')
+    build_table(path, args.rows)
+    os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+    from sqlite_connector import SQLiteConnector
+    from table_snapshot import SnapshotStore
+
+    db = SQLiteConnector()
+    full = db.get_table_data('supplier_products')
+    plain_mib = full.memory_usage(deep=True).sum() / 2**20
+
+    per_request = run(db, lambda: db.get_table_data('supplier_products'), args.requests, 0)
+    print(f"    SELECT * per request: {per_request * 1000:8.2f} ms/request")
+
+    snapshots = SnapshotStore(db, refresh_interval=args.refresh_interval)
+    db.add_insert_listener(snapshots.on_insert)
+    started = time.perf_counter()
+    snapshots.get_table_data('supplier_products')
+    print(f"  snapshot initial load: {(time.perf_counter() - started) * 1000:8.2f} ms")
+    per_request = run(db, lambda: snapshots.get_table_data('supplier_products'), args.requests, 1)
+    print(f"   snapshot per request: {per_request * 1000:8.2f} ms/request "
+          f"(refresh interval {args.refresh_interval}s)")
+
+    stats = snapshots.stats()['supplier_products']
+    print(f"memory: plain frame {plain_mib:.1f} MiB, snapshot {stats['memory_bytes'] / 2**20:.1f} MiB; {stats}")
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Uniqueness check benchmark: original list scan vs the maintained key index.
+
+    python -m bench.uniqueness_bench --sizes 10000 100000 1000000
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import pandas as pd
+from bench.similarity_index_bench import synthetic_names
+
+
+def list_scan_check(existing_data, supplier_name, product_name):
+    # The original DataValidator.validate_unique_entry
+    existing_combinations = existing_data[['supplier_name', 'product_name']].values.tolist()
+    return [supplier_name, product_name] in existing_combinations
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def run_size(size, checks):
+    from sqlite_connector import SQLiteConnector
+    from uniqueness_index import UniquenessIndex
+
+    names = list(synthetic_names(size))
+    existing_data = pd.DataFrame(names, columns=['supplier_name', 'product_name'])
+    missing = ('Nobody Ltd', 'Nothing 0')
+
+    scan_repeat = max(1, min(checks, 200_000 // size))
+    scan_seconds = timed(lambda: list_scan_check(existing_data, *missing), scan_repeat)
+
+    path = os.path.join(tempfile.mkdtemp(prefix='unique_'), 'bench.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+    db = SQLiteConnector()
+    db.migrate()
+    with sqlite3.connect(path) as conn:
+        conn.executemany("INSERT INTO supplier_products (supplier_name, product_name) VALUES (?, ?)", names)
+
+    started = time.perf_counter()
+    key_index = UniquenessIndex(db).table('supplier_products')
+    warm_seconds = time.perf_counter() - started
+    index_bytes = sys.getsizeof(key_index._keys) + sum(sys.getsizeof(key) for key in key_index._keys)
+
+    present = names[size // 2]
+    index_seconds = timed(lambda: (key_index.contains(*missing), key_index.contains(*present)), checks) / 2
+    db.close()
+
+    print(f"{size:>9,} rows: list scan {scan_seconds * 1000:9.2f} ms/check | "
+          f"index warm {warm_seconds:6.2f} s, {index_bytes / 2**20:6.1f} MiB, "
+          f"{index_seconds * 1e6:5.2f} us/check | speedup {scan_seconds / index_seconds:,.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--checks', type=int, default=10_000)
+    args = parser.parse_args()
+
+    import logger_config  # noqa: F401 - configure handlers before quietening them
+    logging.getLogger().setLevel(logging.WARNING)
+    for size in args.sizes:
+        run_size(size, args.checks)
+
+
+if __name__ == '__main__':
+    main()
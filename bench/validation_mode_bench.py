@@ -0,0 +1,84 @@
+"""AI call modes: two_pass (analysis + validation) vs combined (structured output).
+
+Runs AIProcessor against the local OpenAI stub and reports latency, calls and
+tokens per entry for each mode.
+
+    python -m bench.validation_mode_bench --entries 40 --fields 12 --low-confidence 0.1
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from bench.stubs import ServerThread, build_openai_stub, percentile
+
+MODES = ['two_pass', 'combined']
+
+
+async def run_mode(mode, entries, fields, concurrency):
+    from ai_processor import AIProcessor
+
+    processor = AIProcessor()
+    history = '[{"supplier_name":"Acme","product_name":"Widget 1","category":"Hardware"}]'
+    content = "The Widget is a reference product. Operating voltage 12V DC, weight 1.2 kg. " * 20
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    revalidated = 0
+
+    async def entry(i):
+        nonlocal revalidated
+        async with semaphore:
+            started = time.perf_counter()
+            _, validation = await processor.generate_validated(
+                f"{history} entry {i}", content, fields, mode=mode, bypass_cache=True
+            )
+            latencies.append(time.perf_counter() - started)
+            revalidated += len(validation.get('revalidated', []))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(entry(i) for i in range(entries)))
+    elapsed = time.perf_counter() - started
+    usage = processor.usage
+    return {
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'entries_per_s': entries / elapsed,
+        'calls': usage['requests'] / entries,
+        'prompt_tokens': usage['prompt_tokens'] / entries,
+        'completion_tokens': usage['completion_tokens'] / entries,
+        'revalidated_fields': revalidated / entries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=40)
+    parser.add_argument('--fields', type=int, default=12)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.3, help="Seconds per call before generation")
+    parser.add_argument('--token-latency', type=float, default=0.01, help="Seconds per completion token")
+    parser.add_argument('--low-confidence', type=float, default=0.1,
+                        help="Share of fields the stub answers with low confidence")
+    parser.add_argument('--port', type=int, default=8931)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    args = parser.parse_args()
+
+    import logger_config  # noqa: F401 - configure handlers before quietening them
+    logging.getLogger().setLevel(logging.WARNING)
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ['OPENAI_API_KEY'] = 'bench'
+
+    fields = ['supplier_name', 'product_name', 'creation_date'] + [f"attribute_{i}" for i in range(args.fields - 3)]
+    stub = build_openai_stub(args.latency, fields=fields, low_confidence=args.low_confidence,
+                             token_latency=args.token_latency)
+    with ServerThread(stub, args.port):
+        for mode in args.modes:
+            result = asyncio.run(run_mode(mode, args.entries, fields, args.concurrency))
+            print(f"{mode:>9}: p50 {result['p50_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  "
+                  f"{result['entries_per_s']:5.2f} entries/s  {result['calls']:.2f} calls/entry  "
+                  f"tokens/entry {result['prompt_tokens']:6.0f} in {result['completion_tokens']:5.0f} out  "
+                  f"re-checked fields/entry {result['revalidated_fields']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import asyncio
+import os
+from logger_config import logger
+
+INSERTED = 'inserted'
+UPDATED = 'updated'
+DUPLICATE = 'duplicate'
+FAILED = 'failed'
+
+# Natural key of the product tables, the target of ON CONFLICT / MERGE
+UNIQUE_KEY_COLUMNS = ('supplier_name', 'product_name')
+
+def split_batch(rows):
+    """Group row positions by column set, dropping repeats of a key within the batch.
+
+    Returns ({columns: [positions]}, [positions of in-batch duplicates]).
+    """
+    groups = {}
+    repeats = []
+    seen = set()
+    for position, row in enumerate(rows):
+        key = tuple(row.get(column) for column in UNIQUE_KEY_COLUMNS)
+        if key in seen:
+            repeats.append(position)
+            continue
+        seen.add(key)
+        groups.setdefault(tuple(row.keys()), []).append(position)
+    return groups, repeats
+
+class BufferedWriter:
+    """Collects rows from concurrent callers and writes them with bulk statements.
+
+    A table's buffer is flushed once it holds max_rows rows or max_delay seconds
+    after its first row arrived, whichever comes first. Rows that arrive while a
+    flush is running go out as soon as it finishes (group commit), so batches
+    grow with load instead of waiting on the timer. write() resolves to that
+    row's own result dict from the connector's bulk_insert_rows.
+    """
+
+    def __init__(self, db, max_rows=None, max_delay=None, upsert=False):
+        self.db = db
+        self.max_rows = max_rows or int(os.getenv('BULK_WRITER_MAX_ROWS', '500'))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv('BULK_WRITER_MAX_DELAY', '0'))
+        self.upsert = upsert
+        self._buffers = {}
+        self._timers = {}
+        self._active = {}
+        self._flushes = set()
+        self.metrics = {'rows': 0, 'flushes': 0, INSERTED: 0, UPDATED: 0, DUPLICATE: 0, FAILED: 0}
+
+    async def write(self, table_name, row):
+        future = asyncio.get_running_loop().create_future()
+        buffer = self._buffers.setdefault(table_name, [])
+        buffer.append((row, future))
+        if len(buffer) >= self.max_rows:
+            self._start_flush(table_name)
+        elif table_name not in self._timers and table_name not in self._active:
+            self._timers[table_name] = asyncio.create_task(self._flush_later(table_name))
+        return await asyncio.shield(future)
+
+    async def write_many(self, table_name, rows):
+        return await asyncio.gather(*(self.write(table_name, row) for row in rows))
+
+    async def _flush_later(self, table_name):
+        await asyncio.sleep(self.max_delay)
+        self._timers.pop(table_name, None)
+        self._start_flush(table_name)
+
+    def _start_flush(self, table_name):
+        timer = self._timers.pop(table_name, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        buffer = self._buffers.pop(table_name, [])
+        if buffer:
+            self._active[table_name] = self._active.get(table_name, 0) + 1
+            task = asyncio.create_task(self._flush(table_name, buffer))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, table_name, buffer):
+        rows = [row for row, _ in buffer]
+        try:
+            results = await self.db.bulk_insert_rows_async(table_name, rows, self.upsert)
+        except Exception as e:
+            logger.error(f"Bulk write of {len(rows)} rows into {table_name} failed: {str(e)}")
+            results = [{'status': FAILED, 'error': str(e)}] * len(rows)
+
+        self.metrics['rows'] += len(rows)
+        self.metrics['flushes'] += 1
+        for (_, future), result in zip(buffer, results):
+            self.metrics[result['status']] += 1
+            if not future.done():
+                future.set_result(result)
+
+        self._active[table_name] -= 1
+        if not self._active[table_name]:
+            del self._active[table_name]
+            if self._buffers.get(table_name):
+                self._start_flush(table_name)
+
+    async def flush(self):
+        for table_name in list(self._buffers):
+            self._start_flush(table_name)
+        while self._flushes:
+            await asyncio.gather(*list(self._flushes))
+
+    async def close(self):
+        await self.flush()
+
+    def stats(self):
+        return {**self.metrics, 'buffered': sum(len(buffer) for buffer in self._buffers.values())}
@@ -0,0 +1,189 @@
+import asyncio
+import os
+import threading
+from logger_config import logger
+
+class Components:
+    """The app's long-lived objects, each built on first use.
+
+    Heavy modules (pandas, the OpenAI client, trafilatura, database drivers)
+    are imported by the builders, so importing the app stays cheap and a
+    process only pays for what its requests touch. Builders may block (the
+    database connects, caches open files); call them from a worker thread, as
+    FastAPI does for plain `def` dependencies.
+    """
+
+    def __init__(self):
+        self._built = {}
+        # Reentrant: builders ask for the components they depend on
+        self._lock = threading.RLock()
+        self._job_queue_lock = None
+
+    def _get(self, name, build):
+        component = self._built.get(name)
+        if component is not None:
+            return component
+        with self._lock:
+            if name not in self._built:
+                try:
+                    self._built[name] = build()
+                except Exception as e:
+                    logger.error(f"Failed to initialize {name}: {str(e)}")
+                    raise
+                logger.info(f"Initialized {name}")
+        return self._built[name]
+
+    def peek(self, name):
+        """The component if it has been built, else None; never builds it."""
+        return self._built.get(name)
+
+    @property
+    def db(self):
+        def build():
+            from storage import create_storage_backend
+            return create_storage_backend()
+        return self._get('db', build)
+
+    @property
+    def shared_state(self):
+        def build():
+            from shared_state import open_shared_state
+            # None unless SHARED_STATE_DIR is set; stored as False so it is built once
+            return open_shared_state() or False
+        return self._get('shared_state', build) or None
+
+    @property
+    def snapshots(self):
+        def build():
+            from table_snapshot import SnapshotStore
+            snapshots = SnapshotStore(self.db)
+            self.db.add_insert_listener(snapshots.on_insert)
+            return snapshots
+        return self._get('snapshots', build)
+
+    @property
+    def uniqueness_index(self):
+        def build():
+            from uniqueness_index import UniquenessIndex
+            index = UniquenessIndex(self.db, snapshots=self.snapshots, shared=self.shared_state)
+            self.db.add_insert_listener(index.on_insert)
+            return index
+        return self._get('uniqueness_index', build)
+
+    @property
+    def similarity_indexes(self):
+        def build():
+            from similarity_index import SimilarityIndexStore
+            indexes = SimilarityIndexStore()
+            self.db.add_insert_listener(indexes.on_insert)
+            return indexes
+        return self._get('similarity_indexes', build)
+
+    @property
+    def writer(self):
+        def build():
+            from bulk_writer import BufferedWriter
+            return BufferedWriter(self.db)
+        return self._get('writer', build)
+
+    @property
+    def scrape_cache(self):
+        def build():
+            from scrape_cache import ScrapeCache
+            return ScrapeCache()
+        return self._get('scrape_cache', build)
+
+    @property
+    def web_scraper(self):
+        def build():
+            from web_scraper import WebScraper
+            return WebScraper(cache=self.scrape_cache)
+        return self._get('web_scraper', build)
+
+    @property
+    def ai_cache(self):
+        def build():
+            from ai_cache import create_ai_cache
+            # create_ai_cache returns None when caching is off; stored as False so it is built once
+            return create_ai_cache() or False
+        return self._get('ai_cache', build) or None
+
+    @property
+    def ai_processor(self):
+        def build():
+            from ai_processor import AIProcessor
+            from rate_limiter import OpenAIScheduler
+            return AIProcessor(cache=self.ai_cache, scheduler=OpenAIScheduler(shared=self.shared_state))
+        return self._get('ai_processor', build)
+
+    @property
+    def validation_rules(self):
+        def build():
+            from validation_rules import RuleEngine
+            # Reference rules look values up in the table snapshots
+            return RuleEngine(
+                reference_loader=lambda table_name, column: self.snapshots.get_table_data(table_name)[column]
+            )
+        return self._get('validation_rules', build)
+
+    @property
+    def data_validator(self):
+        def build():
+            from data_validator import DataValidator
+            return DataValidator(rules=self.validation_rules)
+        return self._get('data_validator', build)
+
+    @property
+    def pipeline(self):
+        def build():
+            from entry_pipeline import EntryPipeline
+            return EntryPipeline(
+                self.db, self.web_scraper, self.ai_processor, self.data_validator,
+                similarity_indexes=self.similarity_indexes,
+                uniqueness_index=self.uniqueness_index,
+                writer=self.writer,
+                snapshots=self.snapshots
+            )
+        return self._get('pipeline', build)
+
+    async def job_queue(self):
+        """The started JobQueue; built and started on first use."""
+        job_queue = self._built.get('job_queue')
+        if job_queue is not None:
+            return job_queue
+        if self._job_queue_lock is None:
+            self._job_queue_lock = asyncio.Lock()
+        async with self._job_queue_lock:
+            if 'job_queue' not in self._built:
+                from job_queue import JobQueue
+                job_queue = JobQueue(await asyncio.to_thread(lambda: self.pipeline))
+                await job_queue.start()
+                self._built['job_queue'] = job_queue
+                logger.info("Initialized job_queue")
+        return self._built['job_queue']
+
+    def build_all(self):
+        """Build every synchronous component, e.g. to warm a process before it takes traffic."""
+        for name in ('db', 'snapshots', 'uniqueness_index', 'similarity_indexes', 'writer', 'web_scraper',
+                     'ai_processor', 'data_validator', 'pipeline'):
+            getattr(self, name)
+
+    async def close(self):
+        """Close what was built, newest first."""
+        job_queue = self.peek('job_queue')
+        if job_queue:
+            await job_queue.stop()
+        writer = self.peek('writer')
+        if writer:
+            await writer.close()
+        web_scraper = self.peek('web_scraper')
+        if web_scraper:
+            await web_scraper.close()
+        for name in ('scrape_cache', 'ai_cache', 'shared_state', 'db'):
+            component = self.peek(name)
+            if component:
+                component.close()
+        self._built.clear()
+
+# Building every component at startup trades a slower cold start for a faster first request
+PRELOAD_COMPONENTS = os.getenv('PRELOAD_COMPONENTS', 'false').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,189 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from logger_config import logger
+
+def env_flag(name, default):
+    return os.getenv(name, default).strip().lower() in ('1', 'true', 'yes', 'on')
+
+def engine_options(database_url):
+    """create_engine pool arguments from the DB_POOL_* environment variables."""
+    options = {
+        'pool_pre_ping': env_flag('DB_POOL_PRE_PING', 'true'),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+    }
+    # In-memory SQLite uses a single-connection pool that takes no sizing arguments
+    if not (database_url.startswith('sqlite') and ':memory:' in database_url):
+        options.update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '10')),
+            pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        )
+    return options
+
+class PoolMetrics:
+    """Checkout counters shared by the SQLAlchemy and Snowflake pools."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.metrics = {
+            'checkouts': 0,
+            'checkout_failures': 0,
+            'max_waiting': 0,
+            'checkout_seconds_total': 0.0,
+            'checkout_seconds_max': 0.0
+        }
+
+    @contextmanager
+    def checkout(self):
+        """Wrap the call that takes a connection from the pool."""
+        started = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+            self.metrics['max_waiting'] = max(self.metrics['max_waiting'], self.waiting)
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.waiting -= 1
+                if failed:
+                    self.metrics['checkout_failures'] += 1
+                else:
+                    self.metrics['checkouts'] += 1
+                    self.metrics['checkout_seconds_total'] += elapsed
+                    self.metrics['checkout_seconds_max'] = max(self.metrics['checkout_seconds_max'], elapsed)
+
+    def stats(self):
+        with self._lock:
+            checkouts = self.metrics['checkouts']
+            return {
+                'checkouts': checkouts,
+                'checkout_failures': self.metrics['checkout_failures'],
+                'waiting': self.waiting,
+                'max_waiting': self.metrics['max_waiting'],
+                'checkout_seconds_total': round(self.metrics['checkout_seconds_total'], 6),
+                'checkout_ms_avg': round(self.metrics['checkout_seconds_total'] / checkouts * 1000, 3) if checkouts else 0.0,
+                'checkout_ms_max': round(self.metrics['checkout_seconds_max'] * 1000, 3)
+            }
+
+class SnowflakePool:
+    """Small blocking pool of Snowflake connections.
+
+    Connections are opened on demand up to size, validated on checkout
+    (pre-ping) and replaced once older than recycle seconds or after a call
+    failed on them.
+    """
+
+    def __init__(self, connect, size=None, timeout=None, recycle=None, pre_ping=None):
+        self._connect = connect
+        self.size = size or int(os.getenv('SNOWFLAKE_POOL_SIZE', '4'))
+        self.timeout = timeout if timeout is not None else float(os.getenv('SNOWFLAKE_POOL_TIMEOUT', '30'))
+        self.recycle = recycle if recycle is not None else int(os.getenv('SNOWFLAKE_POOL_RECYCLE', '3600'))
+        self.pre_ping = pre_ping if pre_ping is not None else env_flag('SNOWFLAKE_POOL_PRE_PING', 'true')
+        self.metrics = PoolMetrics()
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        self._created_at = {}
+
+    def acquire(self):
+        with self.metrics.checkout():
+            while True:
+                conn = self._take()
+                if self._usable(conn):
+                    with self._lock:
+                        self._in_use += 1
+                    return conn
+                self._discard(conn)
+
+    def _take(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+            self._created_at[id(conn)] = time.monotonic()
+            return conn
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No Snowflake connection available after {self.timeout}s (pool size {self.size})")
+
+    def _usable(self, conn):
+        if conn.is_closed():
+            return False
+        if time.monotonic() - self._created_at.get(id(conn), 0) > self.recycle:
+            return False
+        if self.pre_ping:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+            except Exception as e:
+                logger.warning(f"Dropping broken Snowflake connection: {str(e)}")
+                return False
+        return True
+
+    def _discard(self, conn):
+        self._created_at.pop(id(conn), None)
+        with self._lock:
+            self._opened -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def release(self, conn, discard=False):
+        with self._lock:
+            self._in_use -= 1
+        if discard:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            # Also runs on GeneratorExit when a streaming export is closed early. Drop
+            # sessions an error closed; pre-ping catches other broken ones on checkout
+            self.release(conn, discard=conn.is_closed())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'opened': self._opened,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                **self.metrics.stats()
+            }
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
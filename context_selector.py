@@ -0,0 +1,110 @@
+import functools
+import json
+import os
+import pandas as pd
+from logger_config import logger
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    """The o200k_base encoding, loaded on first use since a cold tiktoken cache downloads it."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, estimating tokens from length: {str(e)}")
+        return None
+
+def estimate_tokens(text: str) -> int:
+    """Token count for a prompt fragment, exact with tiktoken, ~4 chars/token otherwise."""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return max(1, (len(text) + 3) // 4)
+
+def compact_json(value) -> str:
+    return json.dumps(value, separators=(',', ':'), default=str)
+
+def _trigrams(text: str) -> set:
+    text = f"  {text.casefold()} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class ContextSelector:
+    def __init__(self, max_rows=None, token_budget=None):
+        self.max_rows = max_rows or int(os.getenv('CONTEXT_MAX_ROWS', '50'))
+        self.token_budget = token_budget or int(os.getenv('CONTEXT_TOKEN_BUDGET', '4000'))
+
+    def rank(self, existing_data: pd.DataFrame, supplier_name: str, product_name: str, limit=None, index=None) -> list:
+        """Row positions ordered by relevance: same supplier first, then by name similarity.
+
+        With a SimilarityIndex the nearest neighbours come from the index instead of
+        scoring every row of the table.
+        """
+        if existing_data.empty:
+            return []
+        limit = limit or len(existing_data)
+        suppliers = existing_data['supplier_name'].astype(str)
+        products = existing_data['product_name'].astype(str)
+        same_supplier = (suppliers.str.casefold() == supplier_name.casefold()).to_numpy()
+        query = _trigrams(f"{supplier_name} {product_name}")
+
+        def by_similarity(positions):
+            scores = {
+                position: _similarity(query, _trigrams(f"{suppliers.iat[position]} {products.iat[position]}"))
+                for position in positions
+            }
+            return sorted(positions, key=lambda position: -scores[position])
+
+        ranked = by_similarity(same_supplier.nonzero()[0].tolist())
+        # Only score the rest of the table when the supplier's own rows do not fill the limit
+        if len(ranked) < limit:
+            if index is not None:
+                ranked += self._neighbours(index, suppliers, products, same_supplier, supplier_name, product_name, limit)
+            else:
+                ranked += by_similarity((~same_supplier).nonzero()[0].tolist())
+        return ranked[:limit]
+
+    def _neighbours(self, index, suppliers, products, same_supplier, supplier_name, product_name, limit):
+        order = {}
+        for key, _ in index.search(f"{supplier_name} {product_name}", k=limit * 2):
+            order.setdefault((str(key[0]), str(key[1])), len(order))
+        candidates = (products.isin({key[1] for key in order}).to_numpy() & ~same_supplier).nonzero()[0]
+        matched = [
+            position for position in candidates.tolist()
+            if (suppliers.iat[position], products.iat[position]) in order
+        ]
+        return sorted(matched, key=lambda position: order[(suppliers.iat[position], products.iat[position])])
+
+    def select(self, existing_data: pd.DataFrame, supplier_name: str, product_name: str, index=None):
+        """Pick the most relevant rows that fit in the token budget.
+
+        Returns the compact JSON for the prompt and stats on what was sent.
+        """
+        selected = []
+        tokens = 2  # the surrounding brackets
+        ranked = self.rank(existing_data, supplier_name, product_name, limit=self.max_rows, index=index)
+        for row in existing_data.iloc[ranked].to_dict('records'):
+            record = {
+                key: value for key, value in row.items()
+                if value is not None and not (isinstance(value, float) and pd.isna(value))
+            }
+            record_tokens = estimate_tokens(compact_json(record)) + 1
+            if tokens + record_tokens > self.token_budget:
+                break
+            selected.append(record)
+            tokens += record_tokens
+
+        history = compact_json(selected)
+        stats = {
+            'rows_available': len(existing_data),
+            'rows_sent': len(selected),
+            'tokens_sent': estimate_tokens(history),
+            'token_budget': self.token_budget
+        }
+        return history, stats
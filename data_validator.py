@@ -1,58 +1,435 @@
 from logger_config import logger
+from uniqueness_index import AI_TAG, DuplicateEntryError, normalize_key
+from telemetry import traced
+from datetime import date, datetime
+from decimal import Decimal
+import math
+import numpy as np
 import pandas as pd
 import re
 
+BOOLEAN_STRINGS = {'true', 'false', 't', 'f', 'yes', 'no', '1', '0'}
+INTEGER_PATTERN = r'[+-]?\d+'
+# Finite decimal or scientific notation, what float() accepts short of nan/inf and digit separators
+NUMBER_PATTERN = r'[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?'
+
+# Single-value type checks, shared with the rule engine in validation_rules
+def is_boolean(value):
+    return isinstance(value, bool) or str(value).strip().lower() in BOOLEAN_STRINGS
+
+def is_integer(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return True
+    if isinstance(value, float):
+        return value.is_integer()
+    if isinstance(value, str):
+        try:
+            int(value.strip())
+            return True
+        except ValueError:
+            return False
+    return False
+
+def is_number(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float, Decimal)):
+        return True
+    if isinstance(value, str):
+        try:
+            return math.isfinite(float(value.strip()))
+        except ValueError:
+            return False
+    return False
+
+def is_timestamp(value):
+    if isinstance(value, (date, datetime)):
+        return True
+    if isinstance(value, str):
+        try:
+            datetime.fromisoformat(value.strip())
+            return True
+        except ValueError:
+            return False
+    return False
+
+def _string_mask(series):
+    """Which values are str, without a Python loop when the column is all text."""
+    if isinstance(series.dtype, pd.StringDtype):
+        return series.notna().to_numpy()
+    if series.dtype != object:
+        return np.zeros(len(series), dtype=bool)
+    if pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+        return series.notna().to_numpy()
+    return series.map(type).eq(str).to_numpy()
+
+def _bool_mask(series):
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return np.ones(len(series), dtype=bool)
+    if series.dtype != object or pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+        return np.zeros(len(series), dtype=bool)
+    return series.map(type).eq(bool).to_numpy()
+
+def _as_text(series):
+    return series if isinstance(series.dtype, pd.StringDtype) else series.astype('string')
+
+def _stripped(series, strings):
+    """series with surrounding whitespace removed from its str values, other values unchanged."""
+    if strings.all():
+        return _as_text(series).str.strip()
+    if not strings.any():
+        return series
+    return series.astype(object).where(~strings, _as_text(series).str.strip())
+
+def _numeric_values(series, strings):
+    """Float values of numbers and numeric strings, NaN for anything else."""
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        return series.to_numpy(dtype=float, na_value=np.nan)
+    values = _stripped(series, strings)
+    numbers = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    return np.where(_bool_mask(series), np.nan, numbers)
+
+class InvalidEntryError(ValueError):
+    """A generated row was rejected by validation, as opposed to failing to be produced."""
+
+class FrameValidation:
+    """Outcome of DataValidator.validate_frame.
+
+    frame is a tagged copy of the input. masks maps (column, rule) to a boolean
+    array marking the failing rows; errors combines them into one row x column mask.
+    """
+
+    def __init__(self, frame, masks):
+        self.frame = frame
+        self.masks = masks
+
+    @property
+    def errors(self):
+        """Row x column mask, True where a value failed a rule; missing required columns are included."""
+        columns = {column: np.zeros(len(self.frame), dtype=bool) for column in self.frame.columns}
+        for (column, _), mask in self.masks.items():
+            columns[column] = columns.get(column, False) | mask
+        return pd.DataFrame(columns, index=self.frame.index, dtype=bool)
+
+    @property
+    def valid(self):
+        """Boolean array, True for rows that passed every rule."""
+        failed = np.zeros(len(self.frame), dtype=bool)
+        for mask in self.masks.values():
+            failed |= mask
+        return ~failed
+
+    def row_errors(self, position):
+        return [f"{column}: {rule}" for (column, rule), mask in self.masks.items() if mask[position]]
+
+    def summary(self):
+        return {f"{column}: {rule}": int(mask.sum()) for (column, rule), mask in self.masks.items()}
+
 class DataValidator:
-    def __init__(self):
+    def __init__(self, rules=None):
+        # Default for tables whose rule file does not list its own required fields
         self.required_fields = [
             'supplier_name',
             'product_name',
             'creation_date'
         ]
+        self.near_duplicate_threshold = 0.9
+        # Column -> regex every non-null value must fully match (validate_frame)
+        self.patterns = {}
+        # Optional RuleEngine with per-table business rules
+        self.rules = rules
+
+    def _rule_set(self, schema):
+        if self.rules is None or schema is None:
+            return None
+        return self.rules.rules(schema.table_name, schema)
+
+    def _required_fields(self, schema):
+        rule_set = self._rule_set(schema)
+        required = rule_set.required if rule_set is not None and rule_set.required is not None else self.required_fields
+        return list(dict.fromkeys(list(required) + (schema.required_columns() if schema is not None else [])))
+
+    def precheck(self, data_dict, schema):
+        """Every local problem with a generated row, {column: [issues]}, without raising.
+
+        Covers required fields, column types and the table's rules, so a row that
+        would be rejected anyway can skip the AI validation call.
+        """
+        issues = {}
+        for field in self._required_fields(schema):
+            if field not in data_dict:
+                issues[field] = ["Missing required field"]
+        for name, value in data_dict.items():
+            problems = self.check_field(name, value, schema)
+            if problems:
+                issues.setdefault(name, []).extend(problems)
+        if self.rules is not None:
+            for name, problems in self.rules.check(schema.table_name, data_dict, schema).items():
+                issues.setdefault(name, []).extend(problems)
+        return issues
         
-    def validate_data_format(self, data_dict):
+    @traced('validator.format')
+    def validate_data_format(self, data_dict, schema=None):
+        """Check a row before insert and return it with AI tags added; data_dict is not modified.
+
+        With the table's cached TableSchema every column is type checked.
+        """
         try:
             # Check required fields
-            missing_fields = [field for field in self.required_fields if field not in data_dict]
+            missing_fields = [field for field in self._required_fields(schema) if field not in data_dict]
             if missing_fields:
-                raise ValueError(f"Missing required fields: {', '.join(missing_fields)}")
+                raise InvalidEntryError(f"Missing required fields: {', '.join(missing_fields)}")
 
-            # Validate data types
-            self._validate_data_types(data_dict)
-            
             # Validate AI tags
-            self._validate_ai_tags(data_dict)
+            tagged = self._validate_ai_tags(data_dict, schema)
+
+            # Validate data types, after tagging so length limits see the stored value
+            self._validate_data_types(tagged, schema)
+
+            # Business rules see the values as generated, without the tag
+            rule_set = self._rule_set(schema)
+            if rule_set is not None:
+                violations = rule_set.check(data_dict)
+                if violations:
+                    raise InvalidEntryError(
+                        f"Rule violations: {'; '.join(issue for issues in violations.values() for issue in issues)}"
+                    )
             
             logger.info("Data validation passed successfully")
-            return True
+            return tagged
         except Exception as e:
             logger.error(f"Data validation failed: {str(e)}")
             raise
 
-    def _validate_data_types(self, data_dict):
+    def check_field(self, name, value, schema):
+        """Problems with one answer against its column, before the rest of the row exists."""
+        column = schema.column(name)
+        if column is None:
+            return [f"Unknown column for {schema.table_name}: {name}"]
+        # Checked as it will be stored, with the AI tag on text columns
+        if isinstance(value, str) and not value.endswith(AI_TAG) and self._is_text_column(name, schema):
+            value = f"{value} {AI_TAG}"
+        error = self._check_type(name, value, column)
+        return [error] if error else []
+
+    def _validate_data_types(self, data_dict, schema=None):
         # Add specific data type validations
         if not isinstance(data_dict.get('supplier_name'), str):
-            raise ValueError("supplier_name must be a string")
+            raise InvalidEntryError("supplier_name must be a string")
         
         if not isinstance(data_dict.get('product_name'), str):
-            raise ValueError("product_name must be a string")
+            raise InvalidEntryError("product_name must be a string")
 
-    def _validate_ai_tags(self, data_dict):
-        # Ensure AI generated tag is present where needed
-        for key, value in data_dict.items():
-            if isinstance(value, str) and not value.endswith("[AI generated]"):
-                data_dict[key] = f"{value} [AI generated]"
+        if schema is None:
+            return
+        unknown = [key for key in data_dict if schema.column(key) is None]
+        if unknown:
+            raise InvalidEntryError(f"Unknown columns for {schema.table_name}: {', '.join(unknown)}")
+        errors = [self._check_type(key, value, schema.column(key)) for key, value in data_dict.items()]
+        errors = [error for error in errors if error]
+        if errors:
+            raise InvalidEntryError(f"Invalid data types: {'; '.join(errors)}")
 
-    def validate_unique_entry(self, new_data, existing_data):
+    def _check_type(self, name, value, column):
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            if column.get('nullable', True) or column.get('default') is not None:
+                return None
+            return f"{name} must not be null"
+        try:
+            python_type = column['type'].python_type
+        except NotImplementedError:
+            return None
+
+        if python_type is str:
+            if not isinstance(value, str):
+                return f"{name} must be a string"
+            length = getattr(column['type'], 'length', None)
+            if length and len(value) > length:
+                return f"{name} is longer than {length} characters"
+            return None
+        if python_type is bool:
+            valid = is_boolean(value)
+        elif python_type is int:
+            valid = is_integer(value)
+        elif python_type in (float, Decimal):
+            valid = is_number(value)
+        elif python_type in (date, datetime):
+            valid = is_timestamp(value)
+        else:
+            valid = True
+        return None if valid else f"{name} must be {python_type.__name__}, got {value!r}"
+
+    def _is_text_column(self, key, schema):
+        if schema is None or schema.column(key) is None:
+            return True
+        try:
+            return schema.column(key)['type'].python_type is str
+        except NotImplementedError:
+            return True
+
+    def _validate_ai_tags(self, data_dict, schema=None):
+        # Ensure AI generated tag is present where needed; numeric and date
+        # columns keep their value so it still matches the column type
+        return {
+            key: f"{value} {AI_TAG}"
+            if isinstance(value, str) and not value.endswith(AI_TAG) and self._is_text_column(key, schema)
+            else value
+            for key, value in data_dict.items()
+        }
+
+    @traced('validator.frame')
+    def validate_frame(self, frame, schema=None, patterns=None):
+        """Validate many candidate rows with column operations instead of a loop per row.
+
+        frame is a DataFrame or an Arrow table. Runs the same required-field,
+        AI-tag, type and length rules as validate_data_format, plus regex patterns
+        (self.patterns updated with patterns), and reports every failure in a
+        FrameValidation instead of raising on the first one.
+        """
+        try:
+            if not isinstance(frame, pd.DataFrame):
+                frame = frame.to_pandas()
+            rows = len(frame)
+            masks = {}
+
+            def fail(column, rule, mask):
+                if mask.any():
+                    masks[(column, rule)] = mask
+
+            for column in self._required_fields(schema):
+                if column not in frame.columns:
+                    fail(column, 'missing', np.ones(rows, dtype=bool))
+
+            tagged = self.tag_frame(frame, schema)
+            patterns = {**self.patterns, **(patterns or {})}
+            for column in tagged.columns:
+                series = tagged[column]
+                nulls = series.isna().to_numpy()
+                definition = schema.column(column) if schema is not None else None
+                if schema is not None and definition is None:
+                    fail(column, 'unknown', np.ones(rows, dtype=bool))
+                    continue
+
+                strings = _string_mask(series)
+                key_column = column in ('supplier_name', 'product_name')
+                if key_column:
+                    fail(column, 'type', ~strings)
+                if definition is not None:
+                    if not definition.get('nullable', True) and definition.get('default') is None:
+                        fail(column, 'null', nulls)
+                    for rule, mask in self._frame_type_masks(series, definition, strings):
+                        # A key column's type failure is already reported above
+                        fail(column, rule, mask & ~nulls & (strings if key_column else True))
+
+                pattern = patterns.get(column)
+                if pattern is not None and column in frame.columns:
+                    # Matched against the answer itself, not the tagged value
+                    answers = _as_text(frame[column])
+                    matches = answers.str.fullmatch(pattern).fillna(False).to_numpy(dtype=bool)
+                    fail(column, 'pattern', ~matches & ~nulls)
+
+            result = FrameValidation(tagged, masks)
+            logger.info(f"Validated {rows} rows: {int(result.valid.sum())} valid")
+            return result
+        except Exception as e:
+            logger.error(f"Frame validation failed: {str(e)}")
+            raise
+
+    def tag_frame(self, frame, schema=None):
+        """Copy of frame with the AI tag on text values of text columns, as _validate_ai_tags does per row."""
+        tagged = frame.copy()
+        for column in frame.columns:
+            if not self._is_text_column(column, schema):
+                continue
+            series = frame[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                series = series.astype(object)
+            strings = _string_mask(series)
+            if not strings.any():
+                continue
+            untagged = strings & ~_as_text(series).str.endswith(AI_TAG).fillna(True).to_numpy(dtype=bool)
+            if untagged.any():
+                series = series.copy()
+                series[untagged] = series[untagged] + f" {AI_TAG}"
+                tagged[column] = series
+        return tagged
+
+    def _text_matches(self, series, strings, pattern):
+        if not strings.any():
+            return np.zeros(len(series), dtype=bool)
+        matches = _as_text(series).str.strip().str.fullmatch(pattern)
+        return matches.fillna(False).to_numpy(dtype=bool) & strings
+
+    def _frame_type_masks(self, series, column, strings):
+        """(rule, mask of bad values) pairs for one column, mirroring _check_type."""
+        try:
+            python_type = column['type'].python_type
+        except NotImplementedError:
+            return []
+
+        if python_type is str:
+            masks = [('type', ~strings)]
+            length = getattr(column['type'], 'length', None)
+            if length:
+                lengths = _as_text(series).str.len().to_numpy(dtype=float, na_value=0)
+                masks.append(('length', strings & (lengths > length)))
+            return masks
+        if python_type is bool:
+            if pd.api.types.is_bool_dtype(series.dtype):
+                return []
+            valid = _as_text(series).str.strip().str.lower().isin(BOOLEAN_STRINGS).to_numpy(dtype=bool)
+        elif python_type is int:
+            # Like int(): digit strings only, "1.0" is not an integer
+            valid = self._text_matches(series, strings, INTEGER_PATTERN)
+            if not strings.all():
+                numbers = _numeric_values(series, strings)
+                valid = np.where(strings, valid, np.isfinite(numbers) & (numbers == np.floor(numbers)))
+        elif python_type in (float, Decimal):
+            # Like is_number: numeric strings must be finite, numbers need not be
+            valid = self._text_matches(series, strings, NUMBER_PATTERN)
+            if not strings.all():
+                valid = np.where(strings, valid, ~np.isnan(_numeric_values(series, strings)))
+        elif python_type in (date, datetime):
+            if pd.api.types.is_datetime64_any_dtype(series.dtype):
+                return []
+            valid = pd.to_datetime(_stripped(series, strings), errors='coerce', format='ISO8601').notna().to_numpy()
+        else:
+            return []
+        return [('type', ~valid)]
+
+    @traced('validator.unique')
+    def validate_unique_entry(self, new_data, existing_data=None, key_index=None):
         try:
             # Check if combination of supplier and product already exists
-            existing_combinations = existing_data[['supplier_name', 'product_name']].values.tolist()
-            new_combination = [new_data['supplier_name'], new_data['product_name']]
-            
-            if new_combination in existing_combinations:
-                raise ValueError("This supplier and product combination already exists")
-            
+            if key_index is not None:
+                exists = key_index.contains(new_data['supplier_name'], new_data['product_name'])
+            else:
+                existing_combinations = {
+                    normalize_key(supplier_name, product_name)
+                    for supplier_name, product_name in zip(existing_data['supplier_name'], existing_data['product_name'])
+                }
+                exists = normalize_key(new_data['supplier_name'], new_data['product_name']) in existing_combinations
+
+            if exists:
+                raise DuplicateEntryError()
+
             return True
         except Exception as e:
             logger.error(f"Uniqueness validation failed: {str(e)}")
             raise
+
+    @traced('validator.near_duplicates')
+    def find_near_duplicates(self, new_data, index, k=5):
+        """Existing (supplier, product) keys whose names are nearly identical to new_data."""
+        try:
+            query = f"{new_data['supplier_name']} {new_data['product_name']}"
+            return [
+                {'supplier_name': key[0], 'product_name': key[1], 'similarity': round(score, 4)}
+                for key, score in index.search(query, k=k)
+                if score >= self.near_duplicate_threshold
+            ]
+        except Exception as e:
+            logger.error(f"Near-duplicate lookup failed: {str(e)}")
+            raise
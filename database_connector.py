@@ -1,11 +1,34 @@
 import os
+import re
+from contextlib import contextmanager
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import NoSuchTableError
 from logger_config import logger
+from uniqueness_index import DuplicateEntryError
+from table_export import arrow_schema, dataframe_to_batch
+from connection_pool import PoolMetrics, engine_options
+from bulk_writer import INSERTED, UPDATED, UNIQUE_KEY_COLUMNS
+from storage import StorageBackend, migrations_requested
+from schema_cache import TableSchema
+from telemetry import traced
+
+# Rows per execute_values page on Postgres
+POSTGRES_PAGE_SIZE = int(os.getenv('BULK_INSERT_PAGE_SIZE', '1000'))
+
+DDL_STATEMENT = re.compile(r'^\s*(CREATE|ALTER|DROP|RENAME|TRUNCATE)\b', re.IGNORECASE)
+DDL_TABLE = re.compile(
+    r'^\s*(?:CREATE|ALTER|DROP)\s+(?:TEMP(?:ORARY)?\s+)?TABLE\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?(?:"?\w+"?\.)?"?(\w+)"?',
+    re.IGNORECASE
+)
+
+class DatabaseConnector(StorageBackend):
+    """Postgres backend through SQLAlchemy."""
 
-class DatabaseConnector:
     def __init__(self):
+        super().__init__()
         self.engine = None
+        self.pool_metrics = PoolMetrics()
         self.connect()
 
     def connect(self):
@@ -14,15 +37,19 @@ class DatabaseConnector:
             if not database_url:
                 raise ValueError("DATABASE_URL environment variable is not set")
             
-            self.engine = create_engine(database_url)
+            self.engine = create_engine(database_url, **engine_options(database_url))
+            self._watch_ddl()
             
-            # Create table if it doesn't exist
-            self._create_table()
+            if migrations_requested():
+                self.migrate()
             logger.info("Successfully connected to database")
         except Exception as e:
             logger.error(f"Failed to connect to database: {str(e)}")
             raise
 
+    def migrate(self):
+        self._create_table()
+
     def _create_table(self):
         try:
             create_table_query = """
@@ -34,7 +61,7 @@ class DatabaseConnector:
                 UNIQUE(supplier_name, product_name)
             )
             """
-            with self.engine.connect() as conn:
+            with self.connection() as conn:
                 conn.execute(text(create_table_query))
                 conn.commit()
             logger.info("Table created/verified successfully")
@@ -42,30 +69,164 @@ class DatabaseConnector:
             logger.error(f"Error creating table: {str(e)}")
             raise
 
-    def get_table_data(self, table_name):
+    def _watch_ddl(self):
+        # DDL through this engine drops the cached schema; changes made elsewhere
+        # are picked up when SCHEMA_CACHE_TTL expires
+        event.listen(self.engine, 'after_cursor_execute', self._after_execute)
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if DDL_STATEMENT.match(statement):
+            table = DDL_TABLE.match(statement)
+            self._schema_changed(table.group(1) if table else None)
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out of the pool for one unit of work."""
+        with self.pool_metrics.checkout():
+            conn = self.engine.connect()
         try:
-            query = f"SELECT * FROM {table_name}"
-            df = pd.read_sql(query, self.engine)
-            return df
+            yield conn
+        finally:
+            conn.close()
+
+    def pool_stats(self):
+        pool = self.engine.pool
+        stats = {'pool': type(pool).__name__}
+        # Only QueuePool reports sizing
+        for name in ('size', 'checkedout', 'checkedin', 'overflow'):
+            if hasattr(pool, name):
+                stats[name] = getattr(pool, name)()
+        if 'checkedout' in stats:
+            stats['in_use'] = stats.pop('checkedout')
+        return {**stats, **self.pool_metrics.stats()}
+
+    def _read_frame(self, query, params):
+        with self.connection() as conn:
+            return pd.read_sql(text(query), conn, params=params)
+
+    def _inspect_table(self, table_name):
+        inspector = inspect(self.engine)
+        try:
+            columns = inspector.get_columns(table_name)
+        except NoSuchTableError:
+            columns = []
+        if not columns:
+            raise ValueError(f"Unknown table: {table_name}")
+
+        primary_key = inspector.get_pk_constraint(table_name).get('constrained_columns') or []
+        unique_keys = [constraint['column_names'] for constraint in inspector.get_unique_constraints(table_name)]
+        unique_keys += [index['column_names'] for index in inspector.get_indexes(table_name) if index.get('unique')]
+        for column in columns:
+            column['primary_key'] = column['name'] in primary_key
+        if primary_key:
+            unique_keys.insert(0, primary_key)
+        # A unique index backing a constraint is reported by both calls
+        return TableSchema(table_name, columns, dict.fromkeys(tuple(key) for key in unique_keys))
+
+    def iter_table_chunks(self, table_name, columns=None, filters=None, cursor=None, chunksize=10000):
+        """DataFrames of at most chunksize rows, read through a server-side cursor."""
+        # Build the query up front so bad columns fail before anything is streamed
+        query, params, key_column, key_added = self._build_select(table_name, columns, filters, cursor)
+
+        def chunks():
+            try:
+                with self.connection() as conn:
+                    conn = conn.execution_options(stream_results=True)
+                    for df in pd.read_sql(text(query), conn, params=params, chunksize=chunksize):
+                        yield df.drop(columns=[key_column]) if key_added else df
+            except Exception as e:
+                logger.error(f"Error streaming table {table_name}: {str(e)}")
+                raise
+
+        return chunks()
+
+    def iter_arrow_batches(self, table_name, columns=None, filters=None, chunksize=50000):
+        """Arrow schema and a generator of record batches for a table export."""
+        table_schema = self.get_table_schema(table_name)
+        schema = arrow_schema([
+            table_schema.column(name) for name in (columns or table_schema.column_names) if table_schema.column(name)
+        ])
+        chunks = self.iter_table_chunks(table_name, columns, filters, chunksize=chunksize)
+        return schema, (dataframe_to_batch(df, schema) for df in chunks)
+
+    def iter_key_rows(self, table_name, columns, chunksize=50000):
+        """Yield lists of tuples for the given columns without loading whole rows."""
+        try:
+            query = f"SELECT {', '.join(columns)} FROM {table_name}"
+            with self.connection() as conn:
+                result = conn.execution_options(stream_results=True).execute(text(query))
+                while True:
+                    rows = result.fetchmany(chunksize)
+                    if not rows:
+                        break
+                    yield [tuple(row) for row in rows]
         except Exception as e:
-            logger.error(f"Error fetching data from table {table_name}: {str(e)}")
+            logger.error(f"Error reading keys from table {table_name}: {str(e)}")
             raise
 
+    @traced('db.insert')
     def insert_ai_generated_row(self, table_name, data_dict):
         try:
             columns = ', '.join(data_dict.keys())
             placeholders = ', '.join([':' + key for key in data_dict.keys()])
             
+            # The table's UNIQUE constraint gives the authoritative duplicate answer
             query = f"""
                 INSERT INTO {table_name} ({columns})
                 VALUES ({placeholders})
+                ON CONFLICT DO NOTHING
             """
-            
-            with self.engine.connect() as conn:
-                conn.execute(text(query), data_dict)
+
+            with self.connection() as conn:
+                result = conn.execute(text(query), data_dict)
                 conn.commit()
-            
+
+            if result.rowcount == 0:
+                raise DuplicateEntryError()
+
             logger.info(f"Successfully inserted AI generated row into {table_name}")
+            self._notify_insert(table_name, [data_dict])
         except Exception as e:
             logger.error(f"Error inserting data into table {table_name}: {str(e)}")
             raise
+
+    def _conflict_clause(self, columns, upsert):
+        target = ', '.join(UNIQUE_KEY_COLUMNS)
+        updates = [column for column in columns if column not in UNIQUE_KEY_COLUMNS]
+        if upsert and updates:
+            assignments = ', '.join(f"{column} = excluded.{column}" for column in updates)
+            return f"ON CONFLICT ({target}) DO UPDATE SET {assignments}"
+        return f"ON CONFLICT ({target}) DO NOTHING"
+
+    def _write_group(self, table_name, columns, group, upsert):
+        from psycopg2.extras import execute_values
+
+        # xmax is 0 only for freshly inserted tuples, which tells inserts from updates
+        query = f"""
+            INSERT INTO {table_name} ({', '.join(columns)})
+            VALUES %s
+            {self._conflict_clause(columns, upsert)}
+            RETURNING {', '.join(UNIQUE_KEY_COLUMNS)}, (xmax = 0)
+        """
+        with self.pool_metrics.checkout():
+            raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            returned = execute_values(
+                cursor, query, [tuple(row[column] for column in columns) for row in group],
+                page_size=POSTGRES_PAGE_SIZE, fetch=True
+            )
+            cursor.close()
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
+        return {tuple(key[:-1]): INSERTED if key[-1] else UPDATED for key in returned}
+
+    def close(self):
+        super().close()
+        if self.engine is not None:
+            self.engine.dispose()
+            logger.info("Database connection closed")
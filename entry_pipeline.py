@@ -0,0 +1,189 @@
+import asyncio
+from logger_config import logger
+from uniqueness_index import DuplicateEntryError
+from bulk_writer import DUPLICATE, FAILED
+from rate_limiter import current_caller
+from telemetry import span, traced
+
+STAGES = [
+    'loading_reference_data',
+    'scraping',
+    'analyzing',
+    'validating_ai',
+    'validating_data',
+    'inserting',
+]
+
+class EntryPipeline:
+    def __init__(self, db, web_scraper, ai_processor, data_validator, similarity_indexes=None,
+                 uniqueness_index=None, writer=None, snapshots=None):
+        self.db = db
+        self.web_scraper = web_scraper
+        self.ai_processor = ai_processor
+        self.data_validator = data_validator
+        self.similarity_indexes = similarity_indexes
+        self.uniqueness_index = uniqueness_index
+        # Optional BufferedWriter, coalesces inserts from concurrent requests
+        self.writer = writer
+        # Optional SnapshotStore, serves the reference table without re-reading it
+        self.snapshots = snapshots
+
+    async def run(self, supplier_name, product_name, table_name, progress=None, bypass_cache=False,
+                  validation_mode=None, on_field=None):
+        """Generate, validate and insert one entry.
+
+        progress(stage) is awaited as each stage starts. With on_field, the answers
+        are streamed and on_field(question, field) is awaited as each one completes,
+        with the field already checked against its column.
+        """
+        # Each entry is its own caller for the OpenAI scheduler's fair queueing
+        current_caller.set(f"entry:{supplier_name}/{product_name}")
+        if self.uniqueness_index is None:
+            return await self._generate(
+                supplier_name, product_name, table_name, progress, None, bypass_cache, validation_mode, on_field
+            )
+
+        # Reject known duplicates before paying for the scrape and the AI calls, and
+        # hold the key so concurrent requests for the same pair do not race. Off the
+        # loop, since with shared state these are SQLite transactions
+        key_index = await asyncio.to_thread(self.uniqueness_index.table, table_name)
+        if not await asyncio.to_thread(key_index.reserve, supplier_name, product_name):
+            logger.info(f"Skipping duplicate entry {supplier_name} / {product_name}")
+            raise DuplicateEntryError()
+        try:
+            return await self._generate(
+                supplier_name, product_name, table_name, progress, key_index, bypass_cache, validation_mode,
+                on_field
+            )
+        finally:
+            await asyncio.to_thread(key_index.release, supplier_name, product_name)
+
+    async def _load_table(self, table_name):
+        if self.snapshots is not None:
+            return await asyncio.to_thread(self.snapshots.get_table_data, table_name)
+        return await self.db.get_table_data_async(table_name)
+
+    @traced('entry.generate')
+    async def _generate(self, supplier_name, product_name, table_name, progress, key_index, bypass_cache=False,
+                        validation_mode=None, on_field=None):
+        async def report(stage):
+            if progress is not None:
+                await progress(stage)
+
+        try:
+            # Get existing data
+            await report('loading_reference_data')
+            schema = await self.db.get_table_schema_async(table_name)
+            with span('entry.load_reference_data'):
+                existing_data = await self._load_table(table_name)
+
+            # Scrape web data
+            await report('scraping')
+            scraped_info = await self.web_scraper.search_product_info(
+                supplier_name,
+                product_name
+            )
+
+            # Get questions from the cached table schema
+            questions = schema.question_columns()
+
+            # Pick the historical rows that go into the prompt
+            index = None
+            if self.similarity_indexes is not None:
+                index = await asyncio.to_thread(self.similarity_indexes.get, table_name, existing_data)
+            history, context_stats = await asyncio.to_thread(
+                self.ai_processor.select_context,
+                existing_data,
+                supplier_name,
+                product_name,
+                index
+            )
+
+            def precheck(responses):
+                # Local schema and rule checks; a row they reject skips AI validation
+                return self.data_validator.precheck(
+                    {**responses, 'supplier_name': supplier_name, 'product_name': product_name}, schema
+                )
+
+            # Generate AI responses
+            await report('analyzing')
+            if on_field is not None:
+                async def field_done(question, field):
+                    # Schema checks run per answer while the rest is still generating
+                    check = self.data_validator.check_field(question, field.get('answer'), schema)
+                    await on_field(question, {**field, 'check': check})
+
+                ai_responses, validation_result = await self.ai_processor.stream_validated(
+                    history,
+                    scraped_info['content'],
+                    questions,
+                    field_done,
+                    mode=validation_mode,
+                    bypass_cache=bypass_cache,
+                    precheck=precheck,
+                    on_validate=lambda: report('validating_ai')
+                )
+            else:
+                ai_responses, validation_result = await self.ai_processor.generate_validated(
+                    history,
+                    scraped_info['content'],
+                    questions,
+                    mode=validation_mode,
+                    bypass_cache=bypass_cache,
+                    precheck=precheck,
+                    on_validate=lambda: report('validating_ai')
+                )
+
+            if not validation_result['is_valid']:
+                return {
+                    "status": "error",
+                    "message": "Generated data failed validation",
+                    "validation_details": validation_result,
+                    "context": context_stats
+                }
+
+            # Prepare data for insertion
+            # The requested key wins over whatever the model answered for it
+            new_data = {
+                **ai_responses,
+                'supplier_name': supplier_name,
+                'product_name': product_name
+            }
+
+            # Validate data
+            await report('validating_data')
+            near_duplicates = []
+            if index is not None:
+                near_duplicates = self.data_validator.find_near_duplicates(new_data, index)
+                if near_duplicates:
+                    logger.warning(f"Possible near-duplicates for {supplier_name} / {product_name}: {near_duplicates}")
+            new_data = self.data_validator.validate_data_format(new_data, schema)
+            await asyncio.to_thread(self.data_validator.validate_unique_entry, new_data, existing_data, key_index)
+
+            # Insert into database
+            await report('inserting')
+            # Includes waiting for the buffered writer's flush
+            with span('entry.insert'):
+                if self.writer is not None:
+                    outcome = await self.writer.write(table_name, new_data)
+                    if outcome['status'] == DUPLICATE:
+                        raise DuplicateEntryError()
+                    if outcome['status'] == FAILED:
+                        raise RuntimeError(outcome['error'])
+                else:
+                    await self.db.insert_ai_generated_row_async(
+                        table_name,
+                        new_data
+                    )
+
+            result = {
+                "status": "success",
+                "message": "Entry generated and inserted successfully",
+                "context": context_stats
+            }
+            if near_duplicates:
+                result["near_duplicates"] = near_duplicates
+            return result
+        except Exception as e:
+            logger.error(f"Error generating entry for {supplier_name} / {product_name}: {str(e)}")
+            raise
@@ -19,6 +19,39 @@ import axios from 'axios';
 
 const API_BASE_URL = 'http://localhost:5000/api';
 
+// Calls onEvent(event, data) for each server-sent event of a POST response
+const streamEvents = async (url, body, onEvent) => {
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(body)
+  });
+  if (!response.ok) {
+    const detail = await response.json().catch(() => ({}));
+    throw new Error(detail.detail || `Request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const message = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      const data = [];
+      message.split('\n').forEach(line => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+      });
+      if (data.length) onEvent(event, JSON.parse(data.join('\n')));
+    }
+  }
+};
+
 function App() {
   const [supplierName, setSupplierName] = useState('');
   const [productName, setProductName] = useState('');
@@ -27,6 +60,8 @@ function App() {
   const [success, setSuccess] = useState(null);
   const [existingData, setExistingData] = useState([]);
   const [serverConnected, setServerConnected] = useState(false);
+  const [stage, setStage] = useState(null);
+  const [fields, setFields] = useState({});
 
   useEffect(() => {
     checkServerConnection();
@@ -69,26 +104,41 @@ function App() {
     setLoading(true);
     setError(null);
     setSuccess(null);
+    setStage(null);
+    setFields({});
 
     try {
-      const response = await axios.post(`${API_BASE_URL}/generate-entry`, {
+      // Answers are shown as the model generates them instead of after the whole entry
+      let result = null;
+      await streamEvents(`${API_BASE_URL}/generate-entry/stream`, {
         supplier_name: supplierName,
         product_name: productName,
         table_name: 'supplier_products'
+      }, (event, data) => {
+        if (event === 'stage') {
+          setStage(data.stage);
+        } else if (event === 'field') {
+          setFields(previous => ({ ...previous, [data.field]: data }));
+        } else if (event === 'result') {
+          result = data;
+        } else if (event === 'error') {
+          throw new Error(data.detail);
+        }
       });
 
-      if (response.data.status === 'success') {
+      if (result?.status === 'success') {
         setSuccess('Entry generated and inserted successfully');
         setSupplierName('');
         setProductName('');
         await fetchExistingData();
       } else {
-        setError('Failed to generate entry: ' + response.data.message);
+        setError('Failed to generate entry: ' + (result?.message || 'no result received'));
       }
     } catch (err) {
-      setError(err.response?.data?.detail || 'Failed to generate entry');
+      setError(err.message || 'Failed to generate entry');
     } finally {
       setLoading(false);
+      setStage(null);
     }
   };
 
@@ -148,6 +198,40 @@ function App() {
             </Box>
           </form>
 
+          {loading && stage && (
+            <Typography variant="body2" color="text.secondary" sx={{ mt: 2 }}>
+              {stage.replace(/_/g, ' ')}...
+            </Typography>
+          )}
+          {Object.keys(fields).length > 0 && (
+            <TableContainer sx={{ mt: 2 }}>
+              <Table size="small">
+                <TableHead>
+                  <TableRow>
+                    <TableCell>Field</TableCell>
+                    <TableCell>Answer</TableCell>
+                    <TableCell>Check</TableCell>
+                  </TableRow>
+                </TableHead>
+                <TableBody>
+                  {Object.values(fields).map(field => {
+                    const issues = [...(field.check || []), ...(field.issues || [])];
+                    return (
+                      <TableRow key={field.field}>
+                        <TableCell>{field.field}</TableCell>
+                        <TableCell>{String(field.answer ?? '')}</TableCell>
+                        <TableCell sx={{ color: issues.length ? 'error.main' : 'success.main' }}>
+                          {issues.length ? issues.join('; ') : 'ok'}
+                          {field.confidence != null && ` (confidence ${field.confidence})`}
+                        </TableCell>
+                      </TableRow>
+                    );
+                  })}
+                </TableBody>
+              </Table>
+            </TableContainer>
+          )}
+
           {error && (
             <Alert severity="error" sx={{ mt: 2 }}>
               {error}
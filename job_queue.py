@@ -0,0 +1,258 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from sqlalchemy import create_engine, text
+from logger_config import logger
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED_STATES = {SUCCEEDED, FAILED}
+
+class JobStore:
+    """Interface for job state backends."""
+
+    def create(self, job):
+        raise NotImplementedError
+
+    def update(self, job_id, **fields):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def list_unfinished(self):
+        raise NotImplementedError
+
+    def requeue(self, job_id, updated_at):
+        """Mark a job queued again if it has not changed since updated_at; False if someone else got there first."""
+        raise NotImplementedError
+
+class InMemoryJobStore(JobStore):
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            self._jobs[job['id']] = dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_unfinished(self):
+        with self._lock:
+            return [dict(job) for job in self._jobs.values() if job['status'] not in FINISHED_STATES]
+
+    def requeue(self, job_id, updated_at):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['updated_at'] != updated_at:
+                return False
+            job.update(status=QUEUED, stage=None, updated_at=time.time())
+            return True
+
+class SQLJobStore(JobStore):
+    """Job state persisted through SQLAlchemy, works with SQLite and Postgres URLs."""
+
+    JSON_FIELDS = ('request', 'result')
+
+    def __init__(self, database_url, table_name='generation_jobs'):
+        self.table_name = table_name
+        self.engine = create_engine(database_url)
+        self._create_table()
+
+    def _create_table(self):
+        try:
+            create_table_query = f"""
+            CREATE TABLE IF NOT EXISTS {self.table_name} (
+                id VARCHAR(32) PRIMARY KEY,
+                status VARCHAR(16) NOT NULL,
+                stage VARCHAR(64),
+                request TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at DOUBLE PRECISION NOT NULL,
+                updated_at DOUBLE PRECISION NOT NULL
+            )
+            """
+            with self.engine.connect() as conn:
+                conn.execute(text(create_table_query))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error creating job table: {str(e)}")
+            raise
+
+    def _encode(self, fields):
+        return {
+            key: json.dumps(value) if key in self.JSON_FIELDS and value is not None else value
+            for key, value in fields.items()
+        }
+
+    def _decode(self, row):
+        job = dict(row._mapping)
+        for key in self.JSON_FIELDS:
+            if job.get(key) is not None:
+                job[key] = json.loads(job[key])
+        return job
+
+    def create(self, job):
+        job = self._encode(job)
+        columns = ', '.join(job.keys())
+        placeholders = ', '.join([':' + key for key in job.keys()])
+        with self.engine.connect() as conn:
+            conn.execute(text(f"INSERT INTO {self.table_name} ({columns}) VALUES ({placeholders})"), job)
+            conn.commit()
+
+    def update(self, job_id, **fields):
+        fields = self._encode({**fields, 'updated_at': time.time()})
+        assignments = ', '.join(f"{key} = :{key}" for key in fields)
+        with self.engine.connect() as conn:
+            conn.execute(
+                text(f"UPDATE {self.table_name} SET {assignments} WHERE id = :job_id"),
+                {**fields, 'job_id': job_id}
+            )
+            conn.commit()
+
+    def get(self, job_id):
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text(f"SELECT * FROM {self.table_name} WHERE id = :job_id"), {'job_id': job_id}
+            ).fetchone()
+        return self._decode(row) if row else None
+
+    def list_unfinished(self):
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(f"SELECT * FROM {self.table_name} WHERE status IN (:queued, :running) ORDER BY created_at"),
+                {'queued': QUEUED, 'running': RUNNING}
+            ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def requeue(self, job_id, updated_at):
+        with self.engine.connect() as conn:
+            claimed = conn.execute(
+                text(f"UPDATE {self.table_name} SET status = :queued, stage = NULL, updated_at = :now "
+                     f"WHERE id = :job_id AND updated_at = :updated_at"),
+                {'queued': QUEUED, 'now': time.time(), 'job_id': job_id, 'updated_at': updated_at}
+            ).rowcount == 1
+            conn.commit()
+        return claimed
+
+def create_job_store(store_url=None):
+    store_url = store_url if store_url is not None else os.getenv('JOB_STORE_URL', '')
+    if not store_url or store_url == 'memory':
+        return InMemoryJobStore()
+    return SQLJobStore(store_url)
+
+class JobQueue:
+    def __init__(self, pipeline, store=None, concurrency=None, max_queue_size=None):
+        self.pipeline = pipeline
+        self.store = store or create_job_store()
+        self.concurrency = concurrency or int(os.getenv('JOB_WORKERS', '4'))
+        # 0 means unbounded, so bursts are buffered instead of rejected
+        self.max_queue_size = max_queue_size if max_queue_size is not None else int(os.getenv('JOB_QUEUE_MAX_SIZE', '0'))
+        # A job whose worker process has not updated it for this long is taken to be orphaned
+        self.stale_after = float(os.getenv('JOB_STALE_SECONDS', '600'))
+        self._queue = None
+        self._workers = []
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        # Pick up jobs left behind by a previous process when the store is persistent.
+        # Worker processes sharing the store each try, and the requeue lets one of them
+        # win each job; jobs a running sibling touched since launch are left alone
+        # unless they have gone stale, i.e. their worker died.
+        now = time.time()
+        cutoff = max(float(os.getenv('SERVE_STARTED_AT') or now), now - self.stale_after)
+        recovered = 0
+        for job in await asyncio.to_thread(self.store.list_unfinished):
+            if job['updated_at'] > cutoff:
+                continue
+            if await asyncio.to_thread(self.store.requeue, job['id'], job['updated_at']):
+                self._queue.put_nowait(job['id'])
+                recovered += 1
+        if recovered:
+            logger.info(f"Recovered {recovered} unfinished jobs")
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        logger.info(f"Job queue started with {self.concurrency} workers")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, supplier_name, product_name, table_name, bypass_cache=False, validation_mode=None):
+        if self._queue.full():
+            raise RuntimeError("Job queue is full")
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': QUEUED,
+            'stage': None,
+            'request': {
+                'supplier_name': supplier_name,
+                'product_name': product_name,
+                'table_name': table_name,
+                'bypass_cache': bypass_cache,
+                'validation_mode': validation_mode
+            },
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now
+        }
+        await asyncio.to_thread(self.store.create, job)
+        self._queue.put_nowait(job['id'])
+        return job
+
+    async def get(self, job_id):
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue else 0
+
+    async def _worker(self, worker_id):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id):
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            return
+
+        async def progress(stage):
+            await asyncio.to_thread(self.store.update, job_id, status=RUNNING, stage=stage)
+
+        try:
+            request = job['request']
+            result = await self.pipeline.run(
+                request['supplier_name'],
+                request['product_name'],
+                request['table_name'],
+                progress=progress,
+                bypass_cache=request.get('bypass_cache', False),
+                validation_mode=request.get('validation_mode')
+            )
+            status = SUCCEEDED if result.get('status') == 'success' else FAILED
+            await asyncio.to_thread(self.store.update, job_id, status=status, result=result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            await asyncio.to_thread(self.store.update, job_id, status=FAILED, error=str(e))
@@ -0,0 +1,91 @@
+import json
+
+_decoder = json.JSONDecoder()
+_INCOMPLETE = object()
+
+class JSONFieldStream:
+    """Incremental parser for a JSON object arriving in pieces, as from a streamed completion.
+
+    feed() returns the (key, value) members that completed since the last call.
+    With a path, members of the nested object at that path are reported instead,
+    e.g. path=('fields',) for {"fields": {...}}; other members are skipped.
+    """
+
+    def __init__(self, path=()):
+        self.path = tuple(path)
+        self.buffer = ''
+        self.pos = 0
+        self.depth = 0
+        self.state = 'start'
+        self.key = None
+        self.done = False
+
+    def feed(self, text):
+        self.buffer += text
+        members = []
+        while not self.done:
+            self._skip_whitespace()
+            if self.pos == len(self.buffer):
+                break
+            char = self.buffer[self.pos]
+            if self.state == 'start':
+                if char != '{':
+                    raise ValueError(f"Expected a JSON object, got {char!r}")
+                self.pos += 1
+                self.state = 'key'
+            elif self.state in ('key', 'after_value') and char == '}':
+                self.pos += 1
+                if self.depth == 0:
+                    self.done = True
+                else:
+                    self.depth -= 1
+                    self.state = 'after_value'
+            elif self.state == 'after_value':
+                if char != ',':
+                    raise ValueError(f"Expected ',' or '}}', got {char!r}")
+                self.pos += 1
+                self.state = 'key'
+            elif self.state == 'key':
+                key = self._decode()
+                if key is _INCOMPLETE:
+                    break
+                self.key = key
+                self.state = 'colon'
+            elif self.state == 'colon':
+                if char != ':':
+                    raise ValueError(f"Expected ':', got {char!r}")
+                self.pos += 1
+                self.state = 'value'
+            elif self.depth < len(self.path) and self.key == self.path[self.depth] and char == '{':
+                # Descend into the object whose members are reported
+                self.pos += 1
+                self.depth += 1
+                self.state = 'key'
+            else:
+                value = self._decode()
+                if value is _INCOMPLETE:
+                    break
+                if self.depth == len(self.path):
+                    members.append((self.key, value))
+                self.state = 'after_value'
+        # Keep only the unparsed tail
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        return members
+
+    def _skip_whitespace(self):
+        while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+            self.pos += 1
+
+    def _decode(self):
+        """Next complete JSON value at pos, or _INCOMPLETE until more text arrives."""
+        try:
+            value, end = _decoder.raw_decode(self.buffer, self.pos)
+        except json.JSONDecodeError:
+            return _INCOMPLETE
+        # A number is only complete once a delimiter follows it: "12" may become "12.5"
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            if end == len(self.buffer) or self.buffer[end] not in ',}] \t\r\n':
+                return _INCOMPLETE
+        self.pos = end
+        return value
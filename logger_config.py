@@ -3,19 +3,22 @@ import os
 from datetime import datetime
 
 def setup_logger():
-    # Create logs directory if it doesn't exist
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
+    handlers = [logging.StreamHandler()]
+
+    # File logging, off when LOG_DIR is empty (e.g. containers that log to stdout)
+    log_dir = os.getenv('LOG_DIR', 'logs')
+    if log_dir:
+        # Create logs directory if it doesn't exist
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+        log_filename = os.path.join(log_dir, f'app_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
+        handlers.insert(0, logging.FileHandler(log_filename))
 
     # Configure logging
-    log_filename = f'logs/app_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_filename),
-            logging.StreamHandler()
-        ]
+        handlers=handlers
     )
     return logging.getLogger(__name__)
 
@@ -1,131 +1,429 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import uvicorn
-from database_connector import DatabaseConnector
-from web_scraper import WebScraper
-from ai_processor import AIProcessor
-from data_validator import DataValidator
+from typing import List, Literal, Optional
+import asyncio
+import json
+from components import Components, PRELOAD_COMPONENTS
+from uniqueness_index import DuplicateEntryError
+from telemetry import registry
 from logger_config import logger
 import os
 import sys
+import time
 
-app = FastAPI()
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Enable CORS for frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000", "http://0.0.0.0:3000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+router = APIRouter()
+
+HTTP_SECONDS = registry.histogram(
+    'http_request_duration_seconds', "HTTP request latency by route", ('method', 'route', 'status')
 )
 
-# Initialize components
-db = None
-web_scraper = WebScraper()
-ai_processor = AIProcessor()
-data_validator = DataValidator()
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template, not the raw path, so table names and job ids do not explode the label set
+        route = request.scope.get('route')
+        HTTP_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, 'path', 'unmatched'),
+            status=status
+        )
+
+def register_gauges(components):
+    def scheduler_stat(name):
+        ai_processor = components.peek('ai_processor')
+        return ai_processor.scheduler.stats()[name] if ai_processor else None
+
+    registry.gauge(
+        'openai_queue_depth', "OpenAI requests waiting for admission",
+        lambda: scheduler_stat('queue_depth')
+    )
+    registry.gauge(
+        'openai_in_flight', "OpenAI requests in flight",
+        lambda: scheduler_stat('in_flight')
+    )
+    registry.gauge(
+        'db_connections_in_use', "Database connections checked out",
+        lambda: components.peek('db').pool_stats().get('in_use') if components.peek('db') else None
+    )
+
+def create_app():
+    """The API with its own Components, built on first use; one per worker process."""
+    app = FastAPI()
+
+    # Enable CORS for frontend
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000", "http://0.0.0.0:3000"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.middleware("http")(record_request_latency)
+
+    components = Components()
+    app.state.components = components
+    register_gauges(components)
+
+    @app.on_event("startup")
+    async def startup():
+        # Components are built by the first request that needs them, unless asked
+        # for up front; a persistent job store also needs its queue running to
+        # resume jobs a previous process left behind
+        try:
+            if PRELOAD_COMPONENTS:
+                await asyncio.to_thread(components.build_all)
+            if PRELOAD_COMPONENTS or os.getenv('JOB_STORE_URL'):
+                await components.job_queue()
+        except Exception as e:
+            logger.error(f"Failed to initialize components: {e}")
+            raise
+
+    app.on_event("shutdown")(components.close)
+    app.include_router(router)
+    return app
+
+def get_components(request: Request):
+    return request.app.state.components
+
+# Dependencies are plain functions, so FastAPI builds components in its thread
+# pool rather than blocking the event loop on the first request
+def get_db(components=Depends(get_components)):
+    try:
+        return components.db
+    except Exception:
+        raise HTTPException(status_code=503, detail="Database connection not available")
+
+def get_pipeline(db=Depends(get_db), components=Depends(get_components)):
+    return components.pipeline
+
+def get_ai_processor(components=Depends(get_components)):
+    return components.ai_processor
+
+async def get_job_queue(components=Depends(get_components)):
+    try:
+        return await components.job_queue()
+    except Exception:
+        raise HTTPException(status_code=503, detail="Job queue not available")
 
 class ProductRequest(BaseModel):
     supplier_name: str
     product_name: str
     table_name: str = "supplier_products"
+    bypass_cache: bool = False
+    # None uses AI_VALIDATION_MODE
+    validation_mode: Optional[Literal["two_pass", "combined"]] = None
 
-@app.on_event("startup")
-async def startup_event():
-    global db
-    try:
-        db = DatabaseConnector()
-        logger.info("Database connection initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize database connection: {e}")
-        raise
-
-@app.get("/")
+@router.get("/")
 async def root():
     return {"status": "healthy", "message": "FastAPI server is running"}
 
-@app.get("/api/health")
+@router.get("/api/health")
 async def health_check():
     return {"status": "healthy"}
 
-@app.get("/api/data/{table_name}")
-async def get_table_data(table_name: str):
+@router.get("/api/cache/stats")
+async def cache_stats(components=Depends(get_components)):
+    # Caches that have not been built yet report None
+    scrape_cache, ai_cache, db, snapshots = (
+        components.peek(name) for name in ('scrape_cache', 'ai_cache', 'db', 'snapshots')
+    )
+    return {
+        "scrape": scrape_cache.stats() if scrape_cache else None,
+        "ai": ai_cache.stats() if ai_cache else None,
+        "schema": db.schema_cache.stats() if db else None,
+        "snapshots": snapshots.stats() if snapshots else None
+    }
+
+DATA_PAGE_SIZE = int(os.getenv('DATA_PAGE_SIZE', '1000'))
+DATA_MAX_PAGE_SIZE = int(os.getenv('DATA_MAX_PAGE_SIZE', '10000'))
+DATA_STREAM_CHUNK_SIZE = int(os.getenv('DATA_STREAM_CHUNK_SIZE', '10000'))
+
+def parse_filters(filters):
+    parsed = {}
+    for item in filters or []:
+        column, separator, value = item.partition(':')
+        if not separator or not column:
+            raise ValueError(f"Filters must look like column:value, got {item}")
+        parsed[column] = value
+    return parsed
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/api/ai/scheduler")
+async def ai_scheduler_stats(ai_processor=Depends(get_ai_processor)):
+    return ai_processor.scheduler.stats()
+
+@router.get("/api/validation/rules")
+def validation_rule_stats(components=Depends(get_components)):
+    ai_processor = components.peek('ai_processor')
+    return {
+        "rules": components.validation_rules.stats(),
+        "calls_avoided": ai_processor.usage['calls_avoided'] if ai_processor else 0
+    }
+
+@router.post("/api/validation/rules/reload")
+def reload_validation_rules(components=Depends(get_components)):
+    components.validation_rules.reload()
+    return {"status": "reloaded"}
+
+@router.get("/api/db/pool")
+async def pool_stats(db=Depends(get_db)):
+    return db.pool_stats()
+
+@router.get("/api/data/{table_name}")
+async def get_table_data(
+    table_name: str,
+    limit: int = Query(DATA_PAGE_SIZE, ge=1, le=DATA_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    columns: Optional[str] = None,
+    filter: Optional[List[str]] = Query(None),
+    format: str = Query("json", pattern="^(json|ndjson|arrow|parquet)$"),
+    db=Depends(get_db)
+):
     try:
-        if not db:
-            raise HTTPException(status_code=503, detail="Database connection not available")
-        data = db.get_table_data(table_name)
-        return {"status": "success", "data": data.to_dict('records')}
+        selected = [column.strip() for column in columns.split(',') if column.strip()] if columns else None
+        filters = parse_filters(filter)
+
+        # Streaming formats export the whole (filtered) table and ignore limit/offset
+        if format != "json":
+            # pyarrow is only loaded by processes that serve exports
+            from table_export import (
+                ARROW_MEDIA_TYPE, NDJSON_MEDIA_TYPE, PARQUET_MEDIA_TYPE,
+                stream_arrow_ipc, stream_ndjson, stream_parquet
+            )
+        if format == "ndjson":
+            chunks = await asyncio.to_thread(
+                db.iter_table_chunks, table_name, selected, filters, cursor, DATA_STREAM_CHUNK_SIZE
+            )
+            return StreamingResponse(stream_ndjson(chunks), media_type=NDJSON_MEDIA_TYPE)
+        if format in ("arrow", "parquet"):
+            schema, batches = await asyncio.to_thread(
+                db.iter_arrow_batches, table_name, selected, filters, DATA_STREAM_CHUNK_SIZE
+            )
+            if format == "arrow":
+                return StreamingResponse(stream_arrow_ipc(schema, batches), media_type=ARROW_MEDIA_TYPE)
+            return StreamingResponse(
+                stream_parquet(schema, batches),
+                media_type=PARQUET_MEDIA_TYPE,
+                headers={"Content-Disposition": f'attachment; filename="{table_name}.parquet"'}
+            )
+
+        data, next_cursor = await db.query_table_async(table_name, selected, filters, limit, offset, cursor)
+        return {
+            "status": "success",
+            "data": data.to_dict('records'),
+            "limit": limit,
+            "offset": offset,
+            "next_cursor": next_cursor
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching data: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/generate-entry")
-async def generate_entry(request: ProductRequest):
+@router.post("/api/generate-entry")
+async def generate_entry(request: ProductRequest, pipeline=Depends(get_pipeline)):
     try:
-        if not db:
-            raise HTTPException(status_code=503, detail="Database connection not available")
-
-        # Get existing data
-        existing_data = db.get_table_data(request.table_name)
-
-        # Scrape web data
-        scraped_info = web_scraper.search_product_info(
+        return await pipeline.run(
             request.supplier_name,
-            request.product_name
+            request.product_name,
+            request.table_name,
+            bypass_cache=request.bypass_cache,
+            validation_mode=request.validation_mode
         )
+    except DuplicateEntryError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error generating entry: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Get questions from existing data
-        questions = existing_data.columns.tolist()
-
-        # Generate AI responses
-        ai_responses = ai_processor.analyze_product_data(
-            existing_data.to_dict('records'),
-            scraped_info['content'],
-            questions
-        )
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
-        # Validate responses
-        validation_result = ai_processor.validate_ai_responses(
-            ai_responses,
-            questions
-        )
+@router.post("/api/generate-entry/stream")
+async def generate_entry_stream(request: ProductRequest, pipeline=Depends(get_pipeline)):
+    """generate-entry as server-sent events: stage, one field per answer as it is generated, then result or error."""
+    events = asyncio.Queue()
 
-        if validation_result['is_valid']:
-            # Prepare data for insertion
-            new_data = {
-                'supplier_name': request.supplier_name,
-                'product_name': request.product_name,
-                **ai_responses
-            }
+    async def on_stage(stage):
+        await events.put(sse_event("stage", {"stage": stage}))
 
-            # Validate data
-            data_validator.validate_data_format(new_data)
-            data_validator.validate_unique_entry(new_data, existing_data)
+    async def on_field(question, field):
+        await events.put(sse_event("field", {"field": question, **field}))
 
-            # Insert into database
-            db.insert_ai_generated_row(
+    async def run():
+        try:
+            result = await pipeline.run(
+                request.supplier_name,
+                request.product_name,
                 request.table_name,
-                new_data
+                progress=on_stage,
+                bypass_cache=request.bypass_cache,
+                validation_mode=request.validation_mode,
+                on_field=on_field
             )
+            await events.put(sse_event("result", result))
+        except DuplicateEntryError as e:
+            await events.put(sse_event("error", {"status_code": 409, "detail": str(e)}))
+        except Exception as e:
+            logger.error(f"Error generating entry: {str(e)}")
+            await events.put(sse_event("error", {"status_code": 500, "detail": str(e)}))
+        finally:
+            await events.put(None)
 
-            return {"status": "success", "message": "Entry generated and inserted successfully"}
-        else:
-            return {
-                "status": "error",
-                "message": "Generated data failed validation",
-                "validation_details": validation_result
-            }
+    async def event_stream():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                message = await events.get()
+                if message is None:
+                    break
+                yield message
+        finally:
+            # Client went away: stop paying for tokens nobody will read
+            if not task.done():
+                task.cancel()
 
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/api/generate-entries/batch")
+async def generate_entries_batch(
+    request: Request,
+    table_name: str = "supplier_products",
+    format: Optional[str] = None,
+    concurrency: Optional[int] = None,
+    bypass_cache: bool = False,
+    validation_mode: Optional[str] = Query(None, pattern="^(two_pass|combined)$"),
+    pipeline=Depends(get_pipeline),
+    components=Depends(get_components)
+):
+    from batch_processor import BatchProcessor, parse_batch_input
+
+    try:
+        content = (await request.body()).decode('utf-8')
+        if format is None and 'ndjson' in request.headers.get('content-type', ''):
+            format = 'jsonl'
+        pairs = parse_batch_input(content, format)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch input: {str(e)}")
+
+    try:
+        # All built along with the pipeline
+        processor = BatchProcessor(
+            components.db, components.web_scraper, components.ai_processor, components.data_validator,
+            concurrency=concurrency, similarity_indexes=components.similarity_indexes,
+            uniqueness_index=components.uniqueness_index, writer=components.writer, snapshots=components.snapshots
+        )
+        return await processor.run(pairs, table_name, bypass_cache=bypass_cache, validation_mode=validation_mode)
     except Exception as e:
-        logger.error(f"Error generating entry: {str(e)}")
+        logger.error(f"Error generating batch entries: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/api/jobs", status_code=202)
+async def create_job(request: ProductRequest, job_queue=Depends(get_job_queue)):
+    try:
+        job = await job_queue.submit(
+            request.supplier_name,
+            request.product_name,
+            request.table_name,
+            bypass_cache=request.bypass_cache,
+            validation_mode=request.validation_mode
+        )
+        return {"status": "accepted", "job_id": job['id']}
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, job_queue=Depends(get_job_queue)):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, job_queue=Depends(get_job_queue)):
+    from job_queue import FINISHED_STATES
+
+    if not await job_queue.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        last_update = None
+        while True:
+            job = await job_queue.get(job_id)
+            if job['updated_at'] != last_update:
+                last_update = job['updated_at']
+                yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+            if job['status'] in FINISHED_STATES:
+                break
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+def default_workers():
+    """One worker per core this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def run_server(host=None, port=None, workers=None, reload=False):
+    """Serve create_app with uvicorn: worker processes sized to the cores, or one reloading process for development.
+
+    Worker processes share nothing in memory, so with more than one the
+    OpenAI budgets, dedupe claims, AI cache and job store default to SQLite
+    files under SHARED_STATE_DIR (cache/shared; set it empty to opt out).
+    """
+    import uvicorn
+
+    host = host or os.getenv('HOST', '0.0.0.0')
+    port = port or int(os.getenv('PORT', '5000'))
+    workers = 1 if reload else workers or int(os.getenv('WEB_CONCURRENCY') or 0) or default_workers()
+    # Lets job recovery tell jobs of a previous run from those of sibling workers
+    os.environ['SERVE_STARTED_AT'] = str(time.time())
+    if workers > 1:
+        os.environ.setdefault('SHARED_STATE_DIR', os.path.join('cache', 'shared'))
+    shared_dir = os.getenv('SHARED_STATE_DIR')
+    if shared_dir:
+        from shared_state import open_shared_state
+
+        os.environ.setdefault('AI_CACHE_BACKEND', 'sqlite')
+        os.environ.setdefault('JOB_STORE_URL', f"sqlite:///{os.path.join(shared_dir, 'jobs.db')}")
+        # Workers warm their key indexes from the database, so keys stored by a previous run can go
+        state = open_shared_state()
+        state.reset_keys()
+        state.close()
+
+    logger.info(f"Starting server on {host}:{port} with {workers} worker(s)")
+    uvicorn.run(
+        "main:create_app", factory=True, host=host, port=port, workers=workers, reload=reload,
+        reload_dirs=[APP_DIR] if reload else None, app_dir=APP_DIR
+    )
+
+# For `uvicorn main:app` and in-process use; run_server builds one app per worker instead
+app = create_app()
+
 if __name__ == "__main__":
     try:
-        logger.info("Starting server on port 5000")
-        uvicorn.run(app, host="0.0.0.0", port=5000)
+        run_server()
     except Exception as e:
         logger.error(f"Failed to start server: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
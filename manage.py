@@ -0,0 +1,134 @@
+"""Operational commands.
+
+    python manage.py serve                   # production: one worker process per core
+    python manage.py serve --reload          # development: one process, restarts on code changes
+    python manage.py migrate                 # create missing tables (DDL no longer runs on connect)
+    python manage.py startup-profile         # where cold-start time goes
+    python manage.py startup-profile --components --top 30
+"""
+import argparse
+import collections
+import re
+import subprocess
+import sys
+import time
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+# Build order follows the dependencies, so each timing is the component's own cost
+COMPONENTS = (
+    'db', 'shared_state', 'snapshots', 'uniqueness_index', 'similarity_indexes', 'writer', 'scrape_cache',
+    'web_scraper', 'ai_cache', 'ai_processor', 'validation_rules', 'data_validator', 'pipeline'
+)
+
+def migrate(args):
+    from storage import create_storage_backend
+    from logger_config import logger
+
+    db = create_storage_backend()
+    try:
+        db.migrate()
+        logger.info("Migrations applied")
+    finally:
+        db.close()
+
+def serve(args):
+    from main import run_server
+
+    run_server(host=args.host, port=args.port, workers=args.workers, reload=args.reload)
+
+def profile_imports(module):
+    """(wall seconds, [(self us, cumulative us, depth, name)]) for importing module in a fresh interpreter."""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        capture_output=True, text=True
+    )
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    entries = []
+    for line in completed.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            # Each nesting level is indented by two more spaces
+            depth = (len(match.group(3)) - 1) // 2
+            entries.append((int(match.group(1)), int(match.group(2)), depth, match.group(4)))
+    return wall, entries
+
+def profile_components():
+    from components import Components
+
+    components = Components()
+    timings = []
+    for name in COMPONENTS:
+        started = time.perf_counter()
+        try:
+            getattr(components, name)
+            error = None
+        except Exception as e:
+            error = str(e).splitlines()[0] if str(e) else type(e).__name__
+        timings.append((name, time.perf_counter() - started, error))
+    return timings
+
+def startup_profile(args):
+    wall, entries = profile_imports(args.module)
+    # -X importtime lists a module after everything it imports, so the module's
+    # tree is the run of nested entries just before its own top-level line
+    end = next(i for i, entry in enumerate(entries) if entry[3] == args.module and entry[2] == 0)
+    start = end
+    while start > 0 and entries[start - 1][2] > 0:
+        start -= 1
+    tree = entries[start:end + 1]
+    total = entries[end][1]
+
+    by_package = collections.Counter()
+    for self_us, _, _, name in tree:
+        by_package[name.split('.')[0]] += self_us
+    # Direct imports of the module, which are what a change to it can defer
+    direct = [entry for entry in tree if entry[2] == 1]
+
+    print(f"import {args.module}: {total / 1000:.1f} ms of imports, {wall * 1000:.0f} ms wall "
+          f"including interpreter start ({len(tree)} modules)")
+    print("\nBy top-level package (self time):")
+    for package, self_us in by_package.most_common(args.top):
+        print(f"  {package:<32} {self_us / 1000:9.1f} ms  {self_us / total:6.1%}")
+    print(f"\nImported directly by {args.module} (cumulative):")
+    for _, cumulative, _, name in sorted(direct, key=lambda entry: -entry[1])[:args.top]:
+        print(f"  {name:<32} {cumulative / 1000:9.1f} ms  {cumulative / total:6.1%}")
+
+    if args.components:
+        print("\nComponent construction (lazy, on first use):")
+        for name, seconds, error in profile_components():
+            status = f"failed: {error}" if error else ""
+            print(f"  {name:<32} {seconds * 1000:9.1f} ms  {status}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Supplier agent operational commands")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    server = commands.add_parser('serve', help="Run the API server")
+    server.add_argument('--host', default=None, help="Default: HOST or 0.0.0.0")
+    server.add_argument('--port', type=int, default=None, help="Default: PORT or 5000")
+    server.add_argument('--workers', type=int, default=None,
+                        help="Worker processes; default: WEB_CONCURRENCY or one per available core")
+    server.add_argument('--reload', action='store_true', help="Single process that restarts on code changes")
+
+    commands.add_parser('migrate', help="Create the tables the app needs if they do not exist")
+
+    profile = commands.add_parser('startup-profile', help="Import-time breakdown of the app's cold start")
+    profile.add_argument('--module', default='main', help="Module to profile importing")
+    profile.add_argument('--top', type=int, default=15, help="Rows per table")
+    profile.add_argument('--components', action='store_true',
+                         help="Also time building each component (uses the configured database and services)")
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args)
+    elif args.command == 'migrate':
+        migrate(args)
+    else:
+        startup_profile(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+import asyncio
+import contextvars
+import email.utils
+import os
+import random
+import time
+from collections import deque
+import openai
+from logger_config import logger
+from telemetry import OPENAI_REQUESTS, registry
+
+# Who a request is made for; the scheduler round-robins between callers so one
+# large batch cannot starve single requests. Tasks inherit it from their parent.
+current_caller = contextvars.ContextVar('openai_caller', default='default')
+
+QUEUE_WAIT = registry.histogram('openai_queue_wait_seconds', "Time OpenAI requests wait for admission")
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError,
+                    openai.InternalServerError)
+
+def retry_after_seconds(error):
+    """Delay the server asked for in Retry-After / retry-after-ms, or None."""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+class TokenBucket:
+    """Per-minute budget refilled continuously; rate 0 means unlimited.
+
+    Bursts are capped at burst_seconds worth of budget, since the API enforces
+    per-minute limits over shorter windows. Taking more than the level leaves
+    a debt that later requests wait out, so large requests still count in full.
+    """
+
+    def __init__(self, per_minute, burst_seconds=1.0):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds) if per_minute else 0.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _wait_for(self, level, amount):
+        needed = min(amount, self.capacity)
+        return 0.0 if level >= needed else (needed - level) / self.rate
+
+    def wait_time(self, amount):
+        if not self.capacity:
+            return 0.0
+        self._refill()
+        return self._wait_for(self.level, amount)
+
+    def take(self, amount):
+        if self.capacity:
+            self._refill()
+            self.level -= amount
+
+    def give(self, amount):
+        if self.capacity:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+class SharedTokenBucket(TokenBucket):
+    """TokenBucket whose level lives in SharedState, so every worker process draws on one budget.
+
+    wait_time() then take() are separate steps, so processes admitting at the
+    same moment can overdraw by a request each; OpenAIScheduler checks and
+    takes both of its budgets in one step instead.
+    """
+
+    def __init__(self, state, name, per_minute, burst_seconds=1.0):
+        super().__init__(per_minute, burst_seconds)
+        self.state = state
+        self.name = name
+
+    def wait_time(self, amount):
+        if not self.capacity:
+            return 0.0
+        return self._wait_for(self.state.budget(self.name, self.rate, self.capacity), amount)
+
+    def take(self, amount):
+        if self.capacity:
+            self.state.budget(self.name, self.rate, self.capacity, -amount)
+
+    def give(self, amount):
+        if self.capacity:
+            self.state.budget(self.name, self.rate, self.capacity, amount)
+
+class OpenAIScheduler:
+    """Admission control in front of the OpenAI client.
+
+    Requests wait in per-caller queues and are released round-robin while the
+    requests-per-minute and tokens-per-minute budgets and the concurrency
+    limit allow. Token use is reserved from the prompt estimate and settled
+    with the reported usage. 429s and transient errors are retried with
+    jittered exponential backoff, honouring Retry-After, which also pauses the
+    whole scheduler since the limits are per organisation. Identical requests
+    in flight share one call.
+
+    With a SharedState the budgets and the pause are shared by every worker
+    process, so the limits hold for the deployment rather than per process.
+    Those are SQLite transactions, so they run in a worker thread rather than
+    on the event loop. The concurrency limit stays per process.
+    """
+
+    def __init__(self, rpm=None, tpm=None, max_concurrency=None, max_retries=None,
+                 backoff_base=None, backoff_max=None, completion_tokens=None, shared=None):
+        self.rpm = rpm if rpm is not None else int(os.getenv('OPENAI_RPM', '0'))
+        self.tpm = tpm if tpm is not None else int(os.getenv('OPENAI_TPM', '0'))
+        self.max_concurrency = max_concurrency or int(os.getenv('OPENAI_MAX_CONCURRENCY', '16'))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('OPENAI_MAX_RETRIES', '5'))
+        self.backoff_base = backoff_base if backoff_base is not None else float(os.getenv('OPENAI_BACKOFF_BASE', '0.5'))
+        self.backoff_max = backoff_max if backoff_max is not None else float(os.getenv('OPENAI_BACKOFF_MAX', '30'))
+        # Reserved per request on top of the prompt until the real usage is known
+        self.completion_tokens = completion_tokens or int(os.getenv('OPENAI_COMPLETION_TOKENS_ESTIMATE', '500'))
+        burst_seconds = float(os.getenv('OPENAI_BURST_SECONDS', '1'))
+        self.shared = shared
+        if shared is not None:
+            self.requests = SharedTokenBucket(shared, 'openai_requests', self.rpm, burst_seconds)
+            self.tokens = SharedTokenBucket(shared, 'openai_tokens', self.tpm, burst_seconds)
+        else:
+            self.requests = TokenBucket(self.rpm, burst_seconds)
+            self.tokens = TokenBucket(self.tpm, burst_seconds)
+        self._loop = None
+        self.metrics = {
+            'requests': 0,
+            'admitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'retries': 0,
+            'rate_limited': 0,
+            'coalesced': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'tokens_reserved': 0,
+            'tokens_used': 0
+        }
+
+    def _bind_loop(self):
+        # Queues and events belong to one event loop; rebuilt if a new loop uses the scheduler
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queues = {}
+            self._order = deque()
+            self._in_flight = 0
+            self._paused_until = 0.0
+            self._shared_paused_until = 0.0
+            self._pending = {}
+            self._changed = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    async def submit(self, call, estimated_tokens, key=None):
+        """Run call() (a coroutine factory) under the budgets; key coalesces identical requests."""
+        self._bind_loop()
+        self.metrics['requests'] += 1
+        if key is not None:
+            pending = self._pending.get(key)
+            if pending is not None:
+                self.metrics['coalesced'] += 1
+                OPENAI_REQUESTS.inc(outcome='coalesced')
+                return await asyncio.shield(pending)
+            # A separate task, so a cancelled caller does not cancel the others' call
+            pending = self._loop.create_task(self._run(call, estimated_tokens, current_caller.get()))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+            return await asyncio.shield(pending)
+        return await self._run(call, estimated_tokens, current_caller.get())
+
+    async def _run(self, call, estimated_tokens, caller):
+        reserved = estimated_tokens + self.completion_tokens
+        for attempt in range(self.max_retries + 1):
+            await self._admit(caller, reserved)
+            try:
+                response = await call()
+            except RETRYABLE_ERRORS as e:
+                self._release(reserved)
+                if attempt == self.max_retries:
+                    self.metrics['failed'] += 1
+                    OPENAI_REQUESTS.inc(outcome='failed')
+                    raise
+                delay = self._backoff(attempt)
+                requested = retry_after_seconds(e)
+                if isinstance(e, openai.RateLimitError):
+                    self.metrics['rate_limited'] += 1
+                    OPENAI_REQUESTS.inc(outcome='rate_limited')
+                    if requested is not None:
+                        delay = max(delay, requested)
+                    # The limit is shared, so hold back every caller, not just this one
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                    if self.shared is not None:
+                        await asyncio.to_thread(self.shared.pause, 'openai', delay)
+                self.metrics['retries'] += 1
+                OPENAI_REQUESTS.inc(outcome='retried')
+                logger.warning(
+                    f"OpenAI request failed ({type(e).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+                continue
+            except BaseException as e:
+                self._release(reserved)
+                if not isinstance(e, asyncio.CancelledError):
+                    self.metrics['failed'] += 1
+                    OPENAI_REQUESTS.inc(outcome='failed')
+                raise
+
+            used = getattr(getattr(response, 'usage', None), 'total_tokens', None)
+            self._release(0 if used is None else reserved - used)
+            self.metrics['completed'] += 1
+            OPENAI_REQUESTS.inc(outcome='completed')
+            self.metrics['tokens_used'] += used or 0
+            return response
+
+    def _backoff(self, attempt):
+        # Full jitter: spread retries of callers that failed together
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _admit(self, caller, tokens):
+        waiter = self._loop.create_future()
+        queue = self._queues.get(caller)
+        if queue is None:
+            queue = self._queues[caller] = deque()
+            self._order.append(caller)
+        queue.append((waiter, tokens, time.monotonic()))
+        self._changed.set()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Admitted just before the caller went away: hand back the request, its tokens and the slot
+            if waiter.done() and not waiter.cancelled():
+                if self.shared is not None:
+                    self._loop.run_in_executor(None, self._give_back, tokens)
+                else:
+                    self._give_back(tokens)
+                self._in_flight -= 1
+                self._changed.set()
+            raise
+
+    def _release(self, unused_tokens):
+        self._in_flight -= 1
+        if unused_tokens:
+            if self.shared is not None:
+                # Settled in the background; the dispatcher reads the budget off the loop too
+                self._loop.run_in_executor(None, self._settle, unused_tokens)
+            else:
+                self._settle(unused_tokens)
+        self._changed.set()
+
+    def _settle(self, unused_tokens):
+        try:
+            if unused_tokens > 0:
+                self.tokens.give(unused_tokens)
+            else:
+                self.tokens.take(-unused_tokens)
+        except Exception as e:
+            logger.error(f"Error settling {unused_tokens} OpenAI tokens: {str(e)}")
+            raise
+
+    def _next_waiter(self):
+        # Round-robin over callers with queued requests, skipping cancelled waiters
+        while self._order:
+            caller = self._order[0]
+            queue = self._queues[caller]
+            while queue and queue[0][0].done():
+                queue.popleft()
+            if queue:
+                return caller, queue
+            self._order.popleft()
+            del self._queues[caller]
+        return None, None
+
+    async def _dispatch(self):
+        while True:
+            # Cleared before looking, so changes while the shared budget is read still wake the wait below
+            self._changed.clear()
+            caller, queue = self._next_waiter()
+            delay = None
+            if caller is not None and self._in_flight < self.max_concurrency:
+                waiter, tokens, queued_at = queue[0]
+                if self.shared is not None:
+                    delay = await asyncio.to_thread(self._try_take, tokens)
+                    if delay <= 0 and waiter.done():
+                        # Cancelled while the budget was being taken
+                        await asyncio.to_thread(self._give_back, tokens)
+                        continue
+                else:
+                    delay = self._try_take(tokens)
+                if delay <= 0:
+                    queue.popleft()
+                    self._order.rotate(-1)
+                    self._in_flight += 1
+                    self.metrics['admitted'] += 1
+                    waited = time.monotonic() - queued_at
+                    self.metrics['wait_seconds_total'] += waited
+                    self.metrics['wait_seconds_max'] = max(self.metrics['wait_seconds_max'], waited)
+                    QUEUE_WAIT.observe(waited)
+                    self.metrics['tokens_reserved'] += tokens
+                    waiter.set_result(None)
+                    continue
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _try_take(self, tokens):
+        """Take a request and tokens from the budgets, or return how long until they allow it."""
+        if self.shared is not None:
+            # Picks up pauses other workers set after a 429
+            self._shared_paused_until = time.monotonic() + self.shared.paused_for('openai')
+            delay = self._pause_remaining()
+            if delay > 0:
+                return delay
+            return self.shared.take_budgets([
+                (bucket.name, bucket.rate, bucket.capacity, amount)
+                for bucket, amount in ((self.requests, 1), (self.tokens, tokens)) if bucket.capacity
+            ])
+        delay = max(self._pause_remaining(), self.requests.wait_time(1), self.tokens.wait_time(tokens))
+        if delay <= 0:
+            self.requests.take(1)
+            self.tokens.take(tokens)
+        return delay
+
+    def _give_back(self, tokens):
+        self.requests.give(1)
+        self.tokens.give(tokens)
+
+    def _pause_remaining(self):
+        # The shared pause as of the dispatcher's last look, so this never touches SQLite
+        paused_until = max(getattr(self, '_paused_until', 0.0), getattr(self, '_shared_paused_until', 0.0))
+        return max(0.0, paused_until - time.monotonic())
+
+    def stats(self):
+        queued = sum(len(queue) for queue in getattr(self, '_queues', {}).values())
+        admitted = self.metrics['admitted']
+        return {
+            **self.metrics,
+            'wait_seconds_total': round(self.metrics['wait_seconds_total'], 3),
+            'wait_seconds_max': round(self.metrics['wait_seconds_max'], 3),
+            'wait_ms_avg': round(self.metrics['wait_seconds_total'] / admitted * 1000, 3) if admitted else 0.0,
+            'queue_depth': queued,
+            'callers_waiting': len(getattr(self, '_order', ())),
+            'in_flight': getattr(self, '_in_flight', 0),
+            'paused_seconds': round(self._pause_remaining(), 3),
+            'rpm': self.rpm,
+            'tpm': self.tpm,
+            'max_concurrency': self.max_concurrency,
+            'shared_budgets': self.shared is not None
+        }
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+from logger_config import logger
+
+def _is_surrogate_key(column):
+    # Integer primary keys are assigned by the database, even when reflection
+    # reports no default (e.g. SQLite's rowid alias)
+    if not column.get('primary_key'):
+        return False
+    try:
+        return column['type'].python_type is int
+    except NotImplementedError:
+        return False
+
+class TableSchema:
+    """Column definitions and unique keys of one table, as loaded by a connector."""
+
+    def __init__(self, table_name, columns, unique_keys=()):
+        self.table_name = table_name
+        # Dicts with name, type (SQLAlchemy), nullable and, where known, default / autoincrement
+        self.columns = list(columns)
+        self.unique_keys = [tuple(key) for key in unique_keys]
+        self.by_name = {column['name']: column for column in self.columns}
+
+    @property
+    def column_names(self):
+        return [column['name'] for column in self.columns]
+
+    def column(self, name):
+        return self.by_name.get(name)
+
+    def question_columns(self):
+        """Columns the model answers: all but the integer surrogate keys the database assigns."""
+        return [column['name'] for column in self.columns if not _is_surrogate_key(column)]
+
+    def required_columns(self):
+        """Columns an insert must provide: NOT NULL without a default or generated value."""
+        return [
+            column['name'] for column in self.columns
+            if not column.get('nullable', True)
+            and column.get('default') is None
+            and column.get('autoincrement') is not True
+            and not _is_surrogate_key(column)
+        ]
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+class SchemaCache:
+    """Table schemas loaded once per table and reused until ttl expires or DDL invalidates them."""
+
+    def __init__(self, loader, ttl=None):
+        self.loader = loader
+        self.ttl = ttl if ttl is not None else float(os.getenv('SCHEMA_CACHE_TTL', '300'))
+        self._schemas = {}
+        self._lock = threading.Lock()
+        self.metrics = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, table_name):
+        with self._lock:
+            entry = self._schemas.get(table_name)
+            # ttl 0 keeps schemas until DDL invalidates them
+            if entry is not None and (self.ttl <= 0 or time.monotonic() - entry[1] < self.ttl):
+                self.metrics['hits'] += 1
+                return entry[0]
+            self.metrics['misses'] += 1
+
+        # Loaded outside the lock so one slow table does not block the others
+        schema = self.loader(table_name)
+        with self._lock:
+            self._schemas[table_name] = (schema, time.monotonic())
+        logger.info(f"Loaded schema for {table_name}: {len(schema)} columns")
+        return schema
+
+    def invalidate(self, table_name=None):
+        """Drop one table's schema, or all of them when table_name is None."""
+        with self._lock:
+            if table_name is None:
+                self._schemas.clear()
+            else:
+                self._schemas.pop(table_name.lower(), None)
+                self._schemas.pop(table_name, None)
+            self.metrics['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            return {**self.metrics, 'tables': len(self._schemas), 'ttl': self.ttl}
@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from logger_config import logger
+
+SEARCH = 'search'
+PAGE = 'page'
+
+class ScrapeCache:
+    """Two-tier cache for scraped data: an in-memory LRU in front of a SQLite file.
+
+    Search results are keyed on the query, page text on the resolved URL. Entries
+    past the TTL are returned as stale together with their ETag/Last-Modified so
+    the caller can revalidate them instead of downloading again.
+    """
+
+    def __init__(self, path=None, ttl=None, memory_entries=None):
+        self.path = path if path is not None else os.getenv('SCRAPE_CACHE_PATH', 'cache/scrape_cache.db')
+        self.ttl = ttl if ttl is not None else float(os.getenv('SCRAPE_CACHE_TTL', '86400'))
+        self.memory_entries = memory_entries or int(os.getenv('SCRAPE_CACHE_MEMORY_ENTRIES', '1024'))
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stale': 0,
+            'revalidated': 0,
+            'stores': 0
+        }
+        self._conn = None
+        if self.path:
+            self._connect()
+
+    def _connect(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS scrape_cache (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (kind, key)
+                )
+            """)
+            self._conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to open scrape cache at {self.path}: {str(e)}")
+            raise
+
+    def get(self, kind, key):
+        """Cached entry dict with a 'fresh' flag, or None on a miss."""
+        with self._lock:
+            entry = self._memory.get((kind, key))
+            if entry is not None:
+                self._memory.move_to_end((kind, key))
+                self.metrics['memory_hits'] += 1
+            elif self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, etag, last_modified, fetched_at FROM scrape_cache WHERE kind = ? AND key = ?",
+                    (kind, key)
+                ).fetchone()
+                if row is not None:
+                    entry = {
+                        'value': json.loads(zlib.decompress(row[0])),
+                        'etag': row[1],
+                        'last_modified': row[2],
+                        'fetched_at': row[3]
+                    }
+                    self._remember(kind, key, entry)
+                    self.metrics['disk_hits'] += 1
+            if entry is None:
+                self.metrics['misses'] += 1
+                return None
+
+            fresh = time.time() - entry['fetched_at'] < self.ttl
+            if not fresh:
+                self.metrics['stale'] += 1
+            return {**entry, 'fresh': fresh}
+
+    def set(self, kind, key, value, etag=None, last_modified=None):
+        entry = {'value': value, 'etag': etag, 'last_modified': last_modified, 'fetched_at': time.time()}
+        with self._lock:
+            self._remember(kind, key, entry)
+            self.metrics['stores'] += 1
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO scrape_cache (kind, key, value, etag, last_modified, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (kind, key, zlib.compress(json.dumps(value).encode('utf-8')), etag, last_modified, entry['fetched_at'])
+                )
+                self._conn.commit()
+
+    def touch(self, kind, key):
+        """Mark an entry fresh again after a 304 Not Modified."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get((kind, key))
+            if entry is not None:
+                entry['fetched_at'] = now
+            if self._conn is not None:
+                self._conn.execute(
+                    "UPDATE scrape_cache SET fetched_at = ? WHERE kind = ? AND key = ?", (now, kind, key)
+                )
+                self._conn.commit()
+            self.metrics['revalidated'] += 1
+
+    def _remember(self, kind, key, entry):
+        self._memory[(kind, key)] = entry
+        self._memory.move_to_end((kind, key))
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.metrics['memory_hits'] + self.metrics['disk_hits'] + self.metrics['misses']
+            hits = self.metrics['memory_hits'] + self.metrics['disk_hits']
+            return {
+                **self.metrics,
+                'memory_entries': len(self._memory),
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,184 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from logger_config import logger
+
+class SharedState:
+    """State the worker processes of one deployment must agree on, in a local SQLite file.
+
+    Caches, snapshots and indexes stay per process; what has to hold across
+    processes lives here: the OpenAI request and token budgets, the pause
+    after a 429, and which (supplier, product) keys are being generated or
+    were stored since the workers started. WAL lets readers run alongside the
+    writer, and BEGIN IMMEDIATE serialises the read-modify-write updates.
+    Times are wall clock, since monotonic clocks are not comparable between
+    processes.
+    """
+
+    def __init__(self, path, key_ttl=None):
+        self.path = path
+        # A claim outlives a crashed worker by at most this long
+        self.key_ttl = key_ttl if key_ttl is not None else float(os.getenv('SHARED_KEY_TTL', '900'))
+        self._lock = threading.Lock()
+        self._conn = None
+        self._connect()
+
+    def _connect(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            # Autocommit, so transactions are only the explicit BEGIN IMMEDIATE ones
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS budgets (
+                    name TEXT PRIMARY KEY,
+                    level REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS pauses (
+                    name TEXT PRIMARY KEY,
+                    until REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS unique_keys (
+                    table_name TEXT NOT NULL,
+                    key BLOB NOT NULL,
+                    stored INTEGER NOT NULL,
+                    expires REAL,
+                    PRIMARY KEY (table_name, key)
+                ) WITHOUT ROWID
+            """)
+        except Exception as e:
+            logger.error(f"Failed to open shared state at {self.path}: {str(e)}")
+            raise
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def reset_keys(self):
+        """Forget claims and stored keys; workers started after this warm their indexes from the database."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM unique_keys")
+
+    def budget(self, name, rate, capacity, change=0.0):
+        """Level of a token bucket refilled at rate per second up to capacity, after adding change.
+
+        A bucket that has never been used is full. The level may go negative:
+        that debt is what later takers wait out.
+        """
+        if not change:
+            with self._lock:
+                return self._level(self._conn, name, rate, capacity, time.time())
+        with self._transaction() as conn:
+            now = time.time()
+            updated = min(capacity, self._level(conn, name, rate, capacity, now) + change)
+            conn.execute(
+                "INSERT OR REPLACE INTO budgets (name, level, updated) VALUES (?, ?, ?)", (name, updated, now)
+            )
+            return updated
+
+    def take_budgets(self, takes):
+        """Take amount from every (name, rate, capacity, amount) budget, if they all allow it.
+
+        Checked and taken in one transaction, so processes admitting at the same
+        moment cannot overdraw. Returns 0 once taken, else the seconds until the
+        budgets would allow it. Like TokenBucket, an amount above capacity only
+        has to wait for a full bucket.
+        """
+        with self._transaction() as conn:
+            now = time.time()
+            levels = [self._level(conn, name, rate, capacity, now) for name, rate, capacity, _ in takes]
+            wait = max(
+                [(min(amount, capacity) - level) / rate for (_, rate, capacity, amount), level in zip(takes, levels)],
+                default=0.0
+            )
+            if wait > 0:
+                return wait
+            conn.executemany(
+                "INSERT OR REPLACE INTO budgets (name, level, updated) VALUES (?, ?, ?)",
+                [(name, level - amount, now) for (name, _, _, amount), level in zip(takes, levels)]
+            )
+            return 0.0
+
+    @staticmethod
+    def _level(conn, name, rate, capacity, now):
+        row = conn.execute("SELECT level, updated FROM budgets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return capacity
+        return min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+
+    def pause(self, name, seconds):
+        """Hold back every process using name for at least seconds from now."""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO pauses (name, until) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET until = MAX(until, excluded.until)",
+                (name, time.time() + seconds)
+            )
+
+    def paused_for(self, name):
+        """Seconds left on the pause for name, 0 if there is none."""
+        with self._lock:
+            row = self._conn.execute("SELECT until FROM pauses WHERE name = ?", (name,)).fetchone()
+        return max(0.0, row[0] - time.time()) if row else 0.0
+
+    def claim_key(self, table_name, key):
+        """Claim key for generation; False if it was stored or another process holds it."""
+        with self._transaction() as conn:
+            now = time.time()
+            conn.execute(
+                "DELETE FROM unique_keys WHERE table_name = ? AND key = ? AND stored = 0 AND expires < ?",
+                (table_name, key, now)
+            )
+            return conn.execute(
+                "INSERT OR IGNORE INTO unique_keys (table_name, key, stored, expires) VALUES (?, ?, 0, ?)",
+                (table_name, key, now + self.key_ttl)
+            ).rowcount == 1
+
+    def release_key(self, table_name, key):
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM unique_keys WHERE table_name = ? AND key = ? AND stored = 0", (table_name, key)
+            )
+
+    def store_keys(self, table_name, keys):
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO unique_keys (table_name, key, stored, expires) VALUES (?, ?, 1, NULL)",
+                [(table_name, key) for key in keys]
+            )
+
+    def is_stored(self, table_name, key):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM unique_keys WHERE table_name = ? AND key = ? AND stored = 1", (table_name, key)
+            ).fetchone() is not None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+def shared_state_path():
+    """SQLite file for SharedState, or None when SHARED_STATE_DIR is not set (single process)."""
+    directory = os.getenv('SHARED_STATE_DIR', '')
+    return os.path.join(directory, 'state.db') if directory else None
+
+def open_shared_state():
+    path = shared_state_path()
+    return SharedState(path) if path else None
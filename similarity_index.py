@@ -0,0 +1,365 @@
+import json
+import os
+import threading
+import zlib
+import numpy as np
+from logger_config import logger
+from storage import KEYSET_COLUMN
+
+try:
+    import fcntl
+except ImportError:
+    # No file locks here: give each process its own SIMILARITY_INDEX_DIR
+    fcntl = None
+
+class SimilarityIndex:
+    """Hashed character n-gram vectors with random-hyperplane LSH buckets.
+
+    Vectors live in a memory-mapped .npy file next to a JSONL file of row keys,
+    so the index survives restarts and grows as rows are added. Only one index
+    at a time owns a path, through a lock file; another one opened on it, say
+    by a second worker process, keeps its rows in memory. Queries probe the
+    LSH buckets and rescore the candidates exactly; indexes below
+    exact_scan_rows are scanned in full instead.
+    """
+
+    def __init__(self, path=None, dims=128, ngram=3, num_tables=8, bits=20, seed=7, exact_scan_rows=50000):
+        self.path = path
+        self.dims = dims
+        self.ngram = ngram
+        self.num_tables = num_tables
+        self.bits = bits
+        self.exact_scan_rows = exact_scan_rows
+        self.planes = None
+        self.bit_weights = (1 << np.arange(bits)).astype(np.int64)
+        self.keys = []
+        self.count = 0
+        self.vectors = None
+        self.codes = np.empty((0, num_tables), dtype=np.int32)
+        self._seed = seed
+        # What the index was last synced to, see SimilarityIndexStore; persisted next to it
+        self.source = {}
+        self._reset_buckets()
+        self._lock = threading.Lock()
+        self._lock_file = None
+        if path and not self._claim(path):
+            logger.info(f"Similarity index {path} is in use by another index, keeping this one in memory")
+            self.path = None
+        if self.path and os.path.exists(self._vectors_path):
+            self._load()
+        else:
+            self._init_planes()
+            self._allocate(1024)
+
+    def _claim(self, path):
+        """Lock path's files for this index; False if another index holds them."""
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # flock is per open file, so this also keeps out a second index in the same process
+        self._lock_file = open(f"{path}.lock", 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+    def _init_planes(self):
+        rng = np.random.default_rng(self._seed)
+        self.planes = rng.standard_normal((self.dims, self.num_tables * self.bits)).astype(np.float32)
+
+    def _reset_buckets(self):
+        # Rows up to self._merged are looked up in per-table arrays sorted by LSH code,
+        # newer rows in small dict buckets until the next merge
+        self._merged = 0
+        self._sorted_codes = [np.empty(0, dtype=np.int32) for _ in range(self.num_tables)]
+        self._sorted_rows = [np.empty(0, dtype=np.int64) for _ in range(self.num_tables)]
+        self._tail = [dict() for _ in range(self.num_tables)]
+
+    @property
+    def _vectors_path(self):
+        return f"{self.path}.vectors.npy"
+
+    @property
+    def _keys_path(self):
+        return f"{self.path}.keys.jsonl"
+
+    @property
+    def _source_path(self):
+        return f"{self.path}.source.json"
+
+    def __len__(self):
+        return self.count
+
+    def vectorize(self, texts):
+        matrix = np.zeros((len(texts), self.dims), dtype=np.float32)
+        for row, text in enumerate(texts):
+            padded = f" {str(text).casefold()} "
+            for i in range(len(padded) - self.ngram + 1):
+                h = zlib.crc32(padded[i:i + self.ngram].encode('utf-8'))
+                # The high bit picks the sign so hash collisions tend to cancel out
+                matrix[row, h % self.dims] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _codes(self, vectors):
+        signs = (vectors @ self.planes > 0).reshape(len(vectors), self.num_tables, self.bits)
+        return (signs.astype(np.int64) @ self.bit_weights).astype(np.int32)
+
+    def _allocate(self, capacity):
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            vectors = np.lib.format.open_memmap(
+                self._vectors_path + '.tmp', mode='w+', dtype=np.float32, shape=(capacity, self.dims)
+            )
+        else:
+            vectors = np.zeros((capacity, self.dims), dtype=np.float32)
+        if self.vectors is not None and self.count:
+            vectors[:self.count] = self.vectors[:self.count]
+        codes = np.zeros((capacity, self.num_tables), dtype=np.int32)
+        codes[:self.count] = self.codes[:self.count]
+        self.codes = codes
+        if self.path:
+            vectors.flush()
+            del vectors
+            os.replace(self._vectors_path + '.tmp', self._vectors_path)
+            vectors = np.lib.format.open_memmap(self._vectors_path, mode='r+')
+        self.vectors = vectors
+
+    def _load(self):
+        self.keys = []
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, encoding='utf-8') as f:
+                self.keys = [tuple(json.loads(line)) for line in f]
+        self.vectors = np.lib.format.open_memmap(self._vectors_path, mode='r+')
+        self.dims = self.vectors.shape[1]
+        self._init_planes()
+        self.count = min(len(self.keys), len(self.vectors))
+        self.keys = self.keys[:self.count]
+        self.codes = np.zeros((len(self.vectors), self.num_tables), dtype=np.int32)
+        for start in range(0, self.count, 65536):
+            end = min(start + 65536, self.count)
+            self.codes[start:end] = self._codes(self.vectors[start:end])
+        self._merge()
+        if os.path.exists(self._source_path):
+            with open(self._source_path, encoding='utf-8') as f:
+                source = json.load(f)
+            # Written after the rows; a crash in between leaves a source that no longer matches
+            if source.get('count') == self.count:
+                self.source = source
+        logger.info(f"Loaded similarity index with {self.count} rows from {self.path}")
+
+    def set_source(self, source):
+        with self._lock:
+            self.source = {**source, 'count': self.count}
+            if self.path:
+                with open(self._source_path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(self.source, f, default=str)
+                os.replace(self._source_path + '.tmp', self._source_path)
+
+    def _merge(self):
+        for table in range(self.num_tables):
+            column = self.codes[:self.count, table]
+            order = np.argsort(column, kind='stable')
+            self._sorted_codes[table] = column[order]
+            self._sorted_rows[table] = order
+            self._tail[table] = {}
+        self._merged = self.count
+
+    def add(self, keys, texts):
+        """Append rows; keys are tuples of JSON-serializable values returned by search."""
+        if not keys:
+            return
+        vectors = self.vectorize(texts)
+        codes = self._codes(vectors)
+        with self._lock:
+            needed = self.count + len(keys)
+            if needed > len(self.vectors):
+                self._allocate(max(needed, len(self.vectors) * 2))
+            start = self.count
+            self.vectors[start:needed] = vectors
+            self.codes[start:needed] = codes
+            self.keys.extend(keys)
+            self.count = needed
+            # Re-sort once the unsorted tail grows past an eighth of the index
+            if needed - self._merged > max(4096, self._merged // 8):
+                self._merge()
+            else:
+                for table, buckets in enumerate(self._tail):
+                    for offset, code in enumerate(codes[:, table].tolist()):
+                        buckets.setdefault(code, []).append(start + offset)
+            if self.path:
+                self.vectors.flush()
+                with open(self._keys_path, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(list(key), default=str) + '\n' for key in keys)
+
+    def reset(self):
+        with self._lock:
+            self.keys = []
+            self.count = 0
+            self.source = {}
+            self._reset_buckets()
+            for path in (self._keys_path, self._source_path) if self.path else ():
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def close(self):
+        """Release the index's files so another index can open them."""
+        with self._lock:
+            if self.path and self.vectors is not None:
+                self.vectors.flush()
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def search(self, text, k=10, exact=False):
+        """Return up to k (key, cosine similarity) pairs, most similar first."""
+        query = self.vectorize([text])[0]
+        with self._lock:
+            count = self.count
+            # Small indexes are cheaper to scan than to probe
+            exact = exact or count <= self.exact_scan_rows
+            candidates = np.arange(count) if exact else self._candidates(query)
+            if not len(candidates):
+                return []
+            scores = self.vectors[candidates] @ query
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.keys[candidates[i]], float(scores[i])) for i in top]
+
+    def _candidates(self, query):
+        codes = self._codes(query[None, :])[0]
+        found = []
+        for table in range(self.num_tables):
+            code = int(codes[table])
+            sorted_codes = self._sorted_codes[table]
+            # Multi-probe: the query bucket plus every bucket one bit flip away
+            probes = np.array([code] + [code ^ (1 << bit) for bit in range(self.bits)], dtype=np.int32)
+            lows = np.searchsorted(sorted_codes, probes, side='left')
+            highs = np.searchsorted(sorted_codes, probes, side='right')
+            for low, high in zip(lows.tolist(), highs.tolist()):
+                if high > low:
+                    found.append(self._sorted_rows[table][low:high])
+            tail = self._tail[table]
+            if tail:
+                for probe in probes.tolist():
+                    rows = tail.get(probe)
+                    if rows:
+                        found.append(np.array(rows, dtype=np.int64))
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+class SimilarityIndexStore:
+    """One SimilarityIndex per table, kept current from insert events.
+
+    The first process to open a table's index persists it; other workers
+    keep theirs in memory and build it from the table data.
+
+    Each index records the table rows it holds by id: the highest id, how many
+    rows up to it, the ids in the last trailing_ids (where rows committed out of
+    order land) and the keys inserted through this process that the table data
+    has not returned with an id yet. get() adds rows it has not seen and
+    rebuilds only when that account does not add up, e.g. after deletes.
+    Rows changed in place keep their old text until a rebuild.
+    """
+
+    def __init__(self, directory=None, text_columns=('supplier_name', 'product_name'), trailing_ids=None):
+        self.directory = directory or os.getenv('SIMILARITY_INDEX_DIR', 'indexes')
+        self.text_columns = list(text_columns)
+        self.trailing_ids = (
+            trailing_ids if trailing_ids is not None else int(os.getenv('SNAPSHOT_TRAILING_IDS', '1000'))
+        )
+        self._indexes = {}
+        self._synced = {}
+        self._lock = threading.Lock()
+
+    def row_key(self, row):
+        return tuple(row.get(column) for column in self.text_columns)
+
+    def row_text(self, row):
+        return ' '.join(str(row.get(column) or '') for column in self.text_columns)
+
+    def get(self, table_name, existing_data=None):
+        """Index for a table, brought up to date with existing_data."""
+        with self._lock:
+            index = self._indexes.get(table_name)
+            if index is None:
+                index = SimilarityIndex(os.path.join(self.directory, table_name))
+                self._indexes[table_name] = index
+            # Snapshot frames are replaced, never modified, so the same frame needs no second look
+            if existing_data is not None and self._synced.get(table_name) is not existing_data:
+                self._sync(table_name, index, existing_data)
+                self._synced[table_name] = existing_data
+            return index
+
+    def _sync(self, table_name, index, data):
+        if KEYSET_COLUMN not in data.columns:
+            # No ids to account by; rows inserted since data was read are already in the index
+            if len(index) < len(data):
+                self._rebuild(table_name, index, data, None)
+            return
+        # Rows this process inserted are in the data without an id until the next refresh
+        ids = data[KEYSET_COLUMN].to_numpy(dtype=np.float64, na_value=np.nan)
+        stored = ~np.isnan(ids)
+        source = index.source
+        max_id = source.get('max_id')
+        if max_id is None or source.get('count') != len(index):
+            return self._rebuild(table_name, index, data, ids)
+
+        late = np.zeros(len(ids), dtype=bool)
+        missing = int((ids[stored] <= max_id).sum()) - source['rows']
+        if missing:
+            late = (ids > max_id - self.trailing_ids) & (ids <= max_id) & ~np.isin(ids, source['recent'])
+            if missing < 0 or int(late.sum()) != missing:
+                return self._rebuild(table_name, index, data, ids)
+        new = late | (ids > max_id)
+        if not new.any():
+            return
+
+        pending = {tuple(key) for key in source['pending']}
+        keys, texts = [], []
+        for row in data.loc[new, self.text_columns].to_dict('records'):
+            key = self.row_key(row)
+            # Already added by on_insert, now back from the database with its id
+            if key in pending:
+                pending.discard(key)
+                continue
+            keys.append(key)
+            texts.append(self.row_text(row))
+        index.add(keys, texts)
+        index.set_source(self._source(ids, stored, pending))
+
+    def _rebuild(self, table_name, index, data, ids):
+        logger.info(f"Rebuilding similarity index for {table_name} from {len(data)} rows")
+        rows = data[self.text_columns].to_dict('records')
+        index.reset()
+        index.add([self.row_key(row) for row in rows], [self.row_text(row) for row in rows])
+        if ids is not None:
+            stored = ~np.isnan(ids)
+            pending = {self.row_key(row) for row, has_id in zip(rows, stored) if not has_id}
+            index.set_source(self._source(ids, stored, pending))
+
+    def _source(self, ids, stored, pending):
+        known = ids[stored]
+        max_id = float(known.max()) if len(known) else float('-inf')
+        return {
+            'max_id': max_id,
+            'rows': int(len(known)),
+            'recent': known[known > max_id - self.trailing_ids].tolist(),
+            'pending': [list(key) for key in pending],
+        }
+
+    def on_insert(self, table_name, rows):
+        with self._lock:
+            index = self._indexes.get(table_name)
+            if index is None:
+                return
+            keys = [self.row_key(row) for row in rows]
+            index.add(keys, [self.row_text(row) for row in rows])
+            if index.source:
+                pending = index.source['pending'] + [list(key) for key in keys]
+                index.set_source({**index.source, 'pending': pending})
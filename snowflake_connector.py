@@ -1,11 +1,38 @@
 import snowflake.connector
+from snowflake.connector.constants import FIELD_ID_TO_NAME
+from snowflake.connector.errors import ProgrammingError
 import pandas as pd
+import pyarrow as pa
+import uuid
+from sqlalchemy import types
 from logger_config import logger
+from uniqueness_index import DuplicateEntryError
+from connection_pool import SnowflakePool
+from bulk_writer import INSERTED, UPDATED, UNIQUE_KEY_COLUMNS
+from storage import StorageBackend
+from schema_cache import TableSchema
+from telemetry import traced
 import os
 
-class SnowflakeConnector:
+# Snowflake result type names mapped onto the SQLAlchemy types the other backends report
+SNOWFLAKE_TYPES = {
+    'BOOLEAN': types.Boolean,
+    'REAL': types.Float,
+    'TEXT': types.String,
+    'DATE': types.Date,
+    'TIMESTAMP_NTZ': types.DateTime,
+    'TIMESTAMP_LTZ': types.DateTime,
+    'TIMESTAMP_TZ': types.DateTime,
+}
+
+class SnowflakeConnector(StorageBackend):
+    """Snowflake backend; column names are reported lowercase like the SQL backends."""
+
+    param_style = '%({})s'
+
     def __init__(self):
-        self.conn = None
+        super().__init__()
+        self.pool = None
         self.connect()
 
     def connect(self):
@@ -23,58 +50,260 @@ class SnowflakeConnector:
 
             logger.info("All required Snowflake credentials are present")
 
-            self.conn = snowflake.connector.connect(
-                user=os.getenv('SNOWFLAKE_USER'),
-                password=os.getenv('SNOWFLAKE_PASSWORD'),
-                account=os.getenv('SNOWFLAKE_ACCOUNT'),
-                warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
-                database=os.getenv('SNOWFLAKE_DATABASE'),
-                schema=os.getenv('SNOWFLAKE_SCHEMA')
-            )
+            # Each call checks out its own session instead of sharing one connection
+            self.pool = SnowflakePool(self._open_connection)
+            with self.pool.connection():
+                pass
             logger.info("Successfully connected to Snowflake")
         except Exception as e:
             logger.error(f"Failed to connect to Snowflake: {str(e)}")
             raise
 
-    def get_table_data(self, table_name):
+    def _open_connection(self):
+        return snowflake.connector.connect(
+            user=os.getenv('SNOWFLAKE_USER'),
+            password=os.getenv('SNOWFLAKE_PASSWORD'),
+            account=os.getenv('SNOWFLAKE_ACCOUNT'),
+            warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
+            database=os.getenv('SNOWFLAKE_DATABASE'),
+            schema=os.getenv('SNOWFLAKE_SCHEMA')
+        )
+
+    def pool_stats(self):
+        return self.pool.stats() if self.pool else None
+
+    def migrate(self):
+        # Snowflake tables are provisioned outside the app
+        logger.info("No migrations for the Snowflake backend")
+
+    def _require_pool(self):
+        if not self.pool:
+            logger.error("No Snowflake connection available")
+            raise Exception("Snowflake connection not established")
+
+    def _read_frame(self, query, params):
+        self._require_pool()
+        # Columnar fetch straight into pandas instead of row tuples
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                df = cursor.fetch_pandas_all()
+            finally:
+                cursor.close()
+        df.columns = [column.lower() for column in df.columns]
+        return df
+
+    def _inspect_table(self, table_name):
+        """Columns from an empty result set, keys from SHOW PRIMARY / UNIQUE KEYS."""
+        self._require_pool()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(snowflake.connector.DictCursor)
+            try:
+                cursor.execute(f"SELECT * FROM {table_name} LIMIT 0")
+                description = cursor.description
+                # Snowflake records but does not enforce these constraints
+                constraints = {}
+                for kind in ('PRIMARY', 'UNIQUE'):
+                    cursor.execute(f"SHOW {kind} KEYS IN TABLE {table_name}")
+                    for row in sorted(cursor.fetchall(), key=lambda row: row['key_sequence']):
+                        constraints.setdefault((kind, row['constraint_name']), []).append(row['column_name'].lower())
+            except ProgrammingError:
+                raise ValueError(f"Unknown table: {table_name}")
+            finally:
+                cursor.close()
+        primary_key = next((key for (kind, _), key in constraints.items() if kind == 'PRIMARY'), [])
+
+        columns = []
+        for column in description:
+            type_name = FIELD_ID_TO_NAME.get(column.type_code, 'TEXT')
+            if type_name == 'FIXED':
+                column_type = types.Numeric(column.precision, column.scale) if column.scale else types.BigInteger()
+            else:
+                column_type = SNOWFLAKE_TYPES.get(type_name, types.String)()
+            columns.append({
+                'name': column.name.lower(),
+                'type': column_type,
+                'nullable': column.is_nullable,
+                'primary_key': column.name.lower() in primary_key
+            })
+        return TableSchema(table_name, columns, constraints.values())
+
+    def iter_table_chunks(self, table_name, columns=None, filters=None, cursor=None, chunksize=10000):
+        """DataFrames in the batch sizes Snowflake returns its result chunks in."""
+        self._require_pool()
+        query, params, key_column, key_added = self._build_select(table_name, columns, filters, cursor)
+
+        def chunks():
+            try:
+                with self.pool.connection() as conn:
+                    result = conn.cursor()
+                    try:
+                        result.execute(query, params)
+                        for df in result.fetch_pandas_batches():
+                            df.columns = [column.lower() for column in df.columns]
+                            yield df.drop(columns=[key_column]) if key_added else df
+                    finally:
+                        result.close()
+            except Exception as e:
+                logger.error(f"Error streaming table {table_name}: {str(e)}")
+                raise
+
+        return chunks()
+
+    def iter_key_rows(self, table_name, columns, chunksize=50000):
+        """Yield lists of tuples for the given columns without loading whole rows."""
+        self._require_pool()
         try:
-            if not self.conn:
-                logger.error("No Snowflake connection available")
-                raise Exception("Snowflake connection not established")
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(f"SELECT {', '.join(columns)} FROM {table_name}")
+                    while True:
+                        rows = cursor.fetchmany(chunksize)
+                        if not rows:
+                            break
+                        yield [tuple(row) for row in rows]
+                finally:
+                    cursor.close()
+        except Exception as e:
+            logger.error(f"Error reading keys from table {table_name}: {str(e)}")
+            raise
+
+    def iter_arrow_batches(self, table_name, columns=None, filters=None, chunksize=None):
+        """Arrow schema and a generator of record batches, fetched with fetch_arrow_batches.
 
-            query = f"SELECT * FROM {table_name}"
-            df = pd.read_sql(query, self.conn)
-            return df
+        Batch sizes follow Snowflake's result chunks, chunksize is not used.
+        """
+        self._require_pool()
+
+        filters = filters or {}
+        for name in [*(columns or []), *filters]:
+            if not name.isidentifier():
+                raise ValueError(f"Invalid column name: {name}")
+        query = f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name}"
+        if filters:
+            query += " WHERE " + " AND ".join(f"{column} = %s" for column in filters)
+
+        # The session stays checked out until the stream is exhausted or closed
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, tuple(filters.values()))
+            tables = cursor.fetch_arrow_batches()
+            first = next(tables, None)
         except Exception as e:
-            logger.error(f"Error fetching data from table {table_name}: {str(e)}")
+            cursor.close()
+            self.pool.release(conn, discard=conn.is_closed())
+            logger.error(f"Error exporting table {table_name}: {str(e)}")
             raise
+        if first is None:
+            schema = pa.schema([pa.field(column[0], pa.string()) for column in cursor.description])
+        else:
+            schema = first.schema
+
+        def batches():
+            try:
+                if first is not None:
+                    yield from first.to_batches()
+                for table in tables:
+                    yield from table.cast(schema).to_batches()
+            finally:
+                cursor.close()
+                self.pool.release(conn)
 
+        return schema, batches()
+
+    @traced('db.insert')
     def insert_ai_generated_row(self, table_name, data_dict):
         try:
-            if not self.conn:
-                logger.error("No Snowflake connection available")
-                raise Exception("Snowflake connection not established")
+            self._require_pool()
 
             columns = ', '.join(data_dict.keys())
             placeholders = ', '.join(['%s'] * len(data_dict))
             values = tuple(data_dict.values())
 
+            # Snowflake does not enforce UNIQUE constraints, so guard the insert itself
             query = f"""
                 INSERT INTO {table_name} ({columns})
-                VALUES ({placeholders})
+                SELECT {placeholders}
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {table_name}
+                    WHERE supplier_name = %s AND product_name = %s
+                )
             """
+            values += (data_dict.get('supplier_name'), data_dict.get('product_name'))
 
-            cursor = self.conn.cursor()
-            cursor.execute(query, values)
-            self.conn.commit()
-            cursor.close()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, values)
+                inserted = cursor.rowcount
+                conn.commit()
+                cursor.close()
+
+            if inserted == 0:
+                raise DuplicateEntryError()
 
             logger.info(f"Successfully inserted AI generated row into {table_name}")
+            self._notify_insert(table_name, [data_dict])
         except Exception as e:
             logger.error(f"Error inserting data into table {table_name}: {str(e)}")
             raise
 
+    def _write_group(self, table_name, columns, group, upsert):
+        self._require_pool()
+        with self.pool.connection() as conn:
+            existing = self._merge_group(conn, table_name, columns, group, upsert)
+        written = {}
+        for row in group:
+            key = tuple(row.get(column) for column in UNIQUE_KEY_COLUMNS)
+            if key not in existing:
+                written[key] = INSERTED
+            elif upsert:
+                written[key] = UPDATED
+        return written
+
+    def _merge_group(self, conn, table_name, columns, group, upsert):
+        """Load one column set through a temporary stage table, returning the keys that already existed."""
+        from snowflake.connector.pandas_tools import write_pandas
+
+        stage_table = f"{table_name}_stage_{uuid.uuid4().hex[:12]}".upper()
+        on = ' AND '.join(f"t.{column} = s.{column}" for column in UNIQUE_KEY_COLUMNS)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"CREATE TEMPORARY TABLE {stage_table} LIKE {table_name}")
+            df = pd.DataFrame(group, columns=list(columns))
+            df.columns = [column.upper() for column in df.columns]
+            write_pandas(conn, df, stage_table, quote_identifiers=False)
+
+            cursor.execute(
+                f"SELECT {', '.join('s.' + column for column in UNIQUE_KEY_COLUMNS)} "
+                f"FROM {stage_table} s JOIN {table_name} t ON {on}"
+            )
+            existing = {tuple(row) for row in cursor.fetchall()}
+
+            merge = f"""
+                MERGE INTO {table_name} t USING {stage_table} s ON {on}
+                WHEN NOT MATCHED THEN INSERT ({', '.join(columns)})
+                VALUES ({', '.join('s.' + column for column in columns)})
+            """
+            updates = [column for column in columns if column not in UNIQUE_KEY_COLUMNS]
+            if upsert and updates:
+                merge += f"WHEN MATCHED THEN UPDATE SET {', '.join(f't.{c} = s.{c}' for c in updates)}"
+            cursor.execute(merge)
+            conn.commit()
+            return existing
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            try:
+                cursor.execute(f"DROP TABLE IF EXISTS {stage_table}")
+            finally:
+                cursor.close()
+
     def close(self):
-        if self.conn:
-            self.conn.close()
+        super().close()
+        if self.pool:
+            self.pool.close()
             logger.info("Snowflake connection closed")
\ No newline at end of file
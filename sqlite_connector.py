@@ -0,0 +1,93 @@
+import os
+from sqlalchemy import create_engine, event, text
+from logger_config import logger
+from connection_pool import engine_options
+from database_connector import DatabaseConnector
+from storage import migrations_requested
+from bulk_writer import INSERTED, UPDATED, UNIQUE_KEY_COLUMNS
+
+# SQLite's default SQLITE_MAX_VARIABLE_NUMBER, bulk statements stay under it
+MAX_BIND_PARAMS = 32000
+
+class SQLiteConnector(DatabaseConnector):
+    """Local file backend for offline runs, tests and benchmarks.
+
+    Uses DATABASE_URL when it points at SQLite, otherwise SQLITE_PATH.
+    """
+
+    def connect(self):
+        try:
+            database_url = os.getenv('DATABASE_URL', '')
+            if not database_url.startswith('sqlite'):
+                path = os.getenv('SQLITE_PATH', 'data/supplier_agent.db')
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                database_url = f"sqlite:///{path}"
+
+            self.engine = create_engine(database_url, **engine_options(database_url))
+            event.listen(self.engine, 'connect', self._configure_connection)
+            self._watch_ddl()
+
+            if migrations_requested():
+                self.migrate()
+            logger.info(f"Successfully connected to SQLite database {self.engine.url.database}")
+        except Exception as e:
+            logger.error(f"Failed to connect to SQLite database: {str(e)}")
+            raise
+
+    @staticmethod
+    def _configure_connection(dbapi_connection, connection_record):
+        # WAL lets readers run alongside the single writer, busy_timeout makes
+        # concurrent writers wait for the lock instead of failing
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000'))}")
+        cursor.close()
+
+    def _create_table(self):
+        try:
+            create_table_query = """
+            CREATE TABLE IF NOT EXISTS supplier_products (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                supplier_name VARCHAR(255) NOT NULL,
+                product_name VARCHAR(255) NOT NULL,
+                creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(supplier_name, product_name)
+            )
+            """
+            with self.connection() as conn:
+                conn.execute(text(create_table_query))
+                conn.commit()
+            logger.info("Table created/verified successfully")
+        except Exception as e:
+            logger.error(f"Error creating table: {str(e)}")
+            raise
+
+    def _write_group(self, table_name, columns, group, upsert):
+        # Multi-row VALUES with RETURNING, chunked under SQLite's bound parameter limit.
+        # Statements go straight to the driver, compiling text() with thousands of
+        # named binds costs more than the insert itself
+        returning = ', '.join(UNIQUE_KEY_COLUMNS)
+        placeholder = '(' + ', '.join('?' * len(columns)) + ')'
+        chunk_rows = max(1, MAX_BIND_PARAMS // len(columns))
+        written = {}
+        with self.connection() as conn, conn.begin():
+            for start in range(0, len(group), chunk_rows):
+                chunk = group[start:start + chunk_rows]
+                params = tuple(row[column] for row in chunk for column in columns)
+                existing = self._existing_keys(conn, table_name, chunk) if upsert else set()
+                query = (
+                    f"INSERT INTO {table_name} ({', '.join(columns)}) "
+                    f"VALUES {', '.join([placeholder] * len(chunk))} "
+                    f"{self._conflict_clause(columns, upsert)} RETURNING {returning}"
+                )
+                for key in conn.exec_driver_sql(query, params):
+                    written[tuple(key)] = UPDATED if tuple(key) in existing else INSERTED
+        return written
+
+    def _existing_keys(self, conn, table_name, rows):
+        key = ', '.join(UNIQUE_KEY_COLUMNS)
+        placeholder = '(' + ', '.join('?' * len(UNIQUE_KEY_COLUMNS)) + ')'
+        params = tuple(row.get(column) for row in rows for column in UNIQUE_KEY_COLUMNS)
+        query = f"SELECT {key} FROM {table_name} WHERE ({key}) IN (VALUES {', '.join([placeholder] * len(rows))})"
+        return {tuple(row) for row in conn.exec_driver_sql(query, params)}
@@ -1,7 +1,8 @@
 #!/bin/bash
 
-# Start the backend API server
-uvicorn main:app --host 0.0.0.0 --port 5000 &
+# Create missing tables, then start the backend API server (use `python manage.py serve` alone for production)
+python manage.py migrate
+python manage.py serve --workers 1 &
 
 # Wait a moment for the backend to start
 sleep 2
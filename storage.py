@@ -0,0 +1,261 @@
+import asyncio
+import base64
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from logger_config import logger
+from bulk_writer import DUPLICATE, FAILED, INSERTED, UNIQUE_KEY_COLUMNS, split_batch
+from schema_cache import SchemaCache
+from telemetry import traced
+
+# Column used for keyset pagination when the table has one
+KEYSET_COLUMN = 'id'
+
+BACKENDS = ('postgres', 'sqlite', 'snowflake')
+
+def migrations_requested():
+    # DDL runs on connect only when asked for; otherwise use `python manage.py migrate`
+    return os.getenv('DB_RUN_MIGRATIONS', 'false').lower() in ('1', 'true', 'yes')
+
+def encode_cursor(value):
+    if hasattr(value, 'item'):
+        value = value.item()
+    return base64.urlsafe_b64encode(json.dumps(value, default=str).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+class StorageBackend:
+    """Interface shared by the Postgres, SQLite and Snowflake connectors.
+
+    Backends implement _inspect_table, _read_frame, streaming reads and
+    _write_group; the schema cache, paged reads, exists checks, bulk insert with
+    per-row results, insert listeners and the async wrappers are built on those here.
+    """
+
+    # Placeholder style of the driver, formatted with the parameter name
+    param_style = ':{}'
+
+    def __init__(self):
+        self.insert_listeners = []
+        self.schema_cache = SchemaCache(traced('db.inspect_table')(self._inspect_table))
+        # Blocking DB calls from async handlers run here, bounded so a burst of
+        # requests cannot exhaust the connection pool
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('DB_MAX_THREADS', '8')),
+            thread_name_prefix='db'
+        )
+
+    def _inspect_table(self, table_name):
+        """TableSchema read from the database; ValueError for unknown tables."""
+        raise NotImplementedError
+
+    def _read_frame(self, query, params):
+        raise NotImplementedError
+
+    def iter_table_chunks(self, table_name, columns=None, filters=None, cursor=None, chunksize=10000):
+        raise NotImplementedError
+
+    def iter_arrow_batches(self, table_name, columns=None, filters=None, chunksize=50000):
+        raise NotImplementedError
+
+    def iter_key_rows(self, table_name, columns, chunksize=50000):
+        raise NotImplementedError
+
+    def insert_ai_generated_row(self, table_name, data_dict):
+        raise NotImplementedError
+
+    def _write_group(self, table_name, columns, group, upsert):
+        """Write rows sharing a column set, returning {key: inserted | updated} for rows written."""
+        raise NotImplementedError
+
+    def pool_stats(self):
+        raise NotImplementedError
+
+    def migrate(self):
+        """Create the tables the app needs if they do not exist."""
+        raise NotImplementedError
+
+    def get_table_schema(self, table_name):
+        """Cached TableSchema; loaded on first use and after DDL or SCHEMA_CACHE_TTL."""
+        return self.schema_cache.get(table_name)
+
+    def get_table_columns(self, table_name):
+        return self.get_table_schema(table_name).column_names
+
+    def _schema_changed(self, table_name=None):
+        logger.info(f"Schema change detected, invalidating cached schema for {table_name or 'all tables'}")
+        self.schema_cache.invalidate(table_name)
+
+    @traced('db.read_table')
+    def get_table_data(self, table_name):
+        try:
+            return self._read_frame(f"SELECT * FROM {table_name}", {})
+        except Exception as e:
+            logger.error(f"Error fetching data from table {table_name}: {str(e)}")
+            raise
+
+    def _build_select(self, table_name, columns=None, filters=None, cursor=None):
+        """SELECT for a projection, equality filters and a keyset cursor.
+
+        Identifiers are checked against the table's columns, values are bound.
+        Returns the query, its parameters, the keyset column (or None) and whether
+        that column was added to the projection only for paging.
+        """
+        available = self.get_table_columns(table_name)
+        selected = list(columns) if columns else list(available)
+        filters = filters or {}
+        unknown = [column for column in [*selected, *filters] if column not in available]
+        if unknown:
+            raise ValueError(f"Unknown columns for {table_name}: {', '.join(unknown)}")
+
+        key_column = KEYSET_COLUMN if KEYSET_COLUMN in available else None
+        if cursor is not None and key_column is None:
+            raise ValueError(f"Table {table_name} has no {KEYSET_COLUMN} column for cursor pagination")
+        key_added = key_column is not None and key_column not in selected
+        if key_added:
+            selected.append(key_column)
+
+        conditions = []
+        params = {}
+        for position, (column, value) in enumerate(filters.items()):
+            conditions.append(f"{column} = {self.param_style.format(f'filter_{position}')}")
+            params[f"filter_{position}"] = value
+        if cursor is not None:
+            conditions.append(f"{key_column} > {self.param_style.format('after')}")
+            params['after'] = decode_cursor(cursor)
+
+        query = f"SELECT {', '.join(selected)} FROM {table_name}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if key_column is not None:
+            query += f" ORDER BY {key_column}"
+        return query, params, key_column, key_added
+
+    @traced('db.query')
+    def query_table(self, table_name, columns=None, filters=None, limit=1000, offset=0, cursor=None):
+        """One page of a table, and the cursor for the next page (None on the last one)."""
+        try:
+            query, params, key_column, key_added = self._build_select(table_name, columns, filters, cursor)
+            query += f" LIMIT {self.param_style.format('limit')} OFFSET {self.param_style.format('offset')}"
+            params.update(limit=limit, offset=offset)
+            df = self._read_frame(query, params)
+
+            next_cursor = None
+            if key_column is not None and len(df) == limit and pd.notna(df[key_column].iloc[-1]):
+                next_cursor = encode_cursor(df[key_column].iloc[-1])
+            if key_added:
+                df = df.drop(columns=[key_column])
+            return df, next_cursor
+        except Exception as e:
+            logger.error(f"Error querying table {table_name}: {str(e)}")
+            raise
+
+    @traced('db.exists')
+    def exists(self, table_name, supplier_name, product_name):
+        """Whether the supplier/product key is already stored."""
+        conditions = ' AND '.join(
+            f"{column} = {self.param_style.format(column)}" for column in UNIQUE_KEY_COLUMNS
+        )
+        query = f"SELECT 1 AS found FROM {table_name} WHERE {conditions} LIMIT 1"
+        params = dict(zip(UNIQUE_KEY_COLUMNS, (supplier_name, product_name)))
+        return not self._read_frame(query, params).empty
+
+    @traced('db.bulk_insert')
+    def bulk_insert_rows(self, table_name, rows, upsert=False):
+        """Insert rows with as few statements as the backend allows.
+
+        Conflicts on (supplier_name, product_name) are skipped, or update the
+        existing row when upsert is set. Returns one result dict per row, in
+        order: {'status': inserted | updated | duplicate | failed[, 'error']}.
+        """
+        results = [None] * len(rows)
+        groups, repeats = split_batch(rows)
+        for position in repeats:
+            results[position] = {'status': DUPLICATE, 'error': "Duplicate key within the batch"}
+
+        for columns, positions in groups.items():
+            self._write_positions(table_name, columns, rows, positions, upsert, results)
+
+        inserted = [row for row, result in zip(rows, results) if result['status'] == INSERTED]
+        if inserted:
+            logger.info(f"Bulk inserted {len(inserted)}/{len(rows)} rows into {table_name}")
+            self._notify_insert(table_name, inserted)
+        return results
+
+    def _write_positions(self, table_name, columns, rows, positions, upsert, results):
+        group = [rows[position] for position in positions]
+        try:
+            written = self._write_group(table_name, columns, group, upsert)
+        except Exception as e:
+            # Driver message only, the statement itself can hold thousands of placeholders
+            error = str(getattr(e, 'orig', None) or e)
+            if len(positions) == 1:
+                results[positions[0]] = {'status': FAILED, 'error': error}
+                return
+            # Bisect so a bad row costs a few extra statements, not one per row
+            logger.warning(f"Bulk insert of {len(positions)} rows into {table_name} failed, splitting: {error}")
+            middle = len(positions) // 2
+            self._write_positions(table_name, columns, rows, positions[:middle], upsert, results)
+            self._write_positions(table_name, columns, rows, positions[middle:], upsert, results)
+            return
+        for position, row in zip(positions, group):
+            status = written.get(tuple(row.get(column) for column in UNIQUE_KEY_COLUMNS), DUPLICATE)
+            results[position] = {'status': status}
+
+    def add_insert_listener(self, listener):
+        """Register listener(table_name, rows), called after rows are committed."""
+        self.insert_listeners.append(listener)
+
+    def _notify_insert(self, table_name, rows):
+        for listener in self.insert_listeners:
+            try:
+                listener(table_name, rows)
+            except Exception as e:
+                logger.error(f"Insert listener failed for table {table_name}: {str(e)}")
+
+    async def _run_blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def get_table_schema_async(self, table_name):
+        return await self._run_blocking(self.get_table_schema, table_name)
+
+    async def get_table_data_async(self, table_name):
+        return await self._run_blocking(self.get_table_data, table_name)
+
+    async def query_table_async(self, table_name, columns=None, filters=None, limit=1000, offset=0, cursor=None):
+        return await self._run_blocking(self.query_table, table_name, columns, filters, limit, offset, cursor)
+
+    async def exists_async(self, table_name, supplier_name, product_name):
+        return await self._run_blocking(self.exists, table_name, supplier_name, product_name)
+
+    async def insert_ai_generated_row_async(self, table_name, data_dict):
+        return await self._run_blocking(self.insert_ai_generated_row, table_name, data_dict)
+
+    async def bulk_insert_rows_async(self, table_name, rows, upsert=False):
+        return await self._run_blocking(self.bulk_insert_rows, table_name, rows, upsert)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+def create_storage_backend(backend=None):
+    """Connector for STORAGE_BACKEND, or inferred from DATABASE_URL when unset."""
+    backend = backend or os.getenv('STORAGE_BACKEND')
+    if not backend:
+        backend = 'sqlite' if os.getenv('DATABASE_URL', '').startswith('sqlite') else 'postgres'
+    # Imported on demand so a backend's driver is only needed when it is used
+    if backend == 'postgres':
+        from database_connector import DatabaseConnector
+        return DatabaseConnector()
+    if backend == 'sqlite':
+        from sqlite_connector import SQLiteConnector
+        return SQLiteConnector()
+    if backend == 'snowflake':
+        from snowflake_connector import SnowflakeConnector
+        return SnowflakeConnector()
+    raise ValueError(f"Unknown storage backend: {backend} (expected one of {', '.join(BACKENDS)})")
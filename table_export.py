@@ -0,0 +1,90 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import types as sqltypes
+
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+PARQUET_MEDIA_TYPE = 'application/vnd.apache.parquet'
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+def arrow_type(column_type):
+    """Arrow type for a SQLAlchemy column type, falling back to string."""
+    if isinstance(column_type, sqltypes.Boolean):
+        return pa.bool_()
+    if isinstance(column_type, sqltypes.Integer):
+        return pa.int64()
+    if isinstance(column_type, (sqltypes.Float, sqltypes.Numeric)):
+        return pa.float64()
+    if isinstance(column_type, sqltypes.DateTime):
+        return pa.timestamp('us')
+    if isinstance(column_type, sqltypes.Date):
+        return pa.date32()
+    return pa.string()
+
+def arrow_schema(columns):
+    """Schema for inspector column dicts, so every batch of a stream agrees on types."""
+    return pa.schema([pa.field(column['name'], arrow_type(column['type'])) for column in columns])
+
+def dataframe_to_batch(df, schema):
+    # Drivers hand back dates as strings and all-null chunks as object columns,
+    # coerce to the declared type before handing the frame to Arrow
+    for field in schema:
+        if pa.types.is_timestamp(field.type) or pa.types.is_date(field.type):
+            df[field.name] = pd.to_datetime(df[field.name], errors='coerce')
+            if pa.types.is_date(field.type):
+                df[field.name] = df[field.name].dt.date
+        elif pa.types.is_string(field.type):
+            df[field.name] = df[field.name].astype('string')
+    return pa.RecordBatch.from_pandas(df, schema=schema, preserve_index=False)
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back in pieces."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_ndjson(chunks):
+    for df in chunks:
+        if not df.empty:
+            yield df.to_json(orient='records', lines=True, date_format='iso').rstrip('\n') + '\n'
+
+def stream_arrow_ipc(schema, batches):
+    """Arrow IPC stream bytes, one message per record batch."""
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+def stream_parquet(schema, batches):
+    """Parquet file bytes, one row group per record batch."""
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+import pandas as pd
+from logger_config import logger
+from storage import KEYSET_COLUMN, encode_cursor
+from bulk_writer import UNIQUE_KEY_COLUMNS
+
+def compact_frame(df, max_ratio=0.5):
+    """Store repetitive text columns (supplier names, categories) as pandas categoricals."""
+    for column in df.columns:
+        series = df[column]
+        is_text = series.dtype == object or isinstance(series.dtype, pd.StringDtype)
+        if is_text and len(series) and series.nunique(dropna=True) <= len(series) * max_ratio:
+            df[column] = series.astype('category')
+    return df
+
+def append_frame(df, new):
+    """Concatenate without modifying df, keeping categorical columns categorical."""
+    if df.empty:
+        return compact_frame(new.reset_index(drop=True))
+    columns = {}
+    for column in df.columns:
+        old = df[column].reset_index(drop=True)
+        added = new[column].reset_index(drop=True) if column in new.columns else pd.Series([None] * len(new))
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            unseen = pd.Index(added.dropna().unique()).difference(old.cat.categories, sort=False)
+            if len(unseen):
+                old = old.cat.add_categories(unseen)
+            added = pd.Series(pd.Categorical(added, categories=old.cat.categories))
+        columns[column] = pd.concat([old, added], ignore_index=True)
+    return pd.DataFrame(columns)
+
+class TableSnapshot:
+    """In-process copy of one table, loaded once and then refreshed incrementally.
+
+    Rows the database has returned live in an immutable frame that is replaced,
+    never modified, so a reader keeps a consistent view while a refresh runs.
+    Rows written by this process are visible immediately as local rows until a
+    refresh brings back the stored version with its id and defaults.
+
+    Ids are assigned at insert but rows become visible at commit, so with
+    concurrent writers (other worker processes, Postgres sessions) a row can
+    appear below the watermark after a later one. Each refresh re-reads the
+    last trailing_ids ids to catch those; a row committed after more than
+    trailing_ids later ids, and any update or delete, shows up at the next
+    full reload, every full_reload_interval seconds.
+    """
+
+    def __init__(self, db, table_name, refresh_interval, trailing_ids=1000, full_reload_interval=3600):
+        self.db = db
+        self.table_name = table_name
+        self.refresh_interval = refresh_interval
+        self.trailing_ids = trailing_ids
+        self.full_reload_interval = full_reload_interval
+        self._frame = None
+        self._local = {}
+        self._view = None
+        self._columns = None
+        self.watermark = None
+        self.refreshed_at = 0.0
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.metrics = {'full_loads': 0, 'refreshes': 0, 'rows_fetched': 0, 'late_rows': 0, 'local_rows': 0}
+
+    def data(self):
+        if self._frame is None or time.monotonic() - self.refreshed_at >= self.refresh_interval:
+            self.refresh()
+        view = self._view
+        if view is None:
+            with self._lock:
+                view = self._view = self._build_view()
+        return view
+
+    def _build_view(self):
+        if not self._local:
+            return self._frame
+        local = pd.DataFrame(list(self._local.values()))
+        return append_frame(self._frame, local)
+
+    def refresh(self, full=False):
+        with self._lock:
+            # Another reader may have refreshed while this one waited
+            if not full and self._frame is not None and time.monotonic() - self.refreshed_at < self.refresh_interval:
+                return
+            try:
+                columns = self.db.get_table_columns(self.table_name)
+                # Without a keyset column, or after the columns changed, only a full read is correct
+                stale = self.full_reload_interval and time.monotonic() - self.loaded_at >= self.full_reload_interval
+                if full or stale or self._frame is None or columns != self._columns or KEYSET_COLUMN not in columns:
+                    self._load(columns)
+                else:
+                    self._fetch_new()
+                self.refreshed_at = time.monotonic()
+            except Exception as e:
+                logger.error(f"Error refreshing snapshot of {self.table_name}: {str(e)}")
+                raise
+
+    def _load(self, columns):
+        frame = compact_frame(self.db.get_table_data(self.table_name))
+        self._columns = columns
+        self.watermark = self._max_key(frame)
+        self._local.clear()
+        self._publish(frame)
+        self.loaded_at = time.monotonic()
+        self.metrics['full_loads'] += 1
+        self.metrics['rows_fetched'] += len(frame)
+        logger.info(f"Loaded snapshot of {self.table_name}: {len(frame)} rows")
+
+    def _fetch_new(self):
+        since = self.watermark
+        windowed = isinstance(since, (int, float)) and not isinstance(since, bool) and self.trailing_ids > 0
+        if windowed:
+            since = since - self.trailing_ids
+        cursor = encode_cursor(since) if since is not None else None
+        chunks = list(self.db.iter_table_chunks(self.table_name, cursor=cursor))
+        self.metrics['refreshes'] += 1
+        if not chunks or not sum(len(chunk) for chunk in chunks):
+            return
+        new = pd.concat(chunks, ignore_index=True)
+        if windowed:
+            # Keep only rows the frame does not have yet: new ones and late commits in the window
+            known = self._frame[KEYSET_COLUMN]
+            new = new[~new[KEYSET_COLUMN].isin(known[known > since])]
+            if new.empty:
+                return
+            self.metrics['late_rows'] += int((new[KEYSET_COLUMN] <= self.watermark).sum())
+        for key in zip(*(new[column] for column in UNIQUE_KEY_COLUMNS)):
+            self._local.pop(key, None)
+        latest = self._max_key(new)
+        self.watermark = latest if self.watermark is None or latest is None else max(self.watermark, latest)
+        self._publish(append_frame(self._frame, new))
+        self.metrics['rows_fetched'] += len(new)
+
+    def _max_key(self, frame):
+        if KEYSET_COLUMN not in frame.columns or frame.empty or frame[KEYSET_COLUMN].isna().all():
+            return self.watermark
+        value = frame[KEYSET_COLUMN].max()
+        return value.item() if hasattr(value, 'item') else value
+
+    def _publish(self, frame):
+        self._frame = frame
+        self._view = None
+
+    def add_local(self, rows):
+        with self._lock:
+            if self._frame is None:
+                return
+            for row in rows:
+                self._local[tuple(row.get(column) for column in UNIQUE_KEY_COLUMNS)] = row
+            self.metrics['local_rows'] += len(rows)
+            self._view = None
+
+    def stats(self):
+        frame = self._frame
+        return {
+            **self.metrics,
+            'rows': 0 if frame is None else len(frame),
+            'pending_local': len(self._local),
+            'watermark': self.watermark,
+            'memory_bytes': 0 if frame is None else int(frame.memory_usage(deep=True).sum()),
+            'age_seconds': round(time.monotonic() - self.refreshed_at, 3) if frame is not None else None
+        }
+
+class SnapshotStore:
+    """Per-table TableSnapshot, kept current by the connector's insert listener.
+
+    Readers must treat the returned DataFrame as read-only; it is shared.
+    """
+
+    def __init__(self, db, refresh_interval=None):
+        self.db = db
+        self.refresh_interval = (
+            refresh_interval if refresh_interval is not None
+            else float(os.getenv('SNAPSHOT_REFRESH_INTERVAL', '30'))
+        )
+        self.trailing_ids = int(os.getenv('SNAPSHOT_TRAILING_IDS', '1000'))
+        self.full_reload_interval = float(os.getenv('SNAPSHOT_FULL_RELOAD_INTERVAL', '3600'))
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def table(self, table_name):
+        with self._lock:
+            snapshot = self._tables.get(table_name)
+            if snapshot is None:
+                snapshot = TableSnapshot(
+                    self.db, table_name, self.refresh_interval, self.trailing_ids, self.full_reload_interval
+                )
+                self._tables[table_name] = snapshot
+        return snapshot
+
+    def get_table_data(self, table_name):
+        return self.table(table_name).data()
+
+    def invalidate(self, table_name):
+        snapshot = self._tables.get(table_name)
+        if snapshot is not None:
+            snapshot.refresh(full=True)
+
+    def on_insert(self, table_name, rows):
+        snapshot = self._tables.get(table_name)
+        if snapshot is not None:
+            snapshot.add_local(rows)
+
+    def stats(self):
+        return {table_name: snapshot.stats() for table_name, snapshot in list(self._tables.items())}
@@ -0,0 +1,264 @@
+import asyncio
+import functools
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from logger_config import logger
+
+METRICS_PREFIX = os.getenv('METRICS_PREFIX', 'supplier_agent')
+
+# Seconds; covers cache hits through slow model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """A named metric with fixed label names, one series per label value tuple."""
+
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def label_values(self):
+        with self._lock:
+            return [dict(zip(self.label_names, key)) for key in self._series]
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, extra_names, label_values, value in self._samples():
+            labels = _format_labels(self.label_names + extra_names, label_values)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._series.get(tuple(labels.get(name, '') for name in self.label_names), 0)
+
+    def _samples(self):
+        with self._lock:
+            series = list(self._series.items())
+        return [('_total', (), key, value) for key, value in series]
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        # Per-bucket counts; cumulated only when rendered
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels.get(name, '') for name in self.label_names))
+        return series[2] if series is not None else 0
+
+    def mean(self, **labels):
+        series = self._series.get(tuple(labels.get(name, '') for name in self.label_names))
+        return series[1] / series[2] if series is not None and series[2] else None
+
+    def quantile(self, q, **labels):
+        """Estimated q-quantile, interpolated within its bucket like Prometheus' histogram_quantile."""
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            counts = list(series[0]) if series is not None else None
+        if not counts or not sum(counts):
+            return None
+        rank = q * sum(counts)
+        cumulative = 0
+        for position, bucket_count in enumerate(counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                if position == len(self.buckets):
+                    # Above the last bound, the best estimate is that bound
+                    return self.buckets[-1]
+                lower = self.buckets[position - 1] if position else 0.0
+                return lower + (self.buckets[position] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def _samples(self):
+        with self._lock:
+            series = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items()]
+        samples = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', ('le',), key + (_format_value(float(bound)),), cumulative))
+            samples.append(('_sum', (), key, total))
+            samples.append(('_count', (), key, count))
+        return samples
+
+class Gauge(Metric):
+    """Read when rendered from a callback returning a number or {label values tuple: number}."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, description, read, labels=()):
+        super().__init__(name, description, labels)
+        self.read = read
+
+    def _samples(self):
+        try:
+            values = self.read()
+        except Exception as e:
+            logger.error(f"Error reading gauge {self.name}: {str(e)}")
+            return []
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [('', (), key if isinstance(key, tuple) else (key,), value) for key, value in values.items()]
+
+class MetricsRegistry:
+    def __init__(self, prefix=METRICS_PREFIX):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Re-registering (e.g. a second component instance) reuses the series
+                if isinstance(metric, Gauge):
+                    existing.read = metric.read
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, description, labels=()):
+        return self._register(Counter(f"{self.prefix}_{name}", description, labels))
+
+    def histogram(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(f"{self.prefix}_{name}", description, labels, buckets))
+
+    def gauge(self, name, description, read, labels=()):
+        return self._register(Gauge(f"{self.prefix}_{name}", description, read, labels))
+
+    def get(self, name):
+        return self._metrics.get(f"{self.prefix}_{name}")
+
+    def reset(self):
+        """Clear every series, e.g. after a benchmark's warm-up."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def render(self):
+        """Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram('stage_duration_seconds', "Time spent per pipeline stage", ('stage',))
+STAGE_ERRORS = registry.counter('stage_errors', "Stage calls that raised", ('stage',))
+OPENAI_TOKENS = registry.counter('openai_tokens', "Tokens reported by OpenAI responses", ('kind',))
+OPENAI_REQUESTS = registry.counter('openai_requests', "OpenAI calls by outcome", ('outcome',))
+
+# Off by default: even the no-op tracer costs several times the metrics themselves
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+def _get_tracer():
+    # Optional: spans are also traced through the OpenTelemetry API; exporting
+    # needs an SDK tracer provider, e.g. from opentelemetry-instrument.
+    # Imported only when tracing is on, it adds to every cold start otherwise
+    try:
+        from opentelemetry import trace as otel_trace
+    except ImportError:
+        logger.warning("TRACING_ENABLED is set but opentelemetry-api is not installed, tracing is off")
+        return None
+    return otel_trace.get_tracer('supplier_agent')
+
+_tracer = _get_tracer() if TRACING_ENABLED else None
+
+@contextmanager
+def span(stage, **attributes):
+    """Time a block into the stage histogram and, with OpenTelemetry, trace it as a span."""
+    started = time.perf_counter()
+    otel_span = None
+    if _tracer is not None:
+        otel_span = _tracer.start_as_current_span(stage, attributes=attributes or None)
+        otel_span.__enter__()
+    try:
+        yield
+    except BaseException as e:
+        if not isinstance(e, (asyncio.CancelledError, GeneratorExit)):
+            STAGE_ERRORS.inc(stage=stage)
+        if otel_span is not None:
+            otel_span.__exit__(type(e), e, e.__traceback__)
+            otel_span = None
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+        if otel_span is not None:
+            otel_span.__exit__(None, None, None)
+
+def traced(stage):
+    """Decorator form of span for sync and async functions."""
+    def decorate(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def record_token_usage(usage):
+    if usage is not None:
+        OPENAI_TOKENS.inc(usage.prompt_tokens, kind='prompt')
+        OPENAI_TOKENS.inc(usage.completion_tokens, kind='completion')
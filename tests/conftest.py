@@ -0,0 +1,38 @@
+import os
+import socket
+import pytest
+
+# Log to stdout only; set before anything imports logger_config
+os.environ.setdefault('LOG_DIR', '')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def web_stub():
+    """bench.stubs' search and product page server, with no added latency."""
+    from bench.stubs import ServerThread, build_web_stub
+
+    app = build_web_stub(latency=0)
+    with ServerThread(app, free_port()) as server:
+        server.app = app
+        yield server
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """SQLiteConnector on a fresh supplier_products table holding 20 synthetic rows."""
+    from bench.fixtures import build_table
+    from sqlite_connector import SQLiteConnector
+
+    database_url = f"sqlite:///{tmp_path / 'test.db'}"
+    monkeypatch.setenv('DATABASE_URL', database_url)
+    build_table(database_url, 20)
+    db = SQLiteConnector()
+    yield db
+    db.close()
+    db.engine.dispose()
@@ -0,0 +1,76 @@
+import asyncio
+from bench.fixtures import TABLE_NAME
+from bulk_writer import DUPLICATE, FAILED, INSERTED, BufferedWriter
+
+
+def stored_key(db):
+    row = db.get_table_data(TABLE_NAME).iloc[0]
+    return row['supplier_name'], row['product_name']
+
+
+def new_row(i, **values):
+    return {'supplier_name': 'Acme', 'product_name': f"Widget {i}", 'category': 'Hardware', **values}
+
+
+def write_all(writer, rows):
+    async def run():
+        # Concurrent writers, the way API requests share the writer
+        results = await asyncio.gather(*(writer.write(TABLE_NAME, row) for row in rows))
+        await writer.close()
+        return results
+    return asyncio.run(run())
+
+
+def test_each_row_gets_its_own_outcome(sqlite_db):
+    supplier, product = stored_key(sqlite_db)
+    writer = BufferedWriter(sqlite_db, max_rows=100)
+    rows = [
+        new_row(0),
+        {'supplier_name': supplier, 'product_name': product, 'category': 'Hardware'},
+        new_row(1),
+        # The same key twice in one batch
+        new_row(0),
+        new_row(2, product_name=None),
+    ]
+
+    results = write_all(writer, rows)
+
+    assert [result['status'] for result in results] == [INSERTED, DUPLICATE, INSERTED, DUPLICATE, FAILED]
+    assert 'NOT NULL' in results[4]['error']
+    assert writer.metrics['flushes'] == 1
+    assert writer.metrics[INSERTED] == 2
+    data = sqlite_db.get_table_data(TABLE_NAME)
+    assert len(data) == 22
+    assert {'Widget 0', 'Widget 1'} <= set(data['product_name'])
+
+
+def test_failed_statement_is_bisected_down_to_the_bad_row(sqlite_db, monkeypatch):
+    statements = []
+    write_group = sqlite_db._write_group
+
+    def counted(table_name, columns, group, upsert):
+        statements.append(len(group))
+        return write_group(table_name, columns, group, upsert)
+
+    monkeypatch.setattr(sqlite_db, '_write_group', counted)
+    rows = [new_row(i) for i in range(8)]
+    rows[5]['product_name'] = None
+
+    results = write_all(BufferedWriter(sqlite_db, max_rows=8), rows)
+
+    assert [result['status'] for result in results] == [INSERTED] * 5 + [FAILED] + [INSERTED] * 2
+    # Failing halves are split until the bad row is alone, passing halves go in one statement each
+    assert statements == [8, 4, 4, 2, 1, 1, 2]
+
+
+def test_whole_flush_failing_fails_every_row(sqlite_db, monkeypatch):
+    def broken(table_name, rows, upsert=False):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(sqlite_db, 'bulk_insert_rows', broken)
+    writer = BufferedWriter(sqlite_db, max_rows=10)
+
+    results = write_all(writer, [new_row(i) for i in range(3)])
+
+    assert results == [{'status': FAILED, 'error': "connection lost"}] * 3
+    assert writer.metrics[FAILED] == 3
@@ -0,0 +1,45 @@
+import pytest
+from connection_pool import SnowflakePool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+def pool(size=1):
+    return SnowflakePool(FakeConnection, size=size, timeout=0.1, recycle=3600, pre_ping=False)
+
+
+def rows(pool):
+    # Shaped like SnowflakeConnector.iter_table_chunks
+    with pool.connection():
+        yield from range(10)
+
+
+def test_stream_closed_early_returns_the_session():
+    snowflake = pool()
+    stream = rows(snowflake)
+    next(stream)
+    # What a disconnecting export client does to the generator
+    stream.close()
+
+    assert snowflake.stats()['in_use'] == 0
+    assert snowflake.acquire() is not None
+
+
+def test_session_closed_by_an_error_is_discarded():
+    snowflake = pool()
+    with pytest.raises(RuntimeError):
+        with snowflake.connection() as conn:
+            conn.close()
+            raise RuntimeError("lost the session")
+
+    assert snowflake.stats()['opened'] == 0
+    assert snowflake.acquire() is not conn
@@ -0,0 +1,50 @@
+import pytest
+from json_stream import JSONFieldStream
+
+
+def feed_in_pieces(parser, text, size):
+    members = []
+    for start in range(0, len(text), size):
+        members.append(parser.feed(text[start:start + size]))
+    return members
+
+
+def test_members_are_reported_as_they_complete():
+    parser = JSONFieldStream()
+
+    assert parser.feed('{"colour": "re') == []
+    assert parser.feed('d", "weight": 1') == [('colour', 'red')]
+    # 1 could still become 1.5
+    assert parser.feed('.5') == []
+    assert parser.feed(', "tags": ["a", "b"]}') == [('weight', 1.5), ('tags', ['a', 'b'])]
+    assert parser.done
+
+
+def test_any_split_gives_the_same_members():
+    text = '{"a": "x, \\"y\\" }", "b": {"c": [1, 2]}, "d": true, "e": null, "f": -3e2}'
+    expected = [('a', 'x, "y" }'), ('b', {'c': [1, 2]}), ('d', True), ('e', None), ('f', -300.0)]
+
+    for size in range(1, len(text) + 1):
+        pieces = feed_in_pieces(JSONFieldStream(), text, size)
+        assert [member for piece in pieces for member in piece] == expected
+
+
+def test_path_reports_the_nested_members_only():
+    parser = JSONFieldStream(path=('fields',))
+    text = '{"model": "x", "fields": {"colour": {"answer": "red", "confidence": 0.9}, "size": {"answer": "L"}}, "n": 2}'
+
+    members = [member for piece in feed_in_pieces(parser, text, 7) for member in piece]
+
+    assert members == [('colour', {'answer': 'red', 'confidence': 0.9}), ('size', {'answer': 'L'})]
+    assert parser.done
+
+
+def test_text_after_the_object_is_ignored_and_bad_input_raises():
+    parser = JSONFieldStream()
+    assert parser.feed('{"a": 1} trailing') == [('a', 1)]
+    assert parser.feed('more') == []
+
+    with pytest.raises(ValueError):
+        JSONFieldStream().feed('["not", "an", "object"]')
+    with pytest.raises(ValueError):
+        JSONFieldStream().feed('{"a" 1}')
@@ -0,0 +1,129 @@
+import asyncio
+import time
+import httpx
+import openai
+import pytest
+from rate_limiter import OpenAIScheduler, current_caller
+
+
+def make_scheduler(**kwargs):
+    return OpenAIScheduler(**{'rpm': 600, 'tpm': 60000, 'max_concurrency': 4, 'max_retries': 3,
+                              'backoff_base': 0.01, 'backoff_max': 0.05, 'completion_tokens': 1, **kwargs})
+
+
+def test_cancelled_after_admission_returns_the_request_and_tokens():
+    scheduler = make_scheduler()
+
+    async def run():
+        async def call():
+            await asyncio.sleep(1)
+
+        task = asyncio.create_task(scheduler.submit(call, 99))
+        while scheduler.metrics['admitted'] == 0:
+            await asyncio.sleep(0)
+        # Admitted, but the caller has not resumed yet
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert scheduler.stats()['in_flight'] == 0
+    assert scheduler.requests.wait_time(scheduler.requests.capacity) == 0
+    assert scheduler.tokens.wait_time(scheduler.tokens.capacity) == 0
+
+
+def rate_limited(retry_after_ms):
+    request = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+    response = httpx.Response(429, headers={'retry-after-ms': str(retry_after_ms)}, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def test_429_is_retried_after_retry_after_and_pauses_other_callers():
+    scheduler = make_scheduler(rpm=0, tpm=0)
+    started = {}
+
+    async def run():
+        began = time.monotonic()
+        attempts = []
+
+        async def limited():
+            attempts.append(time.monotonic() - began)
+            if len(attempts) == 1:
+                raise rate_limited(200)
+            return 'answer'
+
+        async def other():
+            started['other'] = time.monotonic() - began
+            return 'other'
+
+        first = asyncio.create_task(scheduler.submit(limited, 10))
+        while not attempts:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        second = await scheduler.submit(other, 10)
+        return await first, second, attempts
+
+    answer, other, attempts = asyncio.run(run())
+    assert (answer, other) == ('answer', 'other')
+    assert attempts[1] - attempts[0] >= 0.2
+    # The pause is scheduler-wide, so the other caller waited it out too
+    assert started['other'] >= 0.2
+    assert scheduler.metrics['rate_limited'] == 1
+    assert scheduler.metrics['retries'] == 1
+    assert scheduler.metrics['completed'] == 2
+
+
+def test_429_gives_up_after_max_retries():
+    scheduler = make_scheduler(rpm=0, tpm=0, max_retries=2)
+    attempts = []
+
+    async def limited():
+        attempts.append(None)
+        raise rate_limited(1)
+
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(scheduler.submit(limited, 10))
+    assert len(attempts) == 3
+    assert scheduler.metrics['failed'] == 1
+
+
+def test_identical_requests_in_flight_share_one_call():
+    scheduler = make_scheduler(rpm=0, tpm=0)
+    calls = []
+
+    async def call():
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        return {'answer': 42}
+
+    async def run():
+        return await asyncio.gather(*(scheduler.submit(call, 10, key='same prompt') for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert results == [{'answer': 42}] * 5
+    assert scheduler.metrics['coalesced'] == 4
+
+
+def test_callers_take_turns():
+    scheduler = make_scheduler(rpm=0, tpm=0, max_concurrency=1)
+    order = []
+
+    def call(name):
+        async def run():
+            order.append(name)
+            await asyncio.sleep(0.01)
+        return run
+
+    async def submit(caller, name):
+        current_caller.set(caller)
+        await scheduler.submit(call(name), 10)
+
+    async def run():
+        # A batch queues first, then a single request arrives behind it
+        batch = [asyncio.create_task(submit('batch', f"batch-{i}")) for i in range(5)]
+        single = asyncio.create_task(submit('single', 'single'))
+        await asyncio.gather(*batch, single)
+
+    asyncio.run(run())
+    assert order == ['batch-0', 'single', 'batch-1', 'batch-2', 'batch-3', 'batch-4']
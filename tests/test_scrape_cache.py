@@ -0,0 +1,86 @@
+import asyncio
+from fastapi.responses import HTMLResponse
+from scrape_cache import PAGE, SEARCH, ScrapeCache
+from web_scraper import WebScraper
+
+
+def scrape(scraper, *calls):
+    """Run scraper coroutines in order on one event loop, then close its client."""
+    async def run():
+        try:
+            return [await call(scraper) for call in calls]
+        finally:
+            await scraper.close()
+    return asyncio.run(run())
+
+
+def search_product(scraper):
+    return scraper.search_product_info("Acme", "Widget")
+
+
+def test_second_fetch_is_a_hit(web_stub, tmp_path):
+    cache = ScrapeCache(str(tmp_path / 'scrape.db'))
+    scraper = WebScraper(search_url=f"{web_stub.url}/search", cache=cache)
+
+    first, second = scrape(scraper, search_product, search_product)
+
+    assert second == first
+    assert web_stub.app.state.hits == {'search': 1, 'product': scraper.top_n, 'not_modified': 0}
+    stats = cache.stats()
+    assert stats['misses'] == 1 + scraper.top_n
+    assert stats['memory_hits'] == 1 + scraper.top_n
+    assert stats['stores'] == 1 + scraper.top_n
+
+
+def test_disk_tier_survives_a_new_cache(web_stub, tmp_path):
+    path = str(tmp_path / 'scrape.db')
+    scrape(WebScraper(search_url=f"{web_stub.url}/search", cache=ScrapeCache(path)), search_product)
+
+    cache = ScrapeCache(path)
+    scraper = WebScraper(search_url=f"{web_stub.url}/search", cache=cache)
+    scrape(scraper, search_product)
+
+    assert web_stub.app.state.hits['search'] == 1
+    assert cache.stats()['disk_hits'] == 1 + scraper.top_n
+    assert cache.stats()['misses'] == 0
+
+
+def test_stale_page_is_revalidated_with_a_conditional_get(web_stub, tmp_path):
+    # Every entry is stale as soon as it is stored
+    cache = ScrapeCache(str(tmp_path / 'scrape.db'), ttl=0)
+    scraper = WebScraper(search_url=f"{web_stub.url}/search", cache=cache)
+    url = f"{web_stub.url}/product/widget"
+
+    fetch = lambda scraper: scraper.get_website_text_content(url)
+    first, second = scrape(scraper, fetch, fetch)
+
+    assert second == first
+    # The second request carried the ETag and got 304 Not Modified, not the page again
+    assert web_stub.app.state.hits['product'] == 1
+    assert web_stub.app.state.hits['not_modified'] == 1
+    assert cache.stats()['stale'] == 1
+    assert cache.stats()['revalidated'] == 1
+    assert cache.get(PAGE, url)['value'] == first
+
+
+def test_stale_search_is_fetched_again(web_stub, tmp_path):
+    cache = ScrapeCache(str(tmp_path / 'scrape.db'), ttl=0)
+    scraper = WebScraper(search_url=f"{web_stub.url}/search", cache=cache)
+
+    scrape(scraper, lambda scraper: scraper._search("Acme Widget"), lambda scraper: scraper._search("Acme Widget"))
+
+    assert web_stub.app.state.hits['search'] == 2
+    assert cache.stats()['stale'] == 1
+
+
+def test_empty_search_page_is_not_cached(web_stub, tmp_path):
+    # Search engines answer throttled clients with an empty page
+    web_stub.app.add_api_route("/empty", lambda: HTMLResponse("<html><body></body></html>"))
+    cache = ScrapeCache(str(tmp_path / 'scrape.db'))
+    scraper = WebScraper(search_url=f"{web_stub.url}/empty", cache=cache)
+
+    results = scrape(scraper, lambda scraper: scraper._search("Acme Widget"))
+
+    assert results == [[]]
+    assert cache.get(SEARCH, "Acme Widget") is None
+    assert cache.stats()['stores'] == 0
@@ -0,0 +1,109 @@
+import pandas as pd
+import pytest
+from similarity_index import SimilarityIndex, SimilarityIndexStore
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['id', 'supplier_name', 'product_name'])
+
+
+BASE = [(i, f"Supplier {i}", f"Product {i}") for i in range(1, 101)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SimilarityIndexStore(str(tmp_path), trailing_ids=10)
+
+
+def rebuilds(monkeypatch, store):
+    calls = []
+    rebuild = store._rebuild
+
+    def counted(*args):
+        calls.append(None)
+        return rebuild(*args)
+
+    monkeypatch.setattr(store, '_rebuild', counted)
+    return calls
+
+
+def test_source_records_the_rows_the_index_holds(store):
+    index = store.get('t', frame(BASE))
+
+    assert len(index) == 100
+    assert index.source['max_id'] == 100
+    assert index.source['rows'] == 100
+    assert index.source['count'] == 100
+    assert index.source['recent'] == [float(i) for i in range(91, 101)]
+    assert index.source['pending'] == []
+
+
+def test_new_and_late_rows_are_added_without_a_rebuild(store, monkeypatch):
+    store.get('t', frame(BASE))
+    calls = rebuilds(monkeypatch, store)
+
+    index = store.get('t', frame(BASE + [(101, 'Acme', 'Bolt')]))
+    assert len(index) == 101
+    # Committed after 101 but with a lower id, inside the trailing window
+    index = store.get('t', frame(BASE + [(101, 'Acme', 'Bolt'), (95.5, 'Late', 'Row')]))
+
+    assert len(index) == 102
+    assert index.source['rows'] == 102
+    assert calls == []
+    assert index.search('Late Row', k=1)[0][0] == ('Late', 'Row')
+
+
+def test_rows_inserted_here_are_not_added_twice(store, monkeypatch):
+    store.get('t', frame(BASE))
+    calls = rebuilds(monkeypatch, store)
+
+    store.on_insert('t', [{'supplier_name': 'Acme', 'product_name': 'Bolt'}])
+    index = store.get('t', frame(BASE + [(None, 'Acme', 'Bolt')]))
+    assert len(index) == 101
+    assert index.source['pending'] == [['Acme', 'Bolt']]
+    # Back from the database with its id
+    index = store.get('t', frame(BASE + [(101, 'Acme', 'Bolt')]))
+
+    assert len(index) == 101
+    assert index.source['pending'] == []
+    assert index.source['max_id'] == 101
+    assert calls == []
+
+
+def test_delete_with_the_same_row_count_rebuilds(store, monkeypatch):
+    store.get('t', frame(BASE))
+    calls = rebuilds(monkeypatch, store)
+    # One row deleted and one added: a row count check would miss it
+    replaced = [row for row in BASE if row[0] != 5] + [(101, 'Acme', 'Bolt')]
+
+    index = store.get('t', frame(replaced))
+
+    assert len(calls) == 1
+    assert len(index) == 100
+    assert ('Supplier 5', 'Product 5') not in {key for key, _ in index.search('Supplier 5 Product 5', k=100)}
+
+
+def test_source_is_persisted_with_the_index(tmp_path):
+    first = SimilarityIndexStore(str(tmp_path))
+    first.get('t', frame(BASE))
+    first._indexes['t'].close()
+
+    second = SimilarityIndexStore(str(tmp_path))
+    index = second.get('t')
+
+    assert len(index) == 100
+    assert index.source['max_id'] == 100
+
+
+def test_second_index_on_a_path_keeps_to_memory(tmp_path):
+    path = str(tmp_path / 't')
+    owner = SimilarityIndex(path)
+    other = SimilarityIndex(path)
+    owner.add([('a', '1')], ['a 1'])
+    other.add([('b', '2'), ('c', '3')], ['b 2', 'c 3'])
+    owner.close()
+
+    reopened = SimilarityIndex(path)
+
+    assert other.path is None
+    assert reopened.keys == [('a', '1')]
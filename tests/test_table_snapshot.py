@@ -0,0 +1,87 @@
+from sqlalchemy import text
+from bench.fixtures import TABLE_NAME
+from table_snapshot import TableSnapshot
+
+
+def insert(db, row_id, product_name):
+    """Insert with an explicit id, the way a commit from a slower writer lands below the watermark."""
+    with db.engine.begin() as conn:
+        conn.execute(
+            text(f"INSERT INTO {TABLE_NAME} (id, supplier_name, product_name) VALUES (:id, 'Acme', :product)"),
+            {'id': row_id, 'product': product_name}
+        )
+
+
+def snapshot(db, trailing_ids=10):
+    # Refresh on every read, no periodic full reload
+    return TableSnapshot(db, TABLE_NAME, refresh_interval=0, trailing_ids=trailing_ids, full_reload_interval=0)
+
+
+def ids(frame):
+    return sorted(frame['id'].tolist())
+
+
+def test_refresh_fetches_only_new_rows(sqlite_db):
+    table = snapshot(sqlite_db)
+    loaded = len(table.data())
+    insert(sqlite_db, 100, 'Widget 100')
+
+    data = table.data()
+
+    assert len(data) == loaded + 1
+    assert table.watermark == 100
+    assert table.metrics['full_loads'] == 1
+    assert table.metrics['rows_fetched'] == loaded + 1
+
+
+def test_late_commit_inside_the_window_is_caught(sqlite_db):
+    table = snapshot(sqlite_db, trailing_ids=10)
+    insert(sqlite_db, 100, 'Widget 100')
+    table.data()
+    # Id 95 was assigned before 100 but committed after the last refresh
+    insert(sqlite_db, 95, 'Widget 95')
+
+    data = table.data()
+
+    assert 95 in set(data['id'])
+    assert len(ids(data)) == len(set(data['id']))
+    assert table.watermark == 100
+    assert table.metrics['late_rows'] == 1
+    assert table.metrics['full_loads'] == 1
+
+
+def test_rows_already_held_are_not_added_twice(sqlite_db):
+    table = snapshot(sqlite_db, trailing_ids=1000)
+    before = ids(table.data())
+
+    for _ in range(3):
+        data = table.data()
+
+    assert ids(data) == before
+    assert table.metrics['late_rows'] == 0
+
+
+def test_late_commit_beyond_the_window_waits_for_a_full_reload(sqlite_db):
+    table = snapshot(sqlite_db, trailing_ids=10)
+    insert(sqlite_db, 100, 'Widget 100')
+    table.data()
+    insert(sqlite_db, 50, 'Widget 50')
+
+    assert 50 not in set(table.data()['id'])
+    table.refresh(full=True)
+    assert 50 in set(table.data()['id'])
+    assert table.metrics['full_loads'] == 2
+
+
+def test_local_rows_are_replaced_by_the_stored_version(sqlite_db):
+    table = snapshot(sqlite_db)
+    loaded = len(table.data())
+    table.add_local([{'supplier_name': 'Acme', 'product_name': 'Widget 100'}])
+    assert len(table.data()) == loaded + 1 and table.stats()['pending_local'] == 1
+    insert(sqlite_db, 100, 'Widget 100')
+
+    data = table.data()
+
+    assert len(data) == loaded + 1
+    assert table.stats()['pending_local'] == 0
+    assert data.loc[data['product_name'] == 'Widget 100', 'id'].tolist() == [100]
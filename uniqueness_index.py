@@ -0,0 +1,132 @@
+import hashlib
+import threading
+from logger_config import logger
+
+AI_TAG = "[AI generated]"
+
+class DuplicateEntryError(ValueError):
+    """The supplier and product combination is already stored."""
+
+    def __init__(self, message="This supplier and product combination already exists"):
+        super().__init__(message)
+
+def normalize_key(supplier_name, product_name):
+    """Case-, whitespace- and AI-tag-insensitive form of a (supplier, product) pair."""
+    parts = []
+    for value in (supplier_name, product_name):
+        value = str(value or '')
+        if value.endswith(AI_TAG):
+            value = value[:-len(AI_TAG)]
+        parts.append(' '.join(value.split()).casefold())
+    return tuple(parts)
+
+def key_hash(supplier_name, product_name):
+    # 64-bit digests keep a million keys in tens of MB. A collision is a false
+    # positive: reserve/contains/is_stored take a distinct pair for a stored one
+    # and it gets a 409 without the database being asked. Among n keys the odds
+    # are about n**2 / 2**65, some 3e-8 for a million
+    supplier, product = normalize_key(supplier_name, product_name)
+    return hashlib.blake2b(f"{supplier}\x1f{product}".encode('utf-8'), digest_size=8).digest()
+
+class KeyIndex:
+    """Hash set of normalized keys for one table, plus keys being generated right now.
+
+    With a SharedState, keys are also claimed there and keys other worker
+    processes stored are seen, so duplicates are caught across processes.
+    """
+
+    def __init__(self, table_name=None, shared=None):
+        self.table_name = table_name
+        self.shared = shared
+        self._keys = set()
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self.warm = False
+
+    def __len__(self):
+        return len(self._keys)
+
+    def contains(self, supplier_name, product_name):
+        key = key_hash(supplier_name, product_name)
+        if key in self._keys:
+            return True
+        return self.shared is not None and self.shared.is_stored(self.table_name, key)
+
+    def add(self, supplier_name, product_name):
+        with self._lock:
+            self._keys.add(key_hash(supplier_name, product_name))
+
+    def add_many(self, pairs):
+        hashes = [key_hash(supplier_name, product_name) for supplier_name, product_name in pairs]
+        with self._lock:
+            self._keys.update(hashes)
+
+    def reserve(self, supplier_name, product_name):
+        """Claim a key for generation; False if it exists or another request holds it."""
+        key = key_hash(supplier_name, product_name)
+        with self._lock:
+            if key in self._keys or key in self._in_flight:
+                return False
+            self._in_flight.add(key)
+        if self.shared is not None and not self.shared.claim_key(self.table_name, key):
+            with self._lock:
+                self._in_flight.discard(key)
+            return False
+        return True
+
+    def release(self, supplier_name, product_name):
+        key = key_hash(supplier_name, product_name)
+        with self._lock:
+            self._in_flight.discard(key)
+        if self.shared is not None:
+            self.shared.release_key(self.table_name, key)
+
+class UniquenessIndex:
+    """Per-table KeyIndex, warmed once from the database and kept current on insert."""
+
+    def __init__(self, db, snapshots=None, shared=None):
+        self.db = db
+        # Warm from the in-process table snapshot when there is one
+        self.snapshots = snapshots
+        self.shared = shared
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def table(self, table_name):
+        with self._lock:
+            index = self._tables.get(table_name)
+            if index is None:
+                index = KeyIndex(table_name, self.shared)
+                self._tables[table_name] = index
+        if not index.warm:
+            self._warm(table_name, index)
+        return index
+
+    def _warm(self, table_name, index):
+        with self._lock:
+            if index.warm:
+                return
+            try:
+                count = 0
+                if self.snapshots is not None:
+                    data = self.snapshots.get_table_data(table_name)
+                    index.add_many(zip(data['supplier_name'], data['product_name']))
+                    count = len(data)
+                else:
+                    for chunk in self.db.iter_key_rows(table_name, ['supplier_name', 'product_name']):
+                        index.add_many(chunk)
+                        count += len(chunk)
+                index.warm = True
+                logger.info(f"Warmed uniqueness index for {table_name} with {count} keys")
+            except Exception as e:
+                logger.error(f"Error warming uniqueness index for {table_name}: {str(e)}")
+                raise
+
+    def on_insert(self, table_name, rows):
+        pairs = [(row.get('supplier_name'), row.get('product_name')) for row in rows]
+        index = self._tables.get(table_name)
+        if index is not None:
+            index.add_many(pairs)
+        if self.shared is not None:
+            # Workers warmed before this insert only learn about it here
+            self.shared.store_keys(table_name, [key_hash(*pair) for pair in pairs])
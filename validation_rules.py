@@ -0,0 +1,266 @@
+import json
+import operator
+import os
+import re
+import threading
+import time
+import yaml
+from datetime import datetime
+from logger_config import logger
+from data_validator import is_boolean, is_integer, is_number, is_timestamp
+
+RULE_FILE_EXTENSIONS = ('.yaml', '.yml', '.json')
+
+COMPARISONS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+TYPE_CHECKS = {
+    'string': lambda value: isinstance(value, str),
+    'integer': is_integer,
+    'number': is_number,
+    'boolean': is_boolean,
+    'date': is_timestamp,
+}
+
+def _number(value):
+    return float(value.strip()) if isinstance(value, str) else float(value)
+
+def _timestamp(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    # Dates compare with datetimes as midnight
+    return value if isinstance(value, datetime) else datetime(value.year, value.month, value.day)
+
+def _normalize(value):
+    return str(value).strip().casefold()
+
+def _comparable(left, right):
+    """Both operands as numbers, else as timestamps, else as strings."""
+    if is_number(left) and is_number(right):
+        return _number(left), _number(right)
+    if is_timestamp(left) and is_timestamp(right):
+        return _timestamp(left), _timestamp(right)
+    return str(left), str(right)
+
+def load_rule_file(path):
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            return json.load(f)
+        return yaml.safe_load(f) or {}
+
+class RuleSet:
+    """One table's rules, compiled once into checker functions.
+
+    check(row) returns {column: [issues]} for the rules the row breaks; an empty
+    dict means it passes. Column rules skip missing and null values unless
+    nullable is false.
+    """
+
+    def __init__(self, table_name, spec, references=None, schema=None):
+        self.table_name = table_name
+        self.required = spec.get('required')
+        self.references = references
+        self._checks = []
+        known = set(schema.column_names) if schema is not None else None
+
+        for column, rules in (spec.get('columns') or {}).items():
+            if known is not None and column not in known:
+                logger.warning(f"Ignoring rules for unknown column {table_name}.{column}")
+                continue
+            self._checks.extend(self._compile_column(column, rules))
+        for position, rule in enumerate(spec.get('checks') or []):
+            columns = [*rule.get('compare', [])[::2], *(rule.get('require') or [])]
+            if rule.get('when'):
+                columns.append(rule['when']['column'])
+            unknown = [column for column in columns if known is not None and column not in known]
+            if unknown:
+                logger.warning(f"Ignoring check {rule.get('name', position)} on unknown columns {', '.join(unknown)}")
+                continue
+            self._checks.append(self._compile_check(rule, position))
+
+    def _compile_column(self, column, rules):
+        checks = []
+
+        def add(check):
+            checks.append((column, check))
+
+        if rules.get('nullable') is False:
+            add(lambda row: f"{column} is required" if row.get(column) is None else None)
+
+        def on_value(test, message):
+            # Wrapped so each test only sees present, non-null values
+            def check(row):
+                value = row.get(column)
+                if value is None:
+                    return None
+                return None if test(value) else message(value)
+            add(check)
+
+        kind = rules.get('type')
+        if kind is not None:
+            if kind not in TYPE_CHECKS:
+                raise ValueError(f"Unknown rule type {kind} for {self.table_name}.{column}")
+            on_value(TYPE_CHECKS[kind], lambda value: f"{column} must be {kind}, got {value!r}")
+        if 'min' in rules or 'max' in rules:
+            low, high = rules.get('min'), rules.get('max')
+            on_value(
+                lambda value: is_number(value)
+                and (low is None or _number(value) >= low)
+                and (high is None or _number(value) <= high),
+                lambda value: f"{column} must be between {low} and {high}, got {value!r}"
+            )
+        if 'min_length' in rules or 'max_length' in rules:
+            shortest, longest = rules.get('min_length', 0), rules.get('max_length')
+            on_value(
+                lambda value: shortest <= len(str(value)) and (longest is None or len(str(value)) <= longest),
+                lambda value: f"{column} length must be between {shortest} and {longest}"
+            )
+        if 'enum' in rules:
+            allowed = frozenset(_normalize(value) for value in rules['enum'])
+            on_value(
+                lambda value: _normalize(value) in allowed,
+                lambda value: f"{column} must be one of {', '.join(map(str, rules['enum']))}, got {value!r}"
+            )
+        if 'pattern' in rules:
+            pattern = re.compile(rules['pattern'])
+            on_value(
+                lambda value: pattern.fullmatch(str(value).strip()) is not None,
+                lambda value: f"{column} must match {rules['pattern']}, got {value!r}"
+            )
+        if 'reference' in rules:
+            table, key = rules['reference']['table'], rules['reference']['column']
+            if self.references is None:
+                raise ValueError(f"Rule for {self.table_name}.{column} needs reference lookups, none configured")
+            on_value(
+                lambda value: _normalize(value) in self.references.values(table, key),
+                lambda value: f"{column} {value!r} not found in {table}.{key}"
+            )
+        return checks
+
+    def _compile_check(self, rule, position):
+        name = rule.get('name', f"check_{position}")
+        when = rule.get('when')
+        condition = None
+        if when is not None:
+            allowed = frozenset(_normalize(value) for value in when.get('in', [when.get('equals')]))
+            condition = lambda row: row.get(when['column']) is not None and _normalize(row[when['column']]) in allowed
+
+        if 'compare' in rule:
+            left, op, right = rule['compare']
+            compare = COMPARISONS[op]
+
+            def check(row):
+                if condition is not None and not condition(row):
+                    return None
+                if row.get(left) is None or row.get(right) is None:
+                    return None
+                if compare(*_comparable(row[left], row[right])):
+                    return None
+                return f"{name}: {left} {op} {right} does not hold ({row[left]!r}, {row[right]!r})"
+            return left, check
+
+        if 'require' in rule:
+            required = list(rule['require'])
+
+            def check(row):
+                if condition is not None and not condition(row):
+                    return None
+                missing = [column for column in required if row.get(column) in (None, '')]
+                return f"{name}: {', '.join(missing)} required" if missing else None
+            return required[0], check
+
+        raise ValueError(f"Check {name} for {self.table_name} needs compare or require")
+
+    def check(self, row):
+        issues = {}
+        for column, check in self._checks:
+            issue = check(row)
+            if issue is not None:
+                issues.setdefault(column, []).append(issue)
+        return issues
+
+    def __len__(self):
+        return len(self._checks)
+
+class ReferenceValues:
+    """Normalized value sets of reference columns, reloaded after ttl seconds."""
+
+    def __init__(self, loader, ttl=None):
+        # loader(table_name, column) -> iterable of values
+        self.loader = loader
+        self.ttl = ttl if ttl is not None else float(os.getenv('VALIDATION_REFERENCE_TTL', '300'))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def values(self, table_name, column):
+        entry = self._values.get((table_name, column))
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        with self._lock:
+            values = frozenset(_normalize(value) for value in self.loader(table_name, column) if value is not None)
+            self._values[(table_name, column)] = (values, time.monotonic())
+        return values
+
+class RuleEngine:
+    """Per-table validation rules from <table>.yaml / .yml / .json files in VALIDATION_RULES_DIR.
+
+    Each table's file is compiled on first use; reload() picks up edited files.
+    """
+
+    def __init__(self, rules_dir=None, reference_loader=None):
+        self.rules_dir = rules_dir or os.getenv('VALIDATION_RULES_DIR', 'rules')
+        self.references = ReferenceValues(reference_loader) if reference_loader is not None else None
+        self._rule_sets = {}
+        self._lock = threading.Lock()
+        self.metrics = {'checked': 0, 'rejected': 0}
+
+    def _find_file(self, table_name):
+        for extension in RULE_FILE_EXTENSIONS:
+            path = os.path.join(self.rules_dir, f"{table_name}{extension}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def rules(self, table_name, schema=None):
+        """Compiled RuleSet for table_name, or None when it has no rule file."""
+        if table_name in self._rule_sets:
+            return self._rule_sets[table_name]
+        with self._lock:
+            if table_name not in self._rule_sets:
+                path = self._find_file(table_name)
+                rule_set = None
+                if path is not None:
+                    try:
+                        rule_set = RuleSet(table_name, load_rule_file(path), self.references, schema)
+                        logger.info(f"Compiled {len(rule_set)} validation rules for {table_name} from {path}")
+                    except Exception as e:
+                        logger.error(f"Error loading validation rules from {path}: {str(e)}")
+                        raise
+                self._rule_sets[table_name] = rule_set
+        return self._rule_sets[table_name]
+
+    def check(self, table_name, row, schema=None):
+        rule_set = self.rules(table_name, schema)
+        if rule_set is None:
+            return {}
+        issues = rule_set.check(row)
+        self.metrics['checked'] += 1
+        if issues:
+            self.metrics['rejected'] += 1
+        return issues
+
+    def reload(self):
+        with self._lock:
+            self._rule_sets.clear()
+
+    def stats(self):
+        return {
+            **self.metrics,
+            'tables': {table: len(rule_set) for table, rule_set in self._rule_sets.items() if rule_set is not None}
+        }
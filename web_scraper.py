@@ -1,59 +1,195 @@
+import asyncio
+import os
+import random
 import trafilatura
+import httpx
 from logger_config import logger
-import requests
+from scrape_cache import SEARCH, PAGE
+from telemetry import registry, span, traced
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+HTTP_RESPONSES = registry.counter('scraper_responses', "Scraper HTTP responses by status", ('status',))
+
 class WebScraper:
-    def __init__(self):
+    def __init__(self, search_url=None, timeout=None, cache=None):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        self.search_url = search_url or os.getenv('SEARCH_URL', 'https://www.google.com/search')
+        self.timeout = timeout or float(os.getenv('SCRAPER_TIMEOUT', '15'))
+        self.max_connections = int(os.getenv('SCRAPER_MAX_CONNECTIONS', '100'))
+        self.per_host_limit = int(os.getenv('SCRAPER_PER_HOST_LIMIT', '8'))
+        self.retries = int(os.getenv('SCRAPER_RETRIES', '2'))
+        self.backoff = float(os.getenv('SCRAPER_BACKOFF', '0.5'))
+        self.top_n = int(os.getenv('SCRAPER_TOP_N', '3'))
+        self.max_content_chars = int(os.getenv('SCRAPER_MAX_CONTENT_CHARS', '12000'))
+        self.cache = cache
+        self._client = None
+        self._host_limits = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # One shared keep-alive pool per scraper so connections are reused across requests
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                follow_redirects=True
+            )
+            self._host_limits = {}
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get(self, url, **kwargs) -> httpx.Response:
+        """GET with a per-host concurrency cap and jittered exponential backoff on transient failures."""
+        client = self.client
+        host = urlparse(url).netloc
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
 
-    def get_website_text_content(self, url: str) -> str:
+        for attempt in range(self.retries + 1):
+            try:
+                async with limit:
+                    with span('scraper.http_get'):
+                        response = await client.get(url, **kwargs)
+                HTTP_RESPONSES.inc(status=response.status_code)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.retries:
+                    return response
+                logger.warning(f"Got {response.status_code} from {url}, retrying")
+            except httpx.TransportError as e:
+                HTTP_RESPONSES.inc(status='error')
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Request to {url} failed ({str(e)}), retrying")
+            await asyncio.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    async def get_website_text_content(self, url: str) -> str:
         try:
-            downloaded = trafilatura.fetch_url(url)
-            text = trafilatura.extract(downloaded)
+            headers = {}
+            cached = await asyncio.to_thread(self.cache.get, PAGE, url) if self.cache else None
+            if cached is not None:
+                if cached['fresh']:
+                    return cached['value']
+                # Stale: ask the server whether our copy is still current
+                if cached['etag']:
+                    headers['If-None-Match'] = cached['etag']
+                if cached['last_modified']:
+                    headers['If-Modified-Since'] = cached['last_modified']
+
+            response = await self._get(url, headers=headers)
+            if response.status_code == 304 and cached is not None:
+                await asyncio.to_thread(self.cache.touch, PAGE, url)
+                logger.info(f"Cached content for {url} is still current")
+                return cached['value']
+            response.raise_for_status()
+            # trafilatura extraction is CPU bound, keep it off the event loop
+            with span('scraper.extract'):
+                text = await asyncio.to_thread(trafilatura.extract, response.text)
             if not text:
                 raise ValueError("No content extracted from the URL")
             logger.info(f"Successfully scraped content from {url}")
+            if self.cache:
+                await asyncio.to_thread(
+                    self.cache.set, PAGE, url, text,
+                    response.headers.get('ETag'), response.headers.get('Last-Modified')
+                )
             return text
         except Exception as e:
             logger.error(f"Error scraping content from {url}: {str(e)}")
             raise
 
-    def search_product_info(self, supplier_name: str, product_name: str) -> dict:
+    async def fetch_many(self, urls) -> list:
+        """Fetch and extract several pages concurrently.
+
+        Returns one dict per URL, in order, with either 'content' or 'error'.
+        """
+        async def fetch(url):
+            try:
+                return {'url': url, 'content': await self.get_website_text_content(url)}
+            except Exception as e:
+                return {'url': url, 'error': str(e)}
+
+        return await asyncio.gather(*(fetch(url) for url in urls))
+
+    @traced('scraper.search_product')
+    async def search_product_info(self, supplier_name: str, product_name: str) -> dict:
         try:
             # Construct search query
             search_query = f"{supplier_name} {product_name} specifications"
-            search_url = f"https://www.google.com/search?q={search_query}"
-            
-            response = requests.get(search_url, headers=self.headers)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract relevant links
-            search_results = []
-            for link in soup.find_all('a'):
-                href = link.get('href')
-                if href and href.startswith('/url?q='):
-                    url = href.split('/url?q=')[1].split('&')[0]
-                    if self._is_valid_domain(url):
-                        search_results.append(url)
-            
-            # Get content from first valid result
+            search_results = await self._search(search_query)
+
+            # Get content from the top valid results in parallel
             if search_results:
-                content = self.get_website_text_content(search_results[0])
+                pages = await self.fetch_many(search_results[:self.top_n])
+                fetched = [page for page in pages if 'content' in page]
+                if not fetched:
+                    raise ValueError(f"No content extracted from top results: {pages[0]['error']}")
                 return {
-                    'source_url': search_results[0],
-                    'content': content
+                    'source_url': fetched[0]['url'],
+                    'source_urls': [page['url'] for page in fetched],
+                    'content': self._merge_content([page['content'] for page in fetched])
                 }
             else:
                 raise ValueError("No valid search results found")
-                
+
         except Exception as e:
             logger.error(f"Error searching product info: {str(e)}")
             raise
 
+    def _merge_content(self, texts) -> str:
+        # Keep each distinct paragraph once, in rank order, up to the length cap
+        seen = set()
+        merged = []
+        length = 0
+        for text in texts:
+            for paragraph in text.split('\n'):
+                key = ' '.join(paragraph.split()).casefold()
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                if length + len(paragraph) > self.max_content_chars:
+                    return '\n'.join(merged)
+                merged.append(paragraph)
+                length += len(paragraph) + 1
+        return '\n'.join(merged)
+
+    async def _search(self, search_query: str) -> list:
+        cached = await asyncio.to_thread(self.cache.get, SEARCH, search_query) if self.cache else None
+        if cached is not None and cached['fresh']:
+            return cached['value']
+
+        response = await self._get(self.search_url, params={'q': search_query})
+        search_results = await asyncio.to_thread(self._extract_result_links, response.text)
+        # Empty result pages are usually throttling, do not cache those
+        if self.cache and search_results:
+            await asyncio.to_thread(self.cache.set, SEARCH, search_query, search_results)
+        return search_results
+
+    def _extract_result_links(self, html: str) -> list:
+        soup = BeautifulSoup(html, 'html.parser')
+
+        # Extract relevant links
+        search_results = []
+        for link in soup.find_all('a'):
+            href = link.get('href')
+            if href and href.startswith('/url?q='):
+                url = href.split('/url?q=')[1].split('&')[0]
+                if self._is_valid_domain(url) and url not in search_results:
+                    search_results.append(url)
+        return search_results
+
     def _is_valid_domain(self, url: str) -> bool:
         """Filter out unwanted domains like social media, video platforms, etc."""
         excluded_domains = {'facebook.com', 'twitter.com', 'youtube.com', 'instagram.com'}